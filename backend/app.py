@@ -1,11 +1,15 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 import os
-import multiprocessing
+import json
 from config import Config
-from indexer import process_video
-from retriever import query_videorag
+from retriever import query_videorag, stream_videorag, cache_stats, list_videos, delete_video
+from services.job_queue import JobQueue
+from services.chunk_store import DEFAULT_NAMESPACE, video_id_for
+from services import runtime
+from services.metrics import metrics, read_dumps
+from worker import launch_worker_pool
 
 app = Flask(__name__)
 
@@ -15,6 +19,32 @@ CORS(app, resources={r"/*": {"origins": "*"}})
 # 2. Increase Upload Limit to 16GB (Critical for Videos)
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024 * 1024 
 
+# 3. Indexing jobs are queued here and consumed by the worker pool (worker.py)
+job_queue = JobQueue()
+
+# Most videos a chat request may restrict its search to.
+MAX_VIDEO_IDS = getattr(Config, "CHAT_MAX_VIDEO_IDS", 1000)
+
+def _namespace(value):
+    """Namespace (tenant) named in a request, sanitised like a file name; None if absent."""
+    if value is None:
+        return None
+    return secure_filename(str(value)) or DEFAULT_NAMESPACE
+
+def _video_ids(value, namespace):
+    """
+    Video IDs of the file names a request lists in `video_ids`, resolved in
+    `namespace` like the /api/videos/<filename> routes; None if absent.
+    Raises ValueError unless it is a list of at most MAX_VIDEO_IDS strings.
+    """
+    if value is None:
+        return None
+    if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+        raise ValueError("video_ids must be a list of strings")
+    if len(value) > MAX_VIDEO_IDS:
+        raise ValueError(f"video_ids may name at most {MAX_VIDEO_IDS} videos")
+    return [video_id_for(namespace, secure_filename(v)) for v in value]
+
 @app.route('/api/upload', methods=['POST'])
 def upload_video():
     if 'file' not in request.files:
@@ -24,18 +54,63 @@ def upload_video():
         return jsonify({"error": "No selected file"}), 400
         
     filename = secure_filename(file.filename)
-    save_path = os.path.join(Config.UPLOAD_FOLDER, filename)
+    namespace = _namespace(request.form.get('namespace')) or DEFAULT_NAMESPACE
+    # Other namespaces get their own folder, so equal file names do not overwrite each other.
+    folder = Config.UPLOAD_FOLDER if namespace == DEFAULT_NAMESPACE else os.path.join(Config.UPLOAD_FOLDER, namespace)
+    save_path = os.path.join(folder, filename)
     
     try:
+        os.makedirs(folder, exist_ok=True)
         file.save(save_path)
     except Exception as e:
         return jsonify({"error": f"Failed to save file: {str(e)}"}), 500
     
-    # Start Indexing in Background
-    p = multiprocessing.Process(target=process_video, args=(save_path,))
-    p.start()
+    # Queue Indexing for the Background Workers
+    video_id = video_id_for(namespace, filename)
+    job_id = job_queue.enqueue(save_path, video_id=video_id, namespace=namespace)
     
-    return jsonify({"message": "Upload successful, indexing started.", "filename": filename})
+    return jsonify({"message": "Upload successful, indexing queued.", "filename": filename,
+                    "video_id": video_id, "namespace": namespace, "job_id": job_id})
+
+@app.route('/api/videos', methods=['GET'])
+def get_videos():
+    return jsonify({"videos": list_videos(_namespace(request.args.get('namespace')))})
+
+@app.route('/api/videos/<filename>', methods=['DELETE'])
+def remove_video(filename):
+    """Deletes one video's chunks, vectors and graph mentions; the other videos are not rewritten."""
+    video_id = video_id_for(_namespace(request.args.get('namespace')), secure_filename(filename))
+    job = job_queue.latest(video_id)
+    if job and job['state'] in ('queued', 'running'):
+        return jsonify({"error": "Video is being indexed", "job_id": job['id']}), 409
+    removed = delete_video(video_id)
+    if not removed:
+        return jsonify({"error": "Video not found"}), 404
+    return jsonify({"video_id": video_id, "chunks_removed": removed})
+
+@app.route('/api/videos/<filename>/reindex', methods=['POST'])
+def reindex_video(filename):
+    """Deletes one video from the indexes and queues it to be indexed again from its uploaded file."""
+    video_id = video_id_for(_namespace(request.args.get('namespace')), secure_filename(filename))
+    job = job_queue.latest(video_id)
+    if job is None:
+        return jsonify({"error": "Video not found"}), 404
+    if job['state'] in ('queued', 'running'):
+        return jsonify({"error": "Video is being indexed", "job_id": job['id']}), 409
+    removed = delete_video(video_id)
+    job_id = job_queue.enqueue(job['video_path'], video_id=video_id, namespace=job['namespace'])
+    return jsonify({"video_id": video_id, "chunks_removed": removed, "job_id": job_id})
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    return jsonify({"jobs": job_queue.recent(limit=request.args.get('limit', 50, type=int))})
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
 
 @app.route('/api/chat', methods=['POST'])
 def chat():
@@ -44,13 +119,76 @@ def chat():
         return jsonify({"error": "No query provided"}), 400
         
     query = data.get('query')
+    namespace = _namespace(data.get('namespace'))
     try:
-        result = query_videorag(query)
+        video_ids = _video_ids(data.get('video_ids'), namespace)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        result = query_videorag(query, namespace=namespace, video_ids=video_ids)
         return jsonify(result)
     except Exception as e:
         print(f"Error processing chat: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    Server-Sent Events variant of /api/chat: emits `sources` once retrieval
+    finishes, then `token` events as the LLM produces them, then `done`.
+    """
+    data = request.json
+    if not data or 'query' not in data:
+        return jsonify({"error": "No query provided"}), 400
+
+    query = data.get('query')
+    namespace = _namespace(data.get('namespace'))
+    try:
+        video_ids = _video_ids(data.get('video_ids'), namespace)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def events():
+        # Flush headers immediately so the client sees the stream open before retrieval ends.
+        yield ": stream opened\n\n"
+        try:
+            for event, payload in stream_videorag(query, namespace=namespace, video_ids=video_ids):
+                yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+        except Exception as e:
+            print(f"Error processing chat stream: {e}")
+            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/status', methods=['GET'])
+def get_status():
+    """Uptime, memory, and what has been loaded so far (with load time and RSS cost)."""
+    return jsonify(runtime.status())
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Per-stage timings (count, mean, p50 / p95, max): queries from this process, indexing from each worker."""
+    return jsonify({"api": metrics.snapshot(), "workers": read_dumps()})
+
+@app.route('/api/cache', methods=['GET'])
+def get_cache_stats():
+    """Hit rates of the content cache (plans, embeddings, model outputs) and the answer cache, and relevance filter counts."""
+    return jsonify(cache_stats())
+
+# Models and indexes load on first use unless Config.WARMUP asks for them up front.
+runtime.start_warmup()
+_startup = runtime.status()
+print(f"🚀 API ready in {_startup['uptime_s']:.1f}s, {_startup['rss_mb']:.0f} MiB RSS"
+      + ("" if getattr(Config, "WARMUP", False) is True else "; models and indexes load on first use."))
+
 if __name__ == '__main__':
+    # Long-lived indexing workers; set INDEX_WORKERS = 0 when running `python worker.py` separately.
+    if getattr(Config, "INDEX_WORKERS", 2):
+        launch_worker_pool()
+
     # Run on 0.0.0.0 to ensure it binds to all interfaces (IPv4/IPv6)
     app.run(host='0.0.0.0', port=5000, debug=True, debug_with_reloader=False, use_reloader=False)
\ No newline at end of file
@@ -0,0 +1,70 @@
+"""
+Recall@k and latency of the IVF index against brute-force search.
+
+Usage (from backend/):
+    python -m benchmarks.bench_ann_recall --rows 200000 --dim 512 --nprobe 1,4,8,16,32
+
+Vectors are drawn from a Gaussian mixture so that, like real chunk
+embeddings, they form clusters; queries are noisy copies of stored rows.
+Half the rows are inserted after training to exercise incremental insertion.
+"""
+import argparse
+import tempfile
+import time
+import numpy as np
+from services.vector_store import MmapVectorStore
+from services.ann_index import IVFIndex
+
+
+def synthetic(rows, dim, clusters, rng):
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=rows)
+    return centers[labels] + 0.6 * rng.standard_normal((rows, dim)).astype(np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--nprobe", default="1,4,8,16,32")
+    parser.add_argument("--dtype", default="float32")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    data = synthetic(args.rows, args.dim, max(16, args.rows // 500), rng)
+    queries = data[rng.integers(0, args.rows, size=args.queries)] + 0.3 * rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as storage:
+        store = MmapVectorStore(args.dim, f"{storage}/bench", dtype=args.dtype)
+        half = args.rows // 2
+        for lo, hi in ((0, half), (half, args.rows)):
+            store.upsert([{"__id__": str(i), "__vector__": data[i]} for i in range(lo, hi)])
+            store.save()
+            if lo == 0:
+                t0 = time.perf_counter()
+                index = IVFIndex(store, nlist=args.nlist, min_train=1, retrain_growth=float('inf'))
+                index.sync()
+                print(f"trained nlist={len(index.centroids)} on {half} rows in {time.perf_counter() - t0:.2f}s")
+        t0 = time.perf_counter()
+        index.sync()
+        print(f"incrementally assigned {args.rows - half} rows in {time.perf_counter() - t0:.2f}s")
+
+        t0 = time.perf_counter()
+        truth = [{r["__id__"] for r in store.query(q, top_k=args.top_k)} for q in queries]
+        brute_ms = (time.perf_counter() - t0) * 1000 / args.queries
+        print(f"\n{'nprobe':>8} {'recall@' + str(args.top_k):>10} {'ms/query':>10} {'speedup':>9}")
+        print(f"{'brute':>8} {1.0:>10.3f} {brute_ms:>10.2f} {1.0:>9.1f}")
+
+        for nprobe in (int(n) for n in args.nprobe.split(",")):
+            t0 = time.perf_counter()
+            found = [{r["__id__"] for r in index.query(q, top_k=args.top_k, nprobe=nprobe)} for q in queries]
+            ms = (time.perf_counter() - t0) * 1000 / args.queries
+            recall = np.mean([len(f & t) / len(t) for f, t in zip(found, truth)])
+            print(f"{nprobe:>8} {recall:>10.3f} {ms:>10.2f} {brute_ms / ms:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
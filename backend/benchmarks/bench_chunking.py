@@ -0,0 +1,123 @@
+"""
+Fixed 30-second windows versus adaptive scene chunking on synthetic clips
+with known shot boundaries.
+
+Usage (from backend/):
+    python -m benchmarks.bench_chunking [--lecture-sec 900] [--fastcut-sec 300] [--frames-per-chunk 4]
+
+Two clips are generated with ffmpeg:
+  lecture  a few static slides with long silences between them and speech-like
+           audio (tone bursts with short pauses) over each slide
+  fastcut  continuous audio over shots of 2-10 s each
+
+Reported per strategy:
+  chunks/h   chunks per video hour. Each chunk costs one Whisper, caption,
+             text-embedding and extraction call.
+  frames/h   keyframes per hour, i.e. CLIP images encoded. Both strategies get
+             the same budget per chunk (--frames-per-chunk, as the indexer's
+             VISUAL_FRAMES_PER_CHUNK)
+  calls/h    4 · chunks/h + frames/h
+  coverage   share of shots with at least one keyframe inside them (a shot
+             without one is invisible to visual search)
+  purity     mean share of a chunk's duration spent in its dominant shot
+             (mixed chunks blur both text and visual embeddings)
+"""
+import argparse
+import os
+import random
+import subprocess
+import tempfile
+import time
+import numpy as np
+import imageio_ffmpeg
+from services.media_extractor import MediaExtractor
+
+FFMPEG = imageio_ffmpeg.get_ffmpeg_exe()
+
+
+def render(path, shots, audio_expr, size="320x240"):
+    """Renders consecutive solid-colour shots (with sensor-like noise) and an aevalsrc audio track."""
+    cmd = [FFMPEG, "-y", "-loglevel", "error"]
+    for color, duration in shots:
+        cmd += ["-f", "lavfi", "-i", f"color=c=0x{color}:s={size}:r=10:d={duration}"]
+    total = sum(d for _, d in shots)
+    cmd += ["-f", "lavfi", "-i", f"aevalsrc='{audio_expr}':s=16000:d={total}"]
+    chain = "".join(f"[{i}:v]" for i in range(len(shots)))
+    cmd += [
+        "-filter_complex", f"{chain}concat=n={len(shots)}:v=1:a=0,noise=alls=6:allf=t[v]",
+        "-map", "[v]", "-map", f"{len(shots)}:a", "-c:v", "libx264", "-preset", "ultrafast",
+        "-pix_fmt", "yuv420p", "-c:a", "aac", path,
+    ]
+    subprocess.run(cmd, check=True)
+    bounds, t = [], 0.0
+    for _, duration in shots:
+        bounds.append((t, t + duration))
+        t += duration
+    return bounds
+
+
+def make_clips(folder, lecture_sec, fastcut_sec, rng):
+    colors = lambda: "%02x%02x%02x" % (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+
+    slides = max(1, lecture_sec // 180)
+    lecture_shots = [(colors(), lecture_sec / slides) for _ in range(slides)]
+    # Speech: 6 s bursts with 1.5 s pauses, and 20 s of silence at the end of every slide.
+    slide_len = lecture_sec / slides
+    lecture_audio = f"0.3*sin(2*PI*220*t)*lt(mod(t,7.5),6)*lt(mod(t,{slide_len}),{slide_len - 20})"
+    lecture = os.path.join(folder, "lecture.mp4")
+    clips = {"lecture": (lecture, render(lecture, lecture_shots, lecture_audio))}
+
+    fast_shots, total = [], 0
+    while total < fastcut_sec:
+        duration = rng.randint(2, 10)
+        fast_shots.append((colors(), duration))
+        total += duration
+    fastcut = os.path.join(folder, "fastcut.mp4")
+    clips["fastcut"] = (fastcut, render(fastcut, fast_shots, "0.3*sin(2*PI*330*t)"))
+    return clips
+
+
+def evaluate(windows, shots, duration):
+    frames = sum(len(w["frame_times"]) for w in windows)
+    covered = sum(any(s <= t < e for w in windows for t in w["frame_times"]) for s, e in shots)
+    purity = []
+    for w in windows:
+        overlaps = [max(0.0, min(e, w["end"]) - max(s, w["start"])) for s, e in shots]
+        purity.append(max(overlaps) / max(1e-9, w["end"] - w["start"]))
+    hours = duration / 3600
+    return {
+        "chunks/h": len(windows) / hours,
+        "frames/h": frames / hours,
+        "calls/h": (4 * len(windows) + frames) / hours,
+        "coverage": covered / len(shots),
+        "purity": float(np.mean(purity)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lecture-sec", type=int, default=900)
+    parser.add_argument("--fastcut-sec", type=int, default=300)
+    parser.add_argument("--chunk-len", type=int, default=30)
+    parser.add_argument("--frames-per-chunk", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        clips = make_clips(folder, args.lecture_sec, args.fastcut_sec, random.Random(0))
+        print(f"{'clip':<9} {'strategy':<8} {'chunks/h':>9} {'frames/h':>9} {'calls/h':>9} {'coverage':>9} {'purity':>7} {'decode':>8}")
+        for name, (path, shots) in clips.items():
+            extractor = MediaExtractor(path)
+            strategies = {
+                "fixed": lambda: extractor.iter_chunks(args.chunk_len, frames_per_chunk=args.frames_per_chunk),
+                "scene": lambda: extractor.iter_scenes(target_len=args.chunk_len, max_keyframes=args.frames_per_chunk),
+            }
+            for label, windows in strategies.items():
+                t0 = time.perf_counter()
+                result = evaluate(list(windows()), shots, extractor.duration)
+                elapsed = time.perf_counter() - t0
+                print(f"{name:<9} {label:<8} {result['chunks/h']:9.0f} {result['frames/h']:9.0f} {result['calls/h']:9.0f}"
+                      f" {result['coverage']:9.1%} {result['purity']:7.1%} {elapsed:7.2f}s")
+
+
+if __name__ == "__main__":
+    main()
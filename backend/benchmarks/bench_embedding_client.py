@@ -0,0 +1,75 @@
+"""
+Request count, wall time and 429s for text embeddings sent one input per
+request versus through the batching EmbeddingClient, against the local
+fake OpenAI server (tools/fake_openai.py) with per-minute limits.
+
+Usage (from backend/):
+    python -m benchmarks.bench_embedding_client --texts 500 --callers 32 --rpm 3000 --tpm 1000000
+
+Both runs embed the same chunk-sized texts from `--callers` concurrent
+threads, like the indexing pipeline's network pool.
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+import openai
+from openai import OpenAI
+from services.embedding_client import EmbeddingClient
+from tools.fake_openai import FakeOpenAI
+
+MODEL = "text-embedding-3-small"
+
+
+def texts_for(n):
+    return [f"Time: {30 * i}-{30 * i + 30}s. Transcript: segment {i} " + "words " * 300 for i in range(n)]
+
+
+def run(label, embed, texts, callers, server):
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=callers) as pool:
+        results = list(pool.map(embed, texts))
+    elapsed = time.perf_counter() - t0
+    failed = sum(r is None for r in results)
+    print(f"{label:<10} {elapsed:7.2f}s   {server.stats['requests']:5d} requests   {server.stats['rate_limited']:5d} x 429"
+          f"   {failed:5d} failed   {(len(texts) - failed) / elapsed:7.1f} texts/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=500)
+    parser.add_argument("--callers", type=int, default=32)
+    parser.add_argument("--rpm", type=int, default=3000)
+    parser.add_argument("--tpm", type=int, default=1_000_000)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    def fresh_server():
+        return FakeOpenAI(("127.0.0.1", 0), tpm=args.tpm, rpm=args.rpm, latency_ms=args.latency_ms).serve_in_background()
+
+    texts = texts_for(args.texts)
+
+    # One input per request, relying on the SDK's default retries.
+    server = fresh_server()
+    naive_client = OpenAI(api_key="sk-fake", base_url=server.base_url)
+
+    def naive(text):
+        try:
+            return naive_client.embeddings.create(input=text, model=MODEL).data[0].embedding
+        except (openai.RateLimitError, openai.APIConnectionError):
+            return None
+
+    run("naive", naive, texts, args.callers, server)
+
+    server = fresh_server()
+    batching = EmbeddingClient(
+        MODEL, [OpenAI(api_key="sk-fake", base_url=server.base_url, max_retries=0)],
+        tpm_limit=args.tpm, max_inputs=256,
+    )
+    run("batched", batching.embed, texts, args.callers, server)
+    stats = batching.stats()
+    print(f"\nEmbeddingClient: {stats['requests']} requests, mean batch {stats['mean_batch_size']:.1f}, "
+          f"{stats['retries']} retries, {stats['failures']} failures")
+
+
+if __name__ == "__main__":
+    main()
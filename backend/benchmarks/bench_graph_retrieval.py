@@ -0,0 +1,107 @@
+"""
+Build cost and query latency of the graph retrieval path on a synthetic
+knowledge graph.
+
+Usage (from backend/):
+    python -m benchmarks.bench_graph_retrieval --entities 100000 --chunks 50000
+
+Entity names are random multi-word strings; every chunk mentions a handful
+of entities and links them with relations, with a few hub entities
+appearing in many chunks, as recurring people and places do in real
+videos. Queries mix exact names, case/article variants and misspellings.
+"""
+import argparse
+import os
+import random
+import string
+import tempfile
+import time
+import numpy as np
+from config import Config
+
+
+def random_name(rng):
+    return " ".join(
+        "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 9)))
+        for _ in range(rng.randint(1, 3))
+    )
+
+
+def misspell(name, rng):
+    i = rng.randrange(len(name))
+    return name[:i] + rng.choice(string.ascii_lowercase) + name[i + 1:]
+
+
+def percentiles(samples_ms):
+    return f"p50 {np.percentile(samples_ms, 50):7.2f} ms   p95 {np.percentile(samples_ms, 95):7.2f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entities", type=int, default=100000)
+    parser.add_argument("--chunks", type=int, default=50000)
+    parser.add_argument("--per-chunk", type=int, default=8)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--hops", default="0,1,2,3")
+    parser.add_argument("--budget-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    names = list({random_name(rng) for _ in range(args.entities)})
+    hubs = names[:max(1, len(names) // 1000)]
+
+    with tempfile.TemporaryDirectory() as storage:
+        Config.STORAGE_FOLDER = storage
+        from services.graph_engine import GraphEngine
+        graph = GraphEngine()
+
+        t0 = time.perf_counter()
+        for c in range(args.chunks):
+            mentioned = rng.sample(names, args.per_chunk - 1) + [rng.choice(hubs)]
+            relations = [
+                {"source": mentioned[i], "target": mentioned[i + 1], "relation": "related to"}
+                for i in range(len(mentioned) - 1)
+            ]
+            graph.add_knowledge([{"name": n, "type": "thing"} for n in mentioned], relations, f"chunk-{c}")
+        build_s = time.perf_counter() - t0
+
+        # Writes only insert, so this is the first (cold) load of the graph and entity index.
+        t0 = time.perf_counter()
+        graph.refresh()
+        load_s = time.perf_counter() - t0
+        print(f"Graph: {graph.G.number_of_nodes()} entities, {graph.G.number_of_edges()} relations, "
+              f"{args.chunks} chunks committed in {build_s:.2f}s ({args.chunks / build_s:.0f} chunks/s)")
+        print(f"Cold load + entity index {load_s:.2f}s, "
+              f"{os.path.getsize(graph.db_path) / 1e6:.1f} MB on disk\n")
+
+        targets = [rng.choice(names) for _ in range(args.queries)]
+        query_sets = {
+            "exact": targets,
+            "variant": [f"The {t.title()}" for t in targets],
+            "misspelled": [misspell(t, rng) for t in targets],
+        }
+
+        print("Entity lookup")
+        for label, queries in query_sets.items():
+            samples, found = [], 0
+            for query, target in zip(queries, targets):
+                t0 = time.perf_counter()
+                matches = graph.entities.lookup(query)
+                samples.append((time.perf_counter() - t0) * 1000)
+                found += any(node == target for node, _ in matches)
+            print(f"  {label:<11} {percentiles(samples)}   resolved {found / len(queries):.1%}")
+
+        print(f"\nretrieve_context (3 entities per query, budget {args.budget_ms:g} ms)")
+        for hops in (int(h) for h in args.hops.split(",")):
+            samples, sizes = [], []
+            for i in range(args.queries):
+                entities = [targets[i], query_sets["misspelled"][(i + 1) % args.queries], rng.choice(hubs)]
+                t0 = time.perf_counter()
+                ranked = graph.retrieve_context(entities, hops=hops, budget_ms=args.budget_ms)
+                samples.append((time.perf_counter() - t0) * 1000)
+                sizes.append(len(ranked))
+            print(f"  hops={hops}  {percentiles(samples)}   chunks scored (mean) {np.mean(sizes):8.0f}")
+
+
+if __name__ == "__main__":
+    main()
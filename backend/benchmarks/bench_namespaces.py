@@ -0,0 +1,72 @@
+"""
+Search latency for a query scoped to one video versus the whole library,
+and bytes written to delete one video, on both vector backends.
+
+Usage (from backend/):
+    python -m benchmarks.bench_namespaces [--videos 200] [--chunks 120] [--queries 50]
+
+The library is synthetic: `--videos` videos of `--chunks` chunks each with
+random 1536-d text vectors. "post-filter" is what scoping costs without
+pre-filtering: a global top-k deep enough to still hold k in-scope hits.
+"""
+import argparse
+import tempfile
+import time
+import numpy as np
+from services.vector_engine import VectorEngine
+
+
+def percentile_ms(samples, q):
+    return np.percentile(samples, q) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--videos", type=int, default=200)
+    parser.add_argument("--chunks", type=int, default=120)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    dim = 1536
+    library = {f"video-{v}": [f"video-{v}:{c}" for c in range(args.chunks)] for v in range(args.videos)}
+    vectors = rng.normal(size=(args.videos * args.chunks, dim)).astype(np.float32)
+    queries = rng.normal(size=(args.queries, dim)).astype(np.float32)
+    rows = args.videos * args.chunks
+
+    print(f"{rows} chunks in {args.videos} videos")
+    print(f"{'backend':<8} {'global p50':>11} {'post-filter p50':>16} {'scoped p50':>11} {'delete 1 video':>15}")
+    for backend in ("nano", "mmap"):
+        with tempfile.TemporaryDirectory() as folder:
+            engine = VectorEngine(folder, backend=backend, flush_every=10 ** 9)
+            ids = [chunk_id for chunks in library.values() for chunk_id in chunks]
+            engine.upsert_text([{"__id__": i, "__vector__": v} for i, v in zip(ids, vectors)])
+            engine.flush()
+
+            target = set(library["video-0"])
+            timings = {"global": [], "post": [], "scoped": []}
+            for query in queries:
+                t0 = time.perf_counter()
+                engine.search_text(query, top_k=args.top_k)
+                timings["global"].append(time.perf_counter() - t0)
+
+                t0 = time.perf_counter()
+                hits = engine.search_text(query, top_k=rows)
+                [h for h in hits if h["__id__"] in target][:args.top_k]
+                timings["post"].append(time.perf_counter() - t0)
+
+                t0 = time.perf_counter()
+                engine.search_text(query, top_k=args.top_k, chunk_ids=target)
+                timings["scoped"].append(time.perf_counter() - t0)
+
+            # NanoVectorDB saves rewrite the whole JSON file; the mmap store appends delete markers.
+            before = engine.bytes_written
+            engine.delete(target)
+            written = engine.bytes_written - before
+            print(f"{backend:<8} {percentile_ms(timings['global'], 50):9.2f}ms {percentile_ms(timings['post'], 50):14.2f}ms"
+                  f" {percentile_ms(timings['scoped'], 50):9.2f}ms {written / 1024:12.1f}KiB")
+
+
+if __name__ == "__main__":
+    main()
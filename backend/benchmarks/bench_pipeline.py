@@ -0,0 +1,191 @@
+"""
+End-to-end pipeline benchmark: indexes a video, then runs a query set, with
+every OpenAI call (Whisper, embeddings, chat) going to the local stand-in
+from tools.fake_openai, so a run is free, offline and repeatable.
+
+Usage (from backend/):
+    python -m benchmarks.bench_pipeline [--video sample.mp4 | --duration 300] [--queries 40]
+        [--latency-ms 150] [--chat-latency-ms 600] [--audio-latency-ms 400]
+        [--stub-models] [--set KEY=VALUE ...] [--json results.json]
+
+Without --video a synthetic clip is rendered with ffmpeg: shots of 4-20 s
+over tone-burst audio. Storage goes to a temporary folder, and --set
+overrides Config knobs before anything is imported (e.g. --set
+VECTOR_BACKEND='"mmap"' --set RERANK_MODE='"llm"'; values are JSON, or
+plain strings).
+
+--stub-models replaces OpenCLIP with pseudo-random vectors seeded by the
+frame bytes (plus --stub-clip-ms per image) and turns the VLM off, for
+machines without torch or to time everything but the models.
+
+Reported:
+  throughput  video seconds indexed per wall-clock second
+  queries     p50 / p95 end-to-end latency of query_videorag
+  peak RSS    of this process (indexer and retriever share it)
+  stages      the per-stage breakdown from services.metrics
+              (also served by GET /api/metrics)
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from config import Config
+from tools.fake_openai import FakeOpenAI, VOCABULARY
+
+CLIP_DIM = 512
+
+
+def parse_override(item):
+    key, _, value = item.partition("=")
+    try:
+        return key, json.loads(value)
+    except ValueError:
+        return key, value
+
+
+def synthetic_video(path, duration, rng):
+    from benchmarks.bench_chunking import render
+    shots, total = [], 0
+    while total < duration:
+        length = min(rng.randint(4, 20), duration - total)
+        shots.append(("%02x%02x%02x" % (rng.randrange(256), rng.randrange(256), rng.randrange(256)), length))
+        total += length
+    # Speech-like bursts whose pitch changes every burst, so windows transcribe differently.
+    render(path, shots, "0.3*sin(2*PI*(180+37*mod(floor(t/7),11))*t)*lt(mod(t,7),6)")
+    return path
+
+
+def stub_models(ai, clip_ms):
+    """Pseudo-random CLIP vectors seeded by the input and no VLM (see module docstring)."""
+    def vector(data):
+        seed = int.from_bytes(hashlib.sha256(data).digest()[:8], 'little')
+        vec = np.random.default_rng(seed).standard_normal(CLIP_DIM).astype(np.float32)
+        return vec / np.linalg.norm(vec)
+
+    def encode_images(images, batch_size=None):
+        time.sleep(clip_ms * len(images) / 1000)
+        return np.stack([vector(np.asarray(img).tobytes()) for img in images])
+
+    def encode_texts(texts, batch_size=None):
+        return np.stack([vector(t.encode('utf-8')) for t in texts])
+
+    ai._encode_images, ai._encode_texts = encode_images, encode_texts
+    ai._vlm = {"model": None, "tokenizer": None}
+
+
+def make_queries(count, rng):
+    templates = ["When does the {} appear next to the {}?", "What happens with the {} and the {}?",
+                 "Show me the {} near the {}.", "Is there a {} in the scene with the {}?"]
+    queries = set()
+    while len(queries) < count:
+        a, b = rng.sample(VOCABULARY, 2)
+        queries.add(rng.choice(templates).format(a, b))
+    return sorted(queries)
+
+
+def print_stages(stages):
+    print(f"{'stage':<24} {'count':>6} {'mean':>9} {'p50':>9} {'p95':>9} {'max':>9} {'total':>8}")
+    for name, s in stages.items():
+        print(f"{name:<24} {s['count']:>6} {s['mean_ms']:7.1f}ms {s['p50_ms']:7.1f}ms {s['p95_ms']:7.1f}ms"
+              f" {s['max_ms']:7.1f}ms {s['total_s']:7.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", default=None, help="Video to index; a synthetic one is rendered if omitted.")
+    parser.add_argument("--duration", type=int, default=300, help="Length of the synthetic video, in seconds.")
+    parser.add_argument("--queries", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=1, help="Queries in flight at once.")
+    parser.add_argument("--latency-ms", type=float, default=150, help="Simulated embeddings latency.")
+    parser.add_argument("--chat-latency-ms", type=float, default=600)
+    parser.add_argument("--audio-latency-ms", type=float, default=400)
+    parser.add_argument("--tpm", type=int, default=None)
+    parser.add_argument("--rpm", type=int, default=None)
+    parser.add_argument("--stub-models", action="store_true")
+    parser.add_argument("--stub-clip-ms", type=float, default=25, help="Simulated CLIP cost per image with --stub-models.")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE", help="Config override (repeatable).")
+    parser.add_argument("--json", default=None, help="Also write the report to this file.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    server = FakeOpenAI(("127.0.0.1", 0), tpm=args.tpm, rpm=args.rpm, latency_ms=args.latency_ms,
+                        chat_latency_ms=args.chat_latency_ms, audio_latency_ms=args.audio_latency_ms).serve_in_background()
+
+    with tempfile.TemporaryDirectory() as folder:
+        # Before the first import of the pipeline: clients and stores read these at construction.
+        overrides = dict(parse_override(item) for item in args.set)
+        settings = {"STORAGE_FOLDER": os.path.join(folder, "storage"), "OPENAI_BASE_URL": server.base_url,
+                    "OPENAI_API_KEY": "sk-fake", "OPENAI_API_KEYS": None, "ANSWER_CACHE_ENABLED": False, **overrides}
+        for key, value in settings.items():
+            setattr(Config, key, value)
+        os.makedirs(Config.STORAGE_FOLDER, exist_ok=True)
+
+        import indexer
+        import retriever
+        from services import runtime
+        from services.metrics import metrics
+
+        if args.stub_models:
+            stub_models(indexer.ai, args.stub_clip_ms)
+
+        video = args.video or synthetic_video(os.path.join(folder, "bench.mp4"), args.duration, rng)
+        print(f"🎬 Indexing {video}...")
+        t0 = time.perf_counter()
+        result = indexer.process_video(video)
+        index_wall = time.perf_counter() - t0
+        if not result["ok"]:
+            raise SystemExit(f"Indexing failed: {result['error']}")
+        video_seconds = metrics.snapshot()["counters"].get("video_seconds", 0)
+
+        queries = make_queries(args.queries, rng)
+        latencies = []
+
+        def run(query):
+            t = time.perf_counter()
+            retriever.query_videorag(query)
+            latencies.append(time.perf_counter() - t)
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(run, queries))
+        query_wall = time.perf_counter() - t0
+
+        snapshot = metrics.snapshot()
+        report = {
+            "video_seconds": video_seconds,
+            "chunks": result["chunks_total"],
+            "index_wall_s": round(index_wall, 2),
+            "throughput": round(video_seconds / index_wall, 2),
+            "queries": len(queries),
+            "query_wall_s": round(query_wall, 2),
+            "query_p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 1),
+            "query_p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 1),
+            "peak_rss_mb": round(runtime.peak_rss_mb(), 1),
+            "stages": snapshot["stages"],
+            "fake_api": dict(server.stats),
+            "settings": {"stub_models": args.stub_models, "concurrency": args.concurrency, **overrides},
+        }
+
+    print()
+    print(f"Indexing   {video_seconds:.0f} video-s ({report['chunks']} chunks) in {index_wall:.1f}s"
+          f" -> {report['throughput']:.2f} video-s per wall-s")
+    print(f"Queries    {len(queries)} at concurrency {args.concurrency}: p50 {report['query_p50_ms']:.0f}ms,"
+          f" p95 {report['query_p95_ms']:.0f}ms")
+    print(f"Peak RSS   {report['peak_rss_mb']:.0f} MiB")
+    print(f"Fake API   {report['fake_api']}")
+    print()
+    print_stages(report["stages"])
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
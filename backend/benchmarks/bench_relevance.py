@@ -0,0 +1,88 @@
+"""
+Per-query latency and LLM requests of relevance filtering: one sequential
+check per candidate (LLMEngine.check_relevance wired in naively) versus
+RelevanceFilter (embedding prefilter, then concurrent batched judging under
+a time budget).
+
+Usage (from backend/):
+    python -m benchmarks.bench_relevance [--queries 50] [--candidates 9] [--latency-ms 400] [--budget-ms 1500]
+
+The judge is simulated: each request sleeps for a latency drawn around
+`--latency-ms` (longer for bigger prompts, with an occasional slow tail)
+and rates the synthetic chunks by their known relevance, so the numbers
+isolate the scheduling.
+"""
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from services.relevance import RelevanceFilter
+
+DIM = 64
+
+
+def make_query(rng, n):
+    """A query embedding and n candidates, about a third of them relevant."""
+    query = rng.normal(size=DIM)
+    sources, vectors = [], {}
+    for i in range(n):
+        relevant = i % 3 == 0
+        weight = rng.uniform(0.6, 1.0) if relevant else rng.uniform(-0.1, 0.35)
+        text = f"chunk {i} {'relevant' if relevant else 'other'} {rng.random():.6f}"
+        vectors[text] = weight * query / np.linalg.norm(query) + rng.normal(size=DIM) * 0.04
+        sources.append({"text": text, "relevant": relevant})
+    return query, sources, vectors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--candidates", type=int, default=9)
+    parser.add_argument("--latency-ms", type=float, default=400)
+    parser.add_argument("--budget-ms", type=float, default=1500)
+    parser.add_argument("--batch-size", type=int, default=4)
+    args = parser.parse_args()
+
+    jitter = random.Random(0)
+    requests = {"n": 0}
+
+    def judge(query, texts):
+        requests["n"] += 1
+        latency = args.latency_ms * (1 + 0.1 * len(texts)) * jitter.uniform(0.7, 1.3)
+        if jitter.random() < 0.05:
+            latency *= 5  # slow tail
+        time.sleep(latency / 1000)
+        return [9 if "relevant" in t.split()[2] else 1 for t in texts]
+
+    pool = ThreadPoolExecutor(max_workers=12)
+    rng = np.random.default_rng(0)
+    workload = [make_query(rng, args.candidates) for _ in range(args.queries)]
+
+    print(f"{'strategy':<10} {'p50 ms':>8} {'p95 ms':>8} {'requests/q':>11} {'precision':>10} {'recall':>7}")
+    strategies = {
+        "naive": None,
+        "filter": lambda vectors: RelevanceFilter(
+            lambda texts: [vectors[t] for t in texts], judge, pool=pool,
+            batch_size=args.batch_size, budget_ms=args.budget_ms,
+        ),
+    }
+    for label, make_filter in strategies.items():
+        requests["n"] = 0
+        latencies, kept_relevant, kept, relevant = [], 0, 0, 0
+        for query, sources, vectors in workload:
+            t0 = time.perf_counter()
+            if make_filter is None:
+                out = [src for src in sources if judge("q", [src["text"]])[0] >= 5]
+            else:
+                out = make_filter(vectors).filter(query, "q", sources)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            kept += len(out)
+            kept_relevant += sum(src["relevant"] for src in out)
+            relevant += sum(src["relevant"] for src in sources)
+        print(f"{label:<10} {np.percentile(latencies, 50):8.0f} {np.percentile(latencies, 95):8.0f}"
+              f" {requests['n'] / args.queries:11.1f} {kept_relevant / max(1, kept):10.1%} {kept_relevant / max(1, relevant):7.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Compares save-per-upsert against buffered persistence in VectorEngine.
+
+Usage (from backend/):
+    python -m benchmarks.bench_vector_persistence --sizes 1000,10000
+
+Save-per-upsert rewrites the whole JSON index on every chunk, so its cost
+grows quadratically; sizes above --max-unbuffered are skipped for that mode.
+"""
+import argparse
+import tempfile
+import time
+import numpy as np
+from services.vector_engine import VectorEngine
+
+
+def ingest(n_chunks, flush_every, seed=0):
+    rng = np.random.default_rng(seed)
+    with tempfile.TemporaryDirectory() as storage:
+        engine = VectorEngine(storage_folder=storage, flush_every=flush_every, flush_interval=float('inf'))
+        t0 = time.perf_counter()
+        with engine:
+            for i in range(n_chunks):
+                metadata = {"text": f"Time: {i * 30}-{i * 30 + 30}s. Transcript: lorem ipsum {i}.", "start": i * 30, "end": i * 30 + 30}
+                engine.upsert_text([{"__id__": f"chunk-{i}", "__vector__": rng.standard_normal(1536), "metadata": metadata}])
+                engine.upsert_visual([{"__id__": f"chunk-{i}", "__vector__": rng.standard_normal(512), "metadata": metadata}])
+        elapsed = time.perf_counter() - t0
+        return engine.bytes_written, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000")
+    parser.add_argument("--flush-every", type=int, default=256)
+    parser.add_argument("--max-unbuffered", type=int, default=1000)
+    args = parser.parse_args()
+
+    print(f"{'chunks':>8} {'mode':>14} {'MB written':>12} {'wall s':>9}")
+    for n in (int(s) for s in args.sizes.split(",")):
+        modes = [("buffered", args.flush_every)]
+        if n <= args.max_unbuffered:
+            modes.insert(0, ("per-upsert", 1))
+        else:
+            print(f"{n:>8} {'per-upsert':>14} {'skipped':>12}")
+        for name, flush_every in modes:
+            written, elapsed = ingest(n, flush_every)
+            print(f"{n:>8} {name:>14} {written / 1e6:>12.1f} {elapsed:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
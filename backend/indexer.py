@@ -1,95 +1,298 @@
 import os
+import time
 import uuid
-from moviepy.video.io.VideoFileClip import VideoFileClip
-from services.ai_engine import AIEngine
-from services.vector_engine import VectorEngine
-from services.graph_engine import GraphEngine
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from services.media_extractor import MediaExtractor
+from services import runtime
+from services.metrics import metrics
 from config import Config
 
-# Initialize Engines
-ai = AIEngine()
-vec_db = VectorEngine()
-graph_db = GraphEngine()
+# Process-wide singletons, shared with the retriever if both are imported. Models
+# and indexes load on first use (or at startup with Config.WARMUP).
+ai = runtime.ai_engine()
+vec_db = runtime.vector_engine()
+graph_db = runtime.graph_engine()
+chunk_store = runtime.chunk_store()
 
-def process_video(video_path):
+# Length of each indexed window, in seconds (the target length for scene chunking).
+CHUNK_LEN = getattr(Config, "INDEX_CHUNK_LEN", 30)
+# "scene" cuts windows at shot changes and pauses (MediaExtractor.iter_scenes);
+# "fixed" keeps back-to-back CHUNK_LEN windows.
+CHUNKING = getattr(Config, "INDEX_CHUNKING", "scene")
+SCENE_OPTIONS = {
+    "min_len": getattr(Config, "SCENE_MIN_LEN", None),  # None: CHUNK_LEN
+    "static_len": getattr(Config, "SCENE_STATIC_LEN", 60),
+    "max_len": getattr(Config, "SCENE_MAX_LEN", 90),
+    "scene_threshold": getattr(Config, "SCENE_THRESHOLD", 0.12),
+}
+# Keyframes embedded per chunk (evenly spaced for fixed windows, at picture
+# changes for scenes), and how they are stored: "multi" keeps one vector per
+# frame (scored by max-sim at query time), "mean" / "max" pool them into one.
+FRAMES_PER_CHUNK = getattr(Config, "VISUAL_FRAMES_PER_CHUNK", 4)
+VISUAL_POOLING = getattr(Config, "VISUAL_POOLING", "multi")
+
+# Pipeline sizing. Network-bound calls (Whisper, embeddings, graph extraction)
+# run on a wide thread pool; CLIP/VLM share a single model thread because torch
+# already parallelises each forward pass internally.
+NETWORK_WORKERS = getattr(Config, "INDEX_NETWORK_WORKERS", 8)
+MODEL_WORKERS = getattr(Config, "INDEX_MODEL_WORKERS", 1)
+MAX_INFLIGHT_CHUNKS = getattr(Config, "INDEX_MAX_INFLIGHT_CHUNKS", 16)
+# Completed chunks are made durable (stores flushed) and reported every N chunks.
+CHECKPOINT_EVERY = getattr(Config, "INDEX_CHECKPOINT_EVERY", 16)
+# "online" extracts graph entities while indexing; "deferred" leaves them for a
+# bulk backfill through the Batch API (`python -m tools.graph_batch`).
+GRAPH_MODE = getattr(Config, "INDEX_GRAPH_MODE", "online")
+# Optional downscale of decoded frames (longest side, px); None keeps native size.
+FRAME_MAX_SIDE = getattr(Config, "FRAME_MAX_SIDE", None)
+
+# NanoVectorDB and networkx are not thread-safe; all store writes go through this.
+_store_lock = threading.Lock()
+
+
+def _transcribe(pcm, sample_rate):
+    try:
+        return metrics.call("index.transcribe", ai.transcribe_audio, pcm, sample_rate=sample_rate)
+    except Exception as e:
+        print(f"      ⚠️ Audio transcription failed: {e}")
+        return "[No Speech Detected]"
+
+
+def _index_chunk(chunk, net_pool, model_pool):
+    """
+    Runs the network and model stages for one decoded chunk.
+    Transcription, captioning and the CLIP embedding start together; the text
+    embedding and graph extraction fan out as soon as the text context exists.
+    """
+    with metrics.timed("index.chunk"):
+        _run_chunk_stages(chunk, net_pool, model_pool)
+
+
+def _run_chunk_stages(chunk, net_pool, model_pool):
+    chunk_id, start, end = chunk['id'], chunk['start'], chunk['end']
+    frames = chunk['frames']
+
+    transcript_future = net_pool.submit(_transcribe, chunk['audio'], chunk['sample_rate']) if chunk['audio'] is not None else None
+    caption_future = model_pool.submit(metrics.call, "index.caption", ai.generate_detailed_caption, frames[len(frames) // 2])
+    visual_future = model_pool.submit(metrics.call, "index.clip", ai.encode_images, frames)  # one batched CLIP pass
+
+    transcript = transcript_future.result() if transcript_future else "[No Speech Detected]"
+    visual_caption = caption_future.result()
+
+    full_text_context = f"Time: {start}-{end}s. Transcript: {transcript}. Visual Scene: {visual_caption}"
+
+    # Chunk metadata lives once in the chunk store; the indexes and graph reference it by ID.
+    with metrics.timed("index.upsert"):
+        chunk_store.upsert([{
+            "id": chunk_id, "video_id": chunk['video_id'], "namespace": chunk['namespace'],
+            "start": start, "end": end, "text": full_text_context,
+        }])
+
+    text_future = net_pool.submit(metrics.call, "index.text_embed", ai.get_text_embedding_openai, full_text_context)
+    graph_future = (net_pool.submit(metrics.call, "index.extract", ai.extract_graph_entities, full_text_context)
+                    if GRAPH_MODE == "online" else None)
+
+    # 3. CHANNEL 1: Visual Vector
+    try:
+        visual_records = _visual_records(chunk_id, visual_future.result())
+        with _store_lock, metrics.timed("index.upsert"):
+            vec_db.upsert_visual(visual_records)
+    except Exception as e:
+        print(f"      ⚠️ Visual embedding failed: {e}")
+
+    # 4. CHANNEL 2: Textual Vector
+    try:
+        text_embedding = text_future.result()
+        with _store_lock, metrics.timed("index.upsert"):
+            vec_db.upsert_text([{
+                "__id__": chunk_id,
+                "__vector__": text_embedding,
+            }])
+    except Exception as e:
+        print(f"      ⚠️ Text embedding failed: {e}")
+
+    # 5. CHANNEL 3: Graph Construction
+    if graph_future is None:
+        print(f"   ✔ Chunk {start}-{end}s indexed (graph deferred).")
+        return
+    try:
+        kg_data = graph_future.result()
+        with _store_lock, metrics.timed("index.upsert"):
+            graph_db.add_knowledge(
+                kg_data.get('entities', []),
+                kg_data.get('relations', []),
+                chunk_id
+            )
+    except Exception as e:
+        print(f"      ⚠️ Graph extraction failed: {e}")
+
+    print(f"   ✔ Chunk {start}-{end}s indexed.")
+
+
+def _visual_records(chunk_id, embeddings):
+    """Visual index records for a chunk's keyframe embeddings, per VISUAL_POOLING."""
+    if VISUAL_POOLING == "multi" and len(embeddings) > 1:
+        return [
+            {"__id__": f"{chunk_id}#{k}", "__vector__": vec, "chunk_id": chunk_id}
+            for k, vec in enumerate(embeddings)
+        ]
+    pooled = embeddings.max(axis=0) if VISUAL_POOLING == "max" else embeddings.mean(axis=0)
+    return [{"__id__": chunk_id, "__vector__": pooled / (np.linalg.norm(pooled) or 1.0)}]
+
+
+def chunk_id_for(video_id, start):
+    """Deterministic chunk ID, so re-indexing a window overwrites instead of duplicating it."""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"vidrag:{video_id}:{start}"))
+
+
+def _windows(extractor, chunk_len):
+    if CHUNKING == "scene":
+        return extractor.iter_scenes(target_len=chunk_len, max_keyframes=FRAMES_PER_CHUNK, **SCENE_OPTIONS)
+    return extractor.iter_chunks(chunk_len, frames_per_chunk=FRAMES_PER_CHUNK)
+
+
+def _decode_chunks(extractor, chunk_len, video_id, namespace, skip_starts):
+    """
+    Decode stage: streams in-memory keyframes and PCM audio per window.
+    The extractor reads the video sequentially, so this stays on the calling thread.
+    """
+    if not extractor.has_audio:
+        print("      ℹ️ No audio track found.")
+
+    windows = _windows(extractor, chunk_len)
+    while True:
+        # Timed per window, excluding the time the consumer spends blocked on backpressure.
+        with metrics.timed("index.decode"):
+            window = next(windows, None)
+        if window is None:
+            break
+        start, end = window['start'], window['end']
+        if start in skip_starts:
+            continue  # already indexed by an earlier, interrupted run
+        if not window['frames']:
+            print(f"      ⚠️ No frame decoded for {start}-{end}s, skipping.")
+            continue
+        print(f"   Decoding Chunk {start}-{end}s...")
+        yield {
+            "id": chunk_id_for(video_id, start),
+            "video_id": video_id,
+            "namespace": namespace,
+            "start": start,
+            "end": end,
+            "audio": window['audio'],
+            "sample_rate": extractor.sample_rate,
+            "frames": window['frames'],
+        }
+
+
+class IndexingCancelled(Exception):
+    """Raised inside process_video once its `cancel` event is set."""
+
+
+def process_video(video_path, chunk_len=None, network_workers=None, model_workers=None, max_inflight=None,
+                  video_id=None, namespace=None, skip_starts=(), on_progress=None, cancel=None):
+    """
+    Indexes a video through a staged pipeline:
+      decode (this thread) -> network pool (Whisper, embeddings, extraction)
+                           -> model pool (CLIP, VLM captioning)
+    At most `max_inflight` decoded chunks are pending at once, so the decoder
+    blocks (backpressure) instead of buffering the whole video in memory when
+    the downstream stages are slower.
+
+    The video's chunks are recorded under `namespace` (the default one if
+    None). Resumable: windows whose start time is in `skip_starts` are not
+    decoded again. Every CHECKPOINT_EVERY chunks the stores are flushed and
+    `on_progress(done, failed, total)` is called with the newly durable
+    windows as (start, end) pairs. Setting the `cancel` event stops decoding
+    (the chunks in flight still finish) and ends the run with an
+    IndexingCancelled error. Returns {"ok", "chunks_total", "error"}.
+    """
     print(f"🎬 Starting Advanced Indexing for: {video_path}")
-    
+    t0 = time.perf_counter()
+
+    chunk_len = chunk_len or CHUNK_LEN
+    network_workers = network_workers or NETWORK_WORKERS
+    model_workers = model_workers or MODEL_WORKERS
+    max_inflight = max_inflight or MAX_INFLIGHT_CHUNKS
+    video_id = video_id or os.path.basename(video_path)
+    skip_starts = set(skip_starts)
+
+    completed, failed = [], 0
+    progress_lock = threading.Lock()
+    chunks_total = 0
+
+    def on_chunk_done(future, start, end):
+        nonlocal failed
+        with progress_lock:
+            if future.exception() is None:
+                completed.append((start, end))
+            else:
+                print(f"      ⚠️ Chunk {start}s failed: {future.exception()}")
+                failed += 1
+
+    def checkpoint(force=False):
+        nonlocal failed
+        with progress_lock:
+            if not completed and not failed:
+                return
+            if not force and len(completed) + failed < CHECKPOINT_EVERY:
+                return
+            done, n_failed = list(completed), failed
+            completed.clear()
+            failed = 0
+        # The graph commits per chunk; only the buffered vector indexes need flushing.
+        with _store_lock, metrics.timed("index.flush"):
+            vec_db.flush()
+        if on_progress:
+            on_progress(done, n_failed, chunks_total)
+
     try:
-        with VideoFileClip(video_path) as clip:
-            duration = clip.duration
-            chunk_len = 30
-            
-            for start in range(0, int(duration), chunk_len):
-                end = min(start + chunk_len, duration)
-                mid_point = start + (end - start) / 2
-                chunk_id = str(uuid.uuid4())
-                
-                print(f"   Processing Chunk {start}-{end}s...")
-
-                # Define Temp Paths
-                temp_audio = os.path.join(Config.STORAGE_FOLDER, f"{chunk_id}.mp3")
-                temp_frame = os.path.join(Config.STORAGE_FOLDER, f"{chunk_id}.jpg")
-                
-                subclip = clip.subclip(start, end)
-                
-                # Audio Handling
-                transcript = "[No Speech Detected]"
-                if subclip.audio is not None:
-                    try:
-                        subclip.audio.write_audiofile(temp_audio, logger=None)
-                        transcript = ai.transcribe_audio(temp_audio)
-                    except Exception as e:
-                        print(f"      ⚠️ Audio extraction failed: {e}")
-                    finally:
-                        if os.path.exists(temp_audio): os.remove(temp_audio)
-                else:
-                    print("      ℹ️ No audio track found.")
-
-                # Frame Handling
-                clip.save_frame(temp_frame, t=mid_point)
-                visual_caption = ai.generate_detailed_caption(temp_frame) 
-                
-                full_text_context = f"Time: {start}-{end}s. Transcript: {transcript}. Visual Scene: {visual_caption}"
-
-                # --- FIX: Use Internal Keys (__vector__, __id__) ---
-
-                # 3. CHANNEL 1: Visual Vector
-                try:
-                    visual_embedding = ai.get_visual_embedding(temp_frame)
-                    vec_db.upsert_visual([{
-                        "__id__": chunk_id,
-                        "__vector__": visual_embedding,
-                        "metadata": {"text": full_text_context, "start": start, "end": end}
-                    }])
-                except Exception as e:
-                    print(f"      ⚠️ Visual embedding failed: {e}")
-
-                # 4. CHANNEL 2: Textual Vector
-                try:
-                    text_embedding = ai.get_text_embedding_openai(full_text_context)
-                    vec_db.upsert_text([{
-                        "__id__": chunk_id,
-                        "__vector__": text_embedding,
-                        "metadata": {"text": full_text_context, "start": start, "end": end}
-                    }])
-                except Exception as e:
-                    print(f"      ⚠️ Text embedding failed: {e}")
-
-                # 5. CHANNEL 3: Graph Construction
-                try:
-                    kg_data = ai.extract_graph_entities(full_text_context)
-                    graph_db.add_knowledge(
-                        kg_data.get('entities', []), 
-                        kg_data.get('relations', []), 
-                        chunk_id
-                    )
-                except Exception as e:
-                    print(f"      ⚠️ Graph extraction failed: {e}")
-
-                if os.path.exists(temp_frame): os.remove(temp_frame)
-
-            graph_db.save()
-            print("✅ Indexing Complete.")
+        extractor = MediaExtractor(video_path, max_side=FRAME_MAX_SIDE)
+        # An estimate for scene chunking, corrected once decoding finishes.
+        chunks_total = len(range(0, int(extractor.duration), chunk_len))
+        if on_progress:
+            on_progress([], 0, chunks_total)
+
+        with ThreadPoolExecutor(max_workers=network_workers, thread_name_prefix="index-net") as net_pool, \
+                ThreadPoolExecutor(max_workers=model_workers, thread_name_prefix="index-model") as model_pool, \
+                ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix="index-chunk") as chunk_pool:
+
+            slots = threading.BoundedSemaphore(max_inflight)
+            futures = []
+
+            decoded = 0
+            for chunk in _decode_chunks(extractor, chunk_len, video_id, namespace, skip_starts):
+                if cancel is not None and cancel.is_set():
+                    raise IndexingCancelled(f"Cancelled after {decoded} chunks")
+                decoded += 1
+                slots.acquire()
+                future = chunk_pool.submit(_index_chunk, chunk, net_pool, model_pool)
+                future.add_done_callback(
+                    lambda f, start=chunk['start'], end=chunk['end']: (on_chunk_done(f, start, end), slots.release()))
+                futures.append(future)
+                checkpoint()
+            chunks_total = decoded + len(skip_starts)
+
+            for future in futures:
+                future.exception()  # wait; failures are reported by on_chunk_done
+
+        checkpoint(force=True)
+        metrics.record("index.video", time.perf_counter() - t0)
+        metrics.incr("videos")
+        metrics.incr("video_seconds", round(extractor.duration, 3))
+        print("✅ Indexing Complete.")
+        if ai.cache:
+            for kind, counts in ai.cache.stats()["namespaces"].items():
+                print(f"   Cache {kind}: {counts['hits']} hits / {counts['misses']} misses")
+        emb = ai.embedder.stats()
+        print(f"   Embeddings: {emb['inputs']} inputs in {emb['requests']} requests "
+              f"({emb['mean_batch_size']:.1f}/request), {emb['rate_limited']} rate-limited retries")
+        return {"ok": True, "chunks_total": chunks_total, "error": None}
 
     except Exception as e:
-        print(f"❌ Critical Error processing video: {e}")
\ No newline at end of file
+        print(f"❌ Critical Error processing video: {e}")
+        return {"ok": False, "chunks_total": chunks_total, "error": str(e)}
+    finally:
+        # Persist whatever was indexed, even if the video failed part-way.
+        checkpoint(force=True)
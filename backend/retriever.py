@@ -1,53 +1,176 @@
-from services.ai_engine import AIEngine, client
-from services.vector_engine import VectorEngine
-from services.graph_engine import GraphEngine
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from services.ai_engine import client
+from services import runtime
+from services.metrics import metrics
+from services.answer_cache import open_default_answer_cache
+from services.relevance import open_default_relevance_filter
 from config import Config
 
-ai = AIEngine()
-vec_db = VectorEngine()
-graph_db = GraphEngine()
+# Process-wide singletons, shared with the indexer if both are imported. Models
+# and indexes load on first use (or at startup with Config.WARMUP).
+ai = runtime.ai_engine()
+vec_db = runtime.vector_engine()
+graph_db = runtime.graph_engine()
+chunk_store = runtime.chunk_store()
+# Semantic cache of final answers, invalidated per video through the chunk store's versions.
+answer_cache = open_default_answer_cache(chunk_store.versions)
+
+# Shared by all requests; each query fans out one task per retrieval path.
+_retrieval_pool = ThreadPoolExecutor(
+    max_workers=getattr(Config, "RETRIEVAL_WORKERS", 12),
+    thread_name_prefix="retrieval",
+)
+
+GRAPH_TOP_K = getattr(Config, "GRAPH_TOP_K", 3)
+
+# Optional second stage that drops irrelevant candidates before the answer prompt.
+# Its LLM judge has its own threads: calls abandoned at the budget must not
+# hold up the retrieval paths on _retrieval_pool.
+relevance_filter = open_default_relevance_filter(ai)
+
+
+def _timed(timings, stage, fn, *args, **kwargs):
+    """Runs fn and records its wall time in milliseconds under `stage`."""
+    t0 = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        timings[stage] = round((time.perf_counter() - t0) * 1000, 1)
+
+
+def _finish(timings, t_start):
+    """Sets the query's total and adds its stage timings to the process metrics (as query.<stage>)."""
+    timings["total"] = round((time.perf_counter() - t_start) * 1000, 1)
+    for stage, ms in timings.items():
+        metrics.record(f"query.{stage}", ms / 1000)
+
+
+class Scope:
+    """
+    Where a query searches: a namespace (tenant), some videos, both, or
+    (the default) the whole library. `chunk_ids` is None when unrestricted.
+    """
+
+    def __init__(self, namespace=None, video_ids=None):
+        self.namespace = namespace
+        self.video_ids = sorted(set(video_ids)) if video_ids is not None else None
+        restricted = namespace is not None or video_ids is not None
+        self.chunk_ids = chunk_store.scope_ids(namespace, self.video_ids) if restricted else None
+        # Answer cache partition; the unrestricted scope keeps the entries cached before scopes existed.
+        self.key = json.dumps([namespace, self.video_ids]) if restricted else ""
+
+
+LIBRARY_SCOPE = Scope()
+
+
+def _visual_path(plan, timings, scope):
+    """Path A: Visual Retrieval"""
+    if not plan.get('visual_query'):
+        return []
+    vis_query_emb = _timed(timings, "visual_encode", ai.get_text_embedding_clip, plan['visual_query'])
+    return _timed(timings, "visual_search", vec_db.search_visual, vis_query_emb, top_k=3, chunk_ids=scope.chunk_ids)
+
+
+def _text_path(plan, timings, scope):
+    """Path B: Textual Retrieval"""
+    text_query_emb = _timed(timings, "text_embed", ai.get_text_embedding_openai, plan['keyword_query'])
+    return _timed(timings, "text_search", vec_db.search_text, text_query_emb, top_k=3, chunk_ids=scope.chunk_ids)
 
-def query_videorag(user_query):
-    print(f"🔍 Processing Query: {user_query}")
 
+def _graph_path(plan, timings, scope):
+    """Path C: Graph Retrieval"""
+    entities = plan.get('entities') or []
+    if not entities:
+        return []
+    chunk_ids = _timed(timings, "graph_traverse", graph_db.retrieve_context, entities, top_k=GRAPH_TOP_K,
+                       chunk_ids=scope.chunk_ids)
+    return [{"__id__": chunk_id} for chunk_id in chunk_ids]
+
+
+def _hydrate(candidates):
+    """
+    Resolves candidate chunk IDs to their metadata with one batch lookup in
+    the chunk store. Chunks indexed before the chunk store existed fall back
+    to the metadata embedded in their vector records.
+    """
+    found = chunk_store.get_many(candidates)
+    legacy = [chunk_id for chunk_id in candidates if chunk_id not in found]
+    if legacy:
+        for record in vec_db.get_text_records(legacy):
+            candidates[record['__id__']] = candidates[record['__id__']] or record.get('metadata')
+    return [found.get(chunk_id) or candidates[chunk_id] for chunk_id in candidates]
+
+
+SYSTEM_PROMPT = """
+    You are VideoRAG, an advanced video assistant.
+    Answer the user's question based strictly on the provided Video Context.
+    Cite the timestamps (e.g., [10s-40s]) for every claim you make.
+    If the context is empty, say you don't know.
+    """
+
+
+def _rerank(user_query, query_emb, sources):
+    """Applies the relevance filter; on failure the unfiltered candidates are kept."""
+    try:
+        if query_emb is None:
+            query_emb = ai.get_text_embedding_openai(" ".join(user_query.lower().split()))
+        return relevance_filter.filter(query_emb, user_query, sources)
+    except Exception as e:
+        print(f"   ⚠️ Relevance filtering failed: {e}")
+        return sources
+
+
+def retrieve(user_query, timings, query_emb=None, scope=LIBRARY_SCOPE):
+    """
+    Plans the query, runs the retrieval paths within `scope` and, when
+    enabled, the relevance filter (`query_emb` is the query embedding, if the
+    caller already has it). Returns the chronologically sorted sources and
+    the LLM context string.
+
+    Called only after an answer cache miss, so a near-identical question
+    answered from the cache never pays for a planning call.
+    """
     # 1. Query Reformulation
-    plan = ai.decompose_query(user_query)
+    plan = _timed(timings, "plan", ai.decompose_query, user_query)
     print(f"   Plan: {plan}")
 
-    candidate_chunks = {} 
+    # 2-4. The visual, textual and graph paths are independent once the plan
+    # is known, so they run concurrently.
+    t_retrieval = time.perf_counter()
+    branches = [
+        ("visual", _retrieval_pool.submit(_visual_path, plan, timings, scope)),
+        ("text", _retrieval_pool.submit(_text_path, plan, timings, scope)),
+        ("graph", _retrieval_pool.submit(_graph_path, plan, timings, scope)),
+    ]
 
-    # 2. Path A: Visual Retrieval
-    if plan.get('visual_query'):
-        vis_query_emb = ai.get_text_embedding_clip(plan['visual_query'])
-        vis_results = vec_db.search_visual(vis_query_emb, top_k=3)
-        for res in vis_results:
+    candidate_chunks = {}
+    for name, future in branches:
+        try:
+            results = future.result()
+        except Exception as e:
+            print(f"   ⚠️ {name.capitalize()} retrieval failed: {e}")
+            continue
+        for res in results:
             # FIX: Access using __id__ and metadata key
             chunk_id = res.get('__id__')
             if chunk_id:
-                candidate_chunks[chunk_id] = res.get('metadata')
-
-    # 3. Path B: Textual Retrieval
-    text_query_emb = ai.get_text_embedding_openai(plan['keyword_query'])
-    text_results = vec_db.search_text(text_query_emb, top_k=3)
-    for res in text_results:
-        # FIX: Access using __id__
-        chunk_id = res.get('__id__')
-        if chunk_id:
-            candidate_chunks[chunk_id] = res.get('metadata')
-
-    # 4. Path C: Graph Retrieval (Simplified for Prototype)
-    # In a full production system, we would query metadata for these graph IDs.
-    # Here we skip explicitly fetching if not found in vector search to avoid complexity.
-    
+                candidate_chunks[chunk_id] = candidate_chunks.get(chunk_id) or res.get('metadata')
+    timings["retrieval"] = round((time.perf_counter() - t_retrieval) * 1000, 1)
+
     # 5. Context Integration
-    unique_sources = [v for v in candidate_chunks.values() if v is not None]
-    
+    sources = _timed(timings, "hydrate", _hydrate, candidate_chunks)
+    unique_sources = [v for v in sources if v is not None]
+    if relevance_filter and unique_sources:
+        unique_sources = _timed(timings, "rerank", _rerank, user_query, query_emb, unique_sources)
+
     # Sort by timestamp
     try:
         unique_sources.sort(key=lambda x: x['start'])
     except:
         pass # Handle cases where start time might be missing safely
-    
+
     context_str = ""
     for src in unique_sources:
         context_str += f"[Timestamp {src['start']}-{src['end']}s]: {src['text']}\n\n"
@@ -55,23 +178,144 @@ def query_videorag(user_query):
     if not context_str:
         context_str = "No relevant video segments found."
 
-    # 6. LLM Response Generation
-    system_prompt = """
-    You are VideoRAG, an advanced video assistant. 
-    Answer the user's question based strictly on the provided Video Context.
-    Cite the timestamps (e.g., [10s-40s]) for every claim you make.
-    If the context is empty, say you don't know.
+    return unique_sources, context_str
+
+
+def _cached_answer(user_query, timings, scope):
     """
+    Embeds the query and looks for an answer to a similar earlier query in the same scope.
+    Returns (query_embedding, hit); the embedding is reused to store the
+    new answer on a miss. Cache failures never fail the request.
+    """
+    if not answer_cache:
+        return None, None
+    try:
+        normalized = " ".join(user_query.lower().split())
+        query_emb = _timed(timings, "query_embed", ai.get_text_embedding_openai, normalized)
+        return query_emb, _timed(timings, "answer_cache", answer_cache.lookup, query_emb, scope.key)
+    except Exception as e:
+        print(f"   ⚠️ Answer cache lookup failed: {e}")
+        return None, None
 
-    response = client.chat.completions.create(
+
+def _store_answer(user_query, query_emb, answer, sources, scope):
+    if answer_cache and query_emb is not None:
+        try:
+            answer_cache.put(user_query, query_emb, answer, sources, scope.key)
+        except Exception as e:
+            print(f"   ⚠️ Answer cache store failed: {e}")
+
+
+def cache_stats():
+    return {
+        "content": ai.cache.stats() if ai.cache else None,
+        "answers": answer_cache.stats() if answer_cache else None,
+        "rerank": relevance_filter.stats() if relevance_filter else None,
+    }
+
+
+def list_videos(namespace=None):
+    return chunk_store.videos(namespace)
+
+
+def delete_video(video_id):
+    """
+    Removes one video from the chunk store, both vector indexes and the
+    graph, leaving the other videos untouched. Returns the number of chunks
+    removed. Answers cached from it become stale through its version bump.
+    """
+    chunk_ids = chunk_store.delete_video(video_id)
+    vec_db.delete(chunk_ids)
+    graph_db.delete_chunks(chunk_ids)
+    return len(chunk_ids)
+
+
+def _answer_messages(user_query, context_str):
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": f"Context:\n{context_str}\n\nUser Question: {user_query}"}
+    ]
+
+
+def query_videorag(user_query, namespace=None, video_ids=None):
+    """Answers a query from the whole library, or only from a namespace and/or some of its videos."""
+    print(f"🔍 Processing Query: {user_query}")
+    timings = {}
+    t_start = time.perf_counter()
+
+    scope = _timed(timings, "scope", Scope, namespace, video_ids)
+    query_emb, cached = _cached_answer(user_query, timings, scope)
+    if cached:
+        _finish(timings, t_start)
+        print(f"   Answer cache hit ({cached['similarity']:.3f}): {cached['query']}")
+        return {"answer": cached['answer'], "sources": cached['sources'], "timings": timings, "cached": True}
+
+    unique_sources, context_str = retrieve(user_query, timings, query_emb, scope)
+
+    # 6. LLM Response Generation
+    response = _timed(
+        timings, "llm", client.chat.completions.create,
         model=Config.LLM_MODEL,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": f"Context:\n{context_str}\n\nUser Question: {user_query}"}
-        ]
+        messages=_answer_messages(user_query, context_str)
     )
+    _finish(timings, t_start)
+    print(f"   Timings (ms): {timings}")
 
+    answer = response.choices[0].message.content
+    _store_answer(user_query, query_emb, answer, unique_sources, scope)
     return {
-        "answer": response.choices[0].message.content,
-        "sources": unique_sources
-    }
\ No newline at end of file
+        "answer": answer,
+        "sources": unique_sources,
+        "timings": timings,
+        "cached": False
+    }
+
+
+def stream_videorag(user_query, namespace=None, video_ids=None):
+    """
+    Streaming variant of query_videorag. Yields (event, payload) pairs:
+      ("sources", {"sources": [...]})  as soon as retrieval completes
+      ("token", {"text": "..."})       for each LLM delta as it arrives
+      ("done", {"timings": {...}, "cached": bool})  once the answer is complete
+    A cached answer arrives as a single token event. `namespace` and
+    `video_ids` restrict the search as in query_videorag.
+    """
+    print(f"🔍 Processing Streamed Query: {user_query}")
+    timings = {}
+    t_start = time.perf_counter()
+
+    scope = _timed(timings, "scope", Scope, namespace, video_ids)
+    query_emb, cached = _cached_answer(user_query, timings, scope)
+    if cached:
+        _finish(timings, t_start)
+        print(f"   Answer cache hit ({cached['similarity']:.3f}): {cached['query']}")
+        yield "sources", {"sources": cached['sources']}
+        yield "token", {"text": cached['answer']}
+        yield "done", {"timings": timings, "cached": True}
+        return
+
+    unique_sources, context_str = retrieve(user_query, timings, query_emb, scope)
+    yield "sources", {"sources": unique_sources}
+
+    t_llm = time.perf_counter()
+    stream = client.chat.completions.create(
+        model=Config.LLM_MODEL,
+        messages=_answer_messages(user_query, context_str),
+        stream=True
+    )
+    parts = []
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            parts.append(delta)
+            if "llm_first_token" not in timings:
+                timings["llm_first_token"] = round((time.perf_counter() - t_llm) * 1000, 1)
+            yield "token", {"text": delta}
+    timings["llm"] = round((time.perf_counter() - t_llm) * 1000, 1)
+    _finish(timings, t_start)
+    print(f"   Timings (ms): {timings}")
+
+    _store_answer(user_query, query_emb, "".join(parts), unique_sources, scope)
+    yield "done", {"timings": timings, "cached": False}
@@ -1,104 +1,457 @@
-import torch
-import open_clip
+import json
+import threading
+import numpy as np
 from PIL import Image
-from transformers import AutoModel, AutoTokenizer
 from openai import OpenAI
+from services.media_extractor import pcm_to_wav
+from services.cache import open_default_cache, content_hash, perceptual_hash
+from services.batching import MicroBatcher
+from services.embedding_client import open_default_embedding_client
+from services.runtime import loading
 from config import Config
 import os
 
+# torch, open_clip and transformers are imported when a model is first
+# loaded: importing them alone takes seconds, and the API process may never
+# need them.
+
 # Initialize OpenAI Client
-client = OpenAI(api_key=Config.OPENAI_API_KEY)
+client = OpenAI(api_key=Config.OPENAI_API_KEY, base_url=getattr(Config, "OPENAI_BASE_URL", None))
+
+CLIP_MODEL = 'ViT-B-32'
+# Embedding size of CLIP_MODEL, known without loading it.
+CLIP_DIM = 512
+VLM_MODEL = "openbmb/MiniCPM-V-2_6"
+WHISPER_MODEL = "whisper-1"
+# Chat models for graph extraction / relevance scoring and for query planning.
+# Both are part of their cache keys, so changing one never serves the old model's output.
+EXTRACTION_MODEL = getattr(Config, "EXTRACTION_MODEL", "gpt-4o-mini")
+QUERY_PLAN_MODEL = getattr(Config, "QUERY_PLAN_MODEL", "gpt-4o-mini")
 
 class AIEngine:
+    """
+    Model and API front end shared by indexing and retrieval.
+
+    Construction is cheap: OpenCLIP is loaded on the first CLIP encode and
+    the VLM on the first caption (GPU only), so a process that only plans
+    queries and embeds text never loads either. load_models() loads both
+    up front (see runtime.warmup).
+    """
+
     def __init__(self):
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        print(f"⚡ Loading AI Engine on {self.device}...")
-
-        # 1. VISUAL EMBEDDING MODEL (OpenCLIP)
-        print("Loading Visual Encoder (OpenCLIP)...")
-        self.clip_model, _, self.clip_preprocess = open_clip.create_model_and_transforms('ViT-B-32', pretrained='laion2b_s34b_b79k')
-        self.clip_model.to(self.device)
-        self.clip_tokenizer = open_clip.get_tokenizer('ViT-B-32')
-
-        # 2. VISION-LANGUAGE MODEL (Safe Load)
-        self.vlm_model = None
-        self.vlm_tokenizer = None
-        
-        # Only try loading VLM if on GPU, otherwise skip to save RAM/Time
-        if self.device == "cuda":
+        self.clip_batch_size = getattr(Config, "CLIP_BATCH_SIZE", 32)
+        self._model_lock = threading.Lock()
+        self._clip = None
+        self._vlm = None
+        self._device = None
+
+        # Content-addressed cache consulted before every model/API call.
+        self.cache = open_default_cache()
+
+        # Batching, rate-limited client pool for the OpenAI text embeddings.
+        self.embedder = open_default_embedding_client()
+
+        # Concurrent extraction / planning calls are packed into one request of
+        # up to *_BATCH_SIZE items; a batch size of 1 keeps one call per item.
+        self.extraction_batch_size = getattr(Config, "EXTRACTION_BATCH_SIZE", 8)
+        self._extraction_batcher = MicroBatcher(
+            self._extract_graph_entities_batch,
+            max_batch=self.extraction_batch_size,
+            max_wait=getattr(Config, "EXTRACTION_BATCH_WAIT", 0.5),
+            name="extraction-batch",
+        )
+        # Planning sits on the query path, so batching it trades a little
+        # latency per query for fewer requests; off unless a wait is set.
+        self.plan_batch_wait = getattr(Config, "QUERY_PLAN_BATCH_WAIT", 0)
+        self._plan_batcher = MicroBatcher(
+            self._decompose_queries,
+            max_batch=getattr(Config, "QUERY_PLAN_BATCH_SIZE", 8),
+            max_wait=self.plan_batch_wait,
+            name="plan-batch",
+        )
+
+    def load_models(self):
+        """Loads OpenCLIP and (on GPU) the VLM now rather than on first use."""
+        self._load_clip()
+        self._load_vlm()
+
+    @property
+    def device(self):
+        """"cuda" when torch sees a GPU, else "cpu" (also without torch); loads no model."""
+        if self._device is None:
             try:
-                print("Loading VLM (MiniCPM-V)...")
-                # Note: This still requires HF Login, but the try/except blocks the crash
-                self.vlm_model = AutoModel.from_pretrained("openbmb/MiniCPM-V-2_6", trust_remote_code=True, torch_dtype=torch.bfloat16).to(self.device)
-                self.vlm_tokenizer = AutoTokenizer.from_pretrained("openbmb/MiniCPM-V-2_6", trust_remote_code=True)
-                self.vlm_model.eval()
-            except Exception as e:
-                print(f"⚠️ VLM Load Skipped: {e}")
-                print("   -> System will run in 'Audio + Vector' mode (faster/lighter).")
-        else:
-            print("⚠️ CPU detected: Skipping heavy VLM to prevent crash. Using basic indexing.")
+                import torch
+                self._device = "cuda" if torch.cuda.is_available() else "cpu"
+            except ImportError:
+                self._device = "cpu"
+        return self._device
+
+    @property
+    def clip_model(self):
+        return self._load_clip()["model"]
+
+    @property
+    def clip_preprocess(self):
+        return self._load_clip()["preprocess"]
+
+    @property
+    def clip_tokenizer(self):
+        return self._load_clip()["tokenizer"]
 
-    def get_visual_embedding(self, image_path):
-        """Generates a dense vector for a video frame."""
-        image = self.clip_preprocess(Image.open(image_path)).unsqueeze(0).to(self.device)
-        with torch.no_grad():
-            image_features = self.clip_model.encode_image(image)
-        return image_features.cpu().numpy()[0].tolist()
+    @property
+    def vlm_model(self):
+        return self._load_vlm()["model"]
+
+    @property
+    def vlm_tokenizer(self):
+        return self._load_vlm()["tokenizer"]
+
+    def _load_clip(self):
+        if self._clip is not None:
+            return self._clip
+        with self._model_lock:
+            if self._clip is None:
+                with loading("clip"):
+                    import torch
+                    import open_clip
+
+                    device = self.device
+                    print(f"⚡ Loading models on {device}...")
+                    # CPU nodes: let torch use the configured number of intra-op threads.
+                    num_threads = getattr(Config, "TORCH_NUM_THREADS", None)
+                    if device == "cpu" and num_threads:
+                        torch.set_num_threads(num_threads)
+
+                    # 1. VISUAL EMBEDDING MODEL (OpenCLIP)
+                    print("Loading Visual Encoder (OpenCLIP)...")
+                    model, _, preprocess = open_clip.create_model_and_transforms(CLIP_MODEL, pretrained='laion2b_s34b_b79k')
+                    model.to(device)
+                    model.eval()
+                    self._clip = {
+                        "model": model, "preprocess": preprocess,
+                        "tokenizer": open_clip.get_tokenizer(CLIP_MODEL),
+                    }
+        return self._clip
+
+    def _load_vlm(self):
+        if self._vlm is not None:
+            return self._vlm
+        device = self.device
+        with self._model_lock:
+            if self._vlm is None:
+                # 2. VISION-LANGUAGE MODEL (Safe Load)
+                vlm = {"model": None, "tokenizer": None}
+                # Only try loading VLM if on GPU, otherwise skip to save RAM/Time
+                if device == "cuda":
+                    try:
+                        with loading("vlm"):
+                            import torch
+                            from transformers import AutoModel, AutoTokenizer
+
+                            print("Loading VLM (MiniCPM-V)...")
+                            # Note: This still requires HF Login, but the try/except blocks the crash
+                            model = AutoModel.from_pretrained(VLM_MODEL, trust_remote_code=True, torch_dtype=torch.bfloat16).to(device)
+                            vlm["tokenizer"] = AutoTokenizer.from_pretrained(VLM_MODEL, trust_remote_code=True)
+                            model.eval()
+                            vlm["model"] = model
+                    except Exception as e:
+                        print(f"⚠️ VLM Load Skipped: {e}")
+                        print("   -> System will run in 'Audio + Vector' mode (faster/lighter).")
+                else:
+                    print("⚠️ CPU detected: Skipping heavy VLM to prevent crash. Using basic indexing.")
+                self._vlm = vlm
+        return self._vlm
+
+    def get_visual_embedding(self, image):
+        """Generates a dense vector for a video frame (path, PIL image or HxWx3 array)."""
+        return self.encode_images([image])[0].tolist()
 
     def get_text_embedding_clip(self, text):
         """Generates a vector for a text query in the Visual Space."""
-        text_tokens = self.clip_tokenizer([text]).to(self.device)
-        with torch.no_grad():
-            text_features = self.clip_model.encode_text(text_tokens)
-        return text_features.cpu().numpy()[0].tolist()
+        return self.encode_texts([text])[0].tolist()
+
+    def encode_images(self, images, batch_size=None):
+        """
+        Batched CLIP image encoding.
+        Accepts file paths, PIL images or HxWx3 uint8 arrays (e.g. decoded frames)
+        and returns a contiguous float32 array of shape (len(images), dim).
+        """
+        images = [self._to_pil(img) for img in images]
+        return self._cached_batch("clip_image", [perceptual_hash(img) for img in images], images, self._encode_images, batch_size)
+
+    def _encode_images(self, images, batch_size=None):
+        import torch
+        batch_size = batch_size or self.clip_batch_size
+        outputs = []
+        for i in range(0, len(images), batch_size):
+            batch = torch.stack([self.clip_preprocess(img) for img in images[i:i + batch_size]])
+            with torch.inference_mode():
+                outputs.append(self.clip_model.encode_image(batch.to(self.device)).float().cpu().numpy())
+        return self._stack(outputs)
+
+    def encode_texts(self, texts, batch_size=None):
+        """Batched CLIP text encoding; returns a float32 array of shape (len(texts), dim)."""
+        texts = list(texts)
+        return self._cached_batch("clip_text", [content_hash(t) for t in texts], texts, self._encode_texts, batch_size)
+
+    def _encode_texts(self, texts, batch_size=None):
+        import torch
+        batch_size = batch_size or self.clip_batch_size
+        outputs = []
+        for i in range(0, len(texts), batch_size):
+            tokens = self.clip_tokenizer(list(texts[i:i + batch_size])).to(self.device)
+            with torch.inference_mode():
+                outputs.append(self.clip_model.encode_text(tokens).float().cpu().numpy())
+        return self._stack(outputs)
+
+    def _cached_batch(self, namespace, digests, items, encode, batch_size):
+        """Serves what it can from the cache and encodes only the misses, in one batched pass."""
+        if not items:
+            return self._stack([])  # without loading CLIP (or importing torch)
+        if not self.cache:
+            return encode(items, batch_size)
+        cached = [self.cache.get(namespace, CLIP_MODEL, d) for d in digests]
+        missing = [i for i, vec in enumerate(cached) if vec is None]
+        if missing:
+            fresh = encode([items[i] for i in missing], batch_size)
+            for i, vec in zip(missing, fresh):
+                self.cache.put(namespace, CLIP_MODEL, digests[i], vec)
+                cached[i] = vec
+        return np.ascontiguousarray(np.stack(cached), dtype=np.float32)
+
+    def _cached(self, namespace, model, digest, compute):
+        if not self.cache:
+            return compute()
+        return self.cache.get_or_compute(namespace, model, digest, compute)
+
+    def _stack(self, outputs):
+        if not outputs:
+            return np.empty((0, CLIP_DIM), dtype=np.float32)
+        return np.ascontiguousarray(np.concatenate(outputs), dtype=np.float32)
+
+    @staticmethod
+    def _to_pil(image):
+        if isinstance(image, Image.Image):
+            return image.convert('RGB')
+        if isinstance(image, np.ndarray):
+            return Image.fromarray(image).convert('RGB')
+        return Image.open(image).convert('RGB')
 
     def get_text_embedding_openai(self, text):
-        response = client.embeddings.create(input=text, model=Config.EMBEDDING_MODEL)
-        return response.data[0].embedding
+        """Coalesced with concurrent callers into batched embedding requests."""
+        return self._cached("text_embedding", Config.EMBEDDING_MODEL, content_hash(text), lambda: self.embedder.embed(text)).tolist()
+
+    def get_text_embeddings_openai(self, texts):
+        """Embeddings for many texts; cached ones are skipped and the rest sent in as few requests as possible."""
+        texts = list(texts)
+        digests = [content_hash(t) for t in texts]
+        results = [self.cache.get("text_embedding", Config.EMBEDDING_MODEL, d) if self.cache else None for d in digests]
+        missing = [i for i, r in enumerate(results) if r is None]
+        for i, vec in zip(missing, self.embedder.embed_many([texts[i] for i in missing])):
+            if self.cache:
+                self.cache.put("text_embedding", Config.EMBEDDING_MODEL, digests[i], vec)
+            results[i] = vec
+        return [r.tolist() for r in results]
 
-    def generate_detailed_caption(self, image_path):
-        """Safe captioning: returns placeholder if VLM is off."""
+    def generate_detailed_caption(self, image):
+        """Safe captioning: returns placeholder if VLM is off. Accepts a path, PIL image or frame array."""
         if not self.vlm_model: 
             return "Visual description unavailable (Running on CPU/No VLM)."
         
         try:
-            image = Image.open(image_path).convert('RGB')
+            image = self._to_pil(image)
             msgs = [{'role': 'user', 'content': 'Describe this video scene in detail.'}]
-            res = self.vlm_model.chat(image=image, msgs=msgs, tokenizer=self.vlm_tokenizer)
-            return res
+            return self._cached(
+                "caption", VLM_MODEL, perceptual_hash(image),
+                lambda: self.vlm_model.chat(image=image, msgs=msgs, tokenizer=self.vlm_tokenizer)
+            )
         except:
             return "Error analyzing frame."
 
-    def transcribe_audio(self, audio_path):
-        audio_file = open(audio_path, "rb")
-        transcription = client.audio.transcriptions.create(model="whisper-1", file=audio_file)
-        return transcription.text
+    def transcribe_audio(self, audio, sample_rate=16000):
+        """Transcribes an audio file path, or mono int16 PCM sent as an in-memory WAV."""
+        if isinstance(audio, np.ndarray):
+            audio_file = ("chunk.wav", pcm_to_wav(audio, sample_rate), "audio/wav")
+        else:
+            with open(audio, "rb") as f:
+                audio_file = (os.path.basename(audio), f.read())
+
+        def compute():
+            return client.audio.transcriptions.create(model=WHISPER_MODEL, file=audio_file).text
+        return self._cached("transcript", WHISPER_MODEL, content_hash(audio_file[1]), compute)
 
     def extract_graph_entities(self, text):
-        # ... (Keep existing code) ...
+        """Entities and relations for one chunk; concurrent calls share batched requests."""
+        if self.extraction_batch_size <= 1:
+            return self._cached("graph_extraction", EXTRACTION_MODEL, content_hash(text), lambda: self._extract_graph_entities(text))
+        return self._cached("graph_extraction", EXTRACTION_MODEL, content_hash(text), lambda: self._extraction_batcher.submit(text))
+
+    def extract_graph_entities_batch(self, texts):
+        """
+        Entities and relations for many chunks, EXTRACTION_BATCH_SIZE per
+        request; cached chunks are skipped. A chunk whose extraction failed
+        gets the exception in place of its result (and is not cached).
+        """
+        texts = list(texts)
+        digests = [content_hash(t) for t in texts]
+        results = [self.cache.get("graph_extraction", EXTRACTION_MODEL, d) if self.cache else None for d in digests]
+        missing = [i for i, r in enumerate(results) if r is None]
+        for start in range(0, len(missing), max(1, self.extraction_batch_size)):
+            group = missing[start:start + max(1, self.extraction_batch_size)]
+            for i, result in zip(group, self._extract_graph_entities_batch([texts[i] for i in group])):
+                if self.cache and not isinstance(result, Exception):
+                    self.cache.put("graph_extraction", EXTRACTION_MODEL, digests[i], result)
+                results[i] = result
+        return results
+
+    def _extract_graph_entities(self, text):
         prompt = f"""
         Extract Entities and Relations from: "{text}"
         Output strictly valid JSON:
         {{ "entities": [ {{"name": "X", "type": "Y"}} ], "relations": [ {{"source": "X", "target": "Y", "relation": "Z"}} ] }}
         """
         response = client.chat.completions.create(
-            model="gpt-4o-mini",
+            model=EXTRACTION_MODEL,
             messages=[{"role": "user", "content": prompt}],
             response_format={"type": "json_object"}
         )
-        import json
         return json.loads(response.choices[0].message.content)
 
+    def _extract_graph_entities_batch(self, texts):
+        def batched():
+            response = client.chat.completions.create(
+                model=EXTRACTION_MODEL,
+                messages=extraction_batch_messages(texts),
+                response_format={"type": "json_object"}
+            )
+            return parse_batch_response(response.choices[0].message.content, "chunks", len(texts))
+        return self._fill_missing(batched, texts, self._extract_graph_entities, "extraction")
+
     def decompose_query(self, user_query):
-        # ... (Keep existing code) ...
+        """Query plan; repeated questions (up to case and spacing) are served from the cache."""
+        normalized = " ".join(user_query.lower().split())
+        if self.plan_batch_wait > 0:
+            compute = lambda: self._plan_batcher.submit(user_query)
+        else:
+            compute = lambda: self._decompose_query(user_query)
+        return self._cached("query_plan", QUERY_PLAN_MODEL, content_hash(normalized), compute)
+
+    def _decompose_query(self, user_query):
         prompt = f"""
         Decompose query: "{user_query}"
         Output JSON: {{ "visual_query": "...", "keyword_query": "...", "entities": ["..."] }}
         """
         response = client.chat.completions.create(
-            model="gpt-4o-mini",
+            model=QUERY_PLAN_MODEL,
             messages=[{"role": "user", "content": prompt}],
             response_format={"type": "json_object"}
         )
-        import json
-        return json.loads(response.choices[0].message.content)
\ No newline at end of file
+        return json.loads(response.choices[0].message.content)
+
+    def _decompose_queries(self, queries):
+        def batched():
+            listing = "\n".join(f"[q{i}] {json.dumps(q)}" for i, q in enumerate(queries))
+            prompt = f"""
+            Decompose each of these queries:
+            {listing}
+            Output JSON with one plan per query ID:
+            {{ "plans": [ {{"id": "q0", "visual_query": "...", "keyword_query": "...", "entities": ["..."]}} ] }}
+            """
+            response = client.chat.completions.create(
+                model=QUERY_PLAN_MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                response_format={"type": "json_object"}
+            )
+            return parse_batch_response(response.choices[0].message.content, "plans", len(queries), prefix="q")
+        return self._fill_missing(batched, queries, self._decompose_query, "query planning")
+
+    def score_relevance(self, user_query, texts):
+        """
+        Relevance of several retrieved chunks to a query, 0-10 each, in one
+        request (the batched form of LLMEngine.check_relevance). A chunk the
+        response omits scores None.
+        """
+        listing = "\n".join(f"[c{i}] {json.dumps(t)}" for i, t in enumerate(texts))
+        prompt = f"""
+        Query: {json.dumps(user_query)}
+        Rate how useful each retrieved video chunk is for answering the query, from 0 (unrelated) to 10 (answers it):
+        {listing}
+        Output strictly valid JSON with one entry per chunk ID:
+        {{ "scores": [ {{"id": "c0", "score": 7}} ] }}
+        """
+        response = client.chat.completions.create(
+            model=EXTRACTION_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            response_format={"type": "json_object"},
+            temperature=0
+        )
+        results = parse_batch_response(response.choices[0].message.content, "scores", len(texts))
+        return [r.get("score") if r and isinstance(r.get("score"), (int, float)) else None for r in results]
+
+    @staticmethod
+    def _fill_missing(batched, items, single, label):
+        """
+        Results for the items of one MicroBatcher batch: `batched()` (one
+        request for all of them) when there are several, then one `single`
+        request per item the batched response lacks or garbled, or for every
+        item if the batched request failed. An item whose single request
+        fails gets the exception as its result, so it fails only its own
+        caller.
+        """
+        results = [None] * len(items)
+        if len(items) > 1:
+            try:
+                results = batched()
+            except Exception as e:
+                print(f"      ⚠️ Batched {label} failed ({e}); retrying {len(items)} items singly.")
+            else:
+                returned = sum(r is not None for r in results)
+                if returned < len(items):
+                    print(f"      ⚠️ Batched {label} returned {returned}/{len(items)} items; retrying the rest singly.")
+        for i in [i for i, r in enumerate(results) if r is None]:
+            try:
+                results[i] = single(items[i])
+            except Exception as e:
+                results[i] = e
+        return results
+
+
+def extraction_batch_messages(texts):
+    """Chat messages asking for entities and relations of several chunks, keyed c0, c1, ..."""
+    listing = "\n".join(f"[c{i}] {json.dumps(t)}" for i, t in enumerate(texts))
+    prompt = f"""
+    Extract Entities and Relations from each of these video chunks:
+    {listing}
+    Output strictly valid JSON with one entry per chunk ID:
+    {{ "chunks": [ {{"id": "c0", "entities": [ {{"name": "X", "type": "Y"}} ], "relations": [ {{"source": "X", "target": "Y", "relation": "Z"}} ] }} ] }}
+    """
+    return [{"role": "user", "content": prompt}]
+
+
+def parse_batch_response(content, key, count, prefix="c"):
+    """
+    Splits a batched JSON response into per-item results by ID. Items that
+    are missing or malformed (or all of them, if the JSON does not parse)
+    come back as None.
+    """
+    results = [None] * count
+    try:
+        entries = json.loads(content).get(key, [])
+    except (ValueError, AttributeError):
+        return results
+    for entry in entries if isinstance(entries, list) else []:
+        if not isinstance(entry, dict):
+            continue
+        item_id = str(entry.pop("id", ""))
+        if not item_id.startswith(prefix) or not item_id[len(prefix):].isdigit():
+            continue
+        index = int(item_id[len(prefix):])
+        if index < count:
+            results[index] = entry
+    if key == "chunks":
+        # An extraction entry must carry both lists to be usable.
+        results = [r if r and isinstance(r.get("entities"), list) else None for r in results]
+        for r in results:
+            if r is not None:
+                r.setdefault("relations", [])
+    return results
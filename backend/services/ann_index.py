@@ -0,0 +1,211 @@
+import os
+import numpy as np
+
+class IVFIndex:
+    """
+    Inverted-file (IVF) approximate nearest-neighbour index over the persisted
+    rows of an MmapVectorStore.
+
+    Vectors are clustered with spherical k-means into `nlist` lists; a query
+    scores only the rows in its `nprobe` closest lists (plus any unsaved rows
+    in the store), so cost scales with nprobe/nlist instead of the library
+    size. Raising nprobe trades latency for recall.
+
+    On disk, next to the store's files:
+      <base>.ivf.npz     centroids, training size and a build token
+      <base>.ivf.assign  build token followed by one int32 list id per store
+                         row, appended as rows are added
+    Until sync() has trained it (once the store holds `min_train` rows),
+    queries fall back to brute force. Only sync() and loading an
+    inconsistent index write these files; queries never do.
+    Training clusters a sample of at most 64 rows per list and `max_train`
+    rows overall, so its memory and time stay bounded as the store grows.
+    """
+
+    # Rows read from the store (and k-means rows processed) at a time.
+    BLOCK_ROWS = 16384
+
+    def __init__(self, store, nlist=None, nprobe=8, min_train=4096, max_train=100_000, retrain_growth=4.0, seed=0):
+        self.store = store
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train = min_train
+        self.max_train = max_train
+        self.retrain_growth = retrain_growth
+        self.rng = np.random.default_rng(seed)
+        self.centroids_path = f"{store.storage_file}.ivf.npz"
+        self.assign_path = f"{store.storage_file}.ivf.assign"
+
+        self.centroids = None
+        self.trained_rows = 0
+        self._token = 0
+        self._assign = np.empty(0, dtype=np.int32)
+        self._lists = []
+        self._load()
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    # --- Persistence ---------------------------------------------------------
+
+    def _load(self):
+        if not os.path.exists(self.centroids_path):
+            return
+        with np.load(self.centroids_path) as data:
+            self.centroids = data["centroids"]
+            self.trained_rows = int(data["trained_rows"])
+            self._token = int(data["token"])
+
+        assign = np.empty(0, dtype=np.int32)
+        consistent = False
+        if os.path.exists(self.assign_path):
+            raw = np.fromfile(self.assign_path, dtype=np.int32)
+            # A token mismatch means a retrain was interrupted; reassign below.
+            if len(raw) >= 2 and int(raw[:2].view(np.int64)[0]) == self._token:
+                assign = raw[2:len(self.store._data) + 2]
+                consistent = len(raw) - 2 == len(assign)
+
+        persisted = len(assign)
+        self._set_assign(assign)
+        if not consistent:
+            self._write_all()
+        elif len(self._assign) > persisted:
+            self._append_assign(self._assign[persisted:])
+
+    def _write_all(self):
+        self._token = int(self.rng.integers(1, 2 ** 62))
+        tmp = f"{self.centroids_path}.tmp.npz"
+        np.savez(tmp, centroids=self.centroids, trained_rows=self.trained_rows, token=self._token)
+        os.replace(tmp, self.centroids_path)
+
+        tmp = f"{self.assign_path}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(np.array([self._token], dtype=np.int64).tobytes())
+            f.write(self._assign.tobytes())
+        os.replace(tmp, self.assign_path)
+
+    def _append_assign(self, labels):
+        with open(self.assign_path, 'ab') as f:
+            f.write(labels.astype(np.int32).tobytes())
+
+    # --- Building ------------------------------------------------------------
+
+    def sync(self):
+        """
+        Trains, retrains or incrementally assigns rows the store has persisted
+        since the last call. Writes the index files, so it is only called by
+        the process saving the store, under its file lock (VectorEngine.flush).
+        """
+        rows = len(self.store._data)
+        if not self.is_trained:
+            if rows >= self.min_train:
+                self._train()
+            return
+        if rows >= self.trained_rows * self.retrain_growth:
+            self._train()
+            return
+        if rows > len(self._assign):
+            labels = self._label_rows(len(self._assign), rows)
+            self._append_assign(labels)
+            self._add_to_lists(len(self._assign), labels)
+            self._assign = np.concatenate([self._assign, labels])
+
+    def rebuild(self):
+        """Relabels every row against the current centroids (after the store's rows were renumbered by compact())."""
+        if self.is_trained:
+            self._set_assign(np.empty(0, dtype=np.int32))
+            self._write_all()
+
+    def _train(self):
+        rows = len(self.store._data)
+        nlist = self.nlist or int(np.clip(4 * np.sqrt(rows), 16, 4096))
+        sample_size = min(rows, 64 * nlist, self.max_train)
+        sample_rows = np.sort(self.rng.choice(rows, size=sample_size, replace=False))
+        sample = np.empty((sample_size, self.store.embedding_dim), dtype=np.float32)
+        for i in range(0, sample_size, self.BLOCK_ROWS):
+            block = sample_rows[i:i + self.BLOCK_ROWS]
+            sample[i:i + len(block)] = self._normalize(np.asarray(self.store._matrix[block], dtype=np.float32))
+
+        self.centroids = self._kmeans(sample, min(nlist, len(sample)))
+        self.trained_rows = rows
+        self._set_assign(np.empty(0, dtype=np.int32))
+        self._write_all()
+
+    def _kmeans(self, data, k, iterations=10):
+        centroids = data[self.rng.choice(len(data), size=k, replace=False)].copy()
+        for _ in range(iterations):
+            # Per-cluster sums accumulated block by block, so no copy of `data` is made.
+            sums = np.zeros_like(centroids)
+            counts = np.zeros(k, dtype=np.int64)
+            for i in range(0, len(data), self.BLOCK_ROWS):
+                block = data[i:i + self.BLOCK_ROWS]
+                labels = self._nearest(block, centroids)
+                order = np.argsort(labels, kind='stable')
+                block_counts = np.bincount(labels, minlength=k)
+                present = np.flatnonzero(block_counts)
+                starts = np.concatenate([[0], np.cumsum(block_counts)[:-1]])[present]
+                sums[present] += np.add.reduceat(block[order], starts, axis=0)
+                counts += block_counts
+            nonempty = counts > 0
+            centroids[nonempty] = self._normalize(sums[nonempty])
+            # Reseed empty clusters from random points.
+            empty = np.flatnonzero(~nonempty)
+            if len(empty):
+                centroids[empty] = data[self.rng.choice(len(data), size=len(empty), replace=False)]
+        return centroids.astype(np.float32)
+
+    def _label_rows(self, start, end):
+        labels = [np.empty(0, dtype=np.int32)]
+        for i in range(start, end, self.BLOCK_ROWS):
+            block = np.asarray(self.store._matrix[i:min(i + self.BLOCK_ROWS, end)], dtype=np.float32)
+            labels.append(self._nearest(block, self.centroids))
+        return np.concatenate(labels).astype(np.int32)
+
+    def _set_assign(self, assign):
+        """Rebuilds the inverted lists from `assign`, labelling any rows it does not cover."""
+        self._assign = assign.astype(np.int32)
+        self._lists = [np.empty(0, dtype=np.int64) for _ in range(len(self.centroids))]
+        self._add_to_lists(0, self._assign)
+        if len(self._assign) < len(self.store._data):
+            labels = self._label_rows(len(self._assign), len(self.store._data))
+            self._add_to_lists(len(self._assign), labels)
+            self._assign = np.concatenate([self._assign, labels])
+
+    def _add_to_lists(self, first_row, labels):
+        if not len(labels):
+            return
+        order = np.argsort(labels, kind='stable')
+        sorted_labels = labels[order]
+        bounds = np.flatnonzero(np.diff(sorted_labels)) + 1
+        for group in np.split(order, bounds):
+            label = labels[group[0]]
+            self._lists[label] = np.concatenate([self._lists[label], group + first_row])
+
+    # --- Search --------------------------------------------------------------
+
+    def query(self, query, top_k=10, nprobe=None, better_than_threshold=None):
+        """Read-only: rows persisted since the last sync() are scored exactly, like unsaved ones."""
+        if not self.is_trained:
+            return self.store.query(query, top_k=top_k, better_than_threshold=better_than_threshold)
+
+        query = self._normalize(np.asarray(query, dtype=np.float32))
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        probes = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        unassigned = np.arange(len(self._assign), len(self.store._data), dtype=np.int64)
+        rows = np.concatenate([*(self._lists[p] for p in probes), unassigned])
+        return self.store.query_rows(query, rows, top_k=top_k, better_than_threshold=better_than_threshold)
+
+    @staticmethod
+    def _nearest(data, centroids, max_scores=2 ** 24):
+        # Scored in row blocks so the score matrix stays under `max_scores` floats (64 MiB).
+        step = max(1, max_scores // max(1, len(centroids)))
+        labels = np.empty(len(data), dtype=np.int32)
+        for i in range(0, len(data), step):
+            labels[i:i + step] = np.argmax(data[i:i + step] @ centroids.T, axis=1)
+        return labels
+
+    @staticmethod
+    def _normalize(data):
+        norms = np.linalg.norm(data, axis=-1, keepdims=True)
+        return data / np.where(norms == 0, 1, norms)
@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import numpy as np
+from config import Config
+
+# Dependency key standing for "the library as a whole" (sum of all video versions).
+LIBRARY = "*"
+
+class SemanticAnswerCache:
+    """
+    Cache of final chat answers, looked up by cosine similarity of the
+    query embedding, so rephrasings of a question already answered
+    ("how do I reset the device?" / "how to reset the device") reuse the
+    answer.
+
+    Each entry records the index version of every video its sources came
+    from. An answer without sources records the library version instead,
+    since any new video could change it. A hit whose videos have been
+    re-indexed since is treated as stale and dropped. Entries expire after
+    `ttl` seconds, and the least recently used are evicted beyond
+    `max_entries`. Answers given within a search scope (a namespace or a
+    set of videos) are only reused for queries with the same scope.
+
+    `versions` is a callable returning {video_id: version} (ChunkStore.versions).
+    """
+
+    def __init__(self, path, versions, threshold=0.95, ttl=86400, max_entries=5000):
+        self.path = path
+        self.versions = versions
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.counts = {"hits": 0, "misses": 0, "stale": 0}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, query TEXT NOT NULL, embedding BLOB NOT NULL,"
+            " answer TEXT NOT NULL, sources TEXT NOT NULL, deps TEXT NOT NULL,"
+            " created_at REAL NOT NULL, last_access REAL NOT NULL, scope TEXT NOT NULL DEFAULT '')"
+        )
+        if "scope" not in {row[1] for row in self._conn.execute("PRAGMA table_info(answers)")}:
+            self._conn.execute("ALTER TABLE answers ADD COLUMN scope TEXT NOT NULL DEFAULT ''")
+        self._conn.commit()
+
+        # Normalized embeddings of live entries, scanned with one matrix product per lookup.
+        self._ids, self._scopes, self._matrix = [], [], None
+        rows = self._conn.execute(
+            "SELECT id, embedding, scope FROM answers WHERE created_at >= ? ORDER BY id", (time.time() - ttl,)
+        ).fetchall()
+        if rows:
+            self._ids = [row[0] for row in rows]
+            self._scopes = [row[2] for row in rows]
+            self._matrix = np.stack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+
+    def lookup(self, embedding, scope=""):
+        """The cached {"query", "answer", "sources", "similarity"} for a similar earlier query in `scope`, or None."""
+        query = self._normalize(embedding)
+        with self._lock:
+            if self._matrix is None:
+                self.counts["misses"] += 1
+                return None
+            scores = self._matrix @ query
+            scores[np.asarray(self._scopes) != scope] = -np.inf
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.counts["misses"] += 1
+                return None
+            entry_id = self._ids[best]
+            row = self._conn.execute(
+                "SELECT query, answer, sources, deps, created_at FROM answers WHERE id = ?", (entry_id,)
+            ).fetchone()
+            if row is None or row[4] < time.time() - self.ttl or not self._current(json.loads(row[3])):
+                self.counts["stale"] += 1
+                self._remove([entry_id])
+                return None
+            self._conn.execute("UPDATE answers SET last_access = ? WHERE id = ?", (time.time(), entry_id))
+            self._conn.commit()
+            self.counts["hits"] += 1
+        return {"query": row[0], "answer": row[1], "sources": json.loads(row[2]), "similarity": float(scores[best])}
+
+    def put(self, query_text, embedding, answer, sources, scope=""):
+        vector = self._normalize(embedding)
+        versions = self.versions()
+        video_ids = {src.get('video_id') for src in sources}
+        if not sources or None in video_ids:
+            deps = {LIBRARY: sum(versions.values())}
+        else:
+            deps = {video_id: versions.get(video_id, 0) for video_id in video_ids}
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO answers (query, embedding, answer, sources, deps, created_at, last_access, scope)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (query_text, vector.tobytes(), answer, json.dumps(sources), json.dumps(deps), now, now, scope),
+            )
+            self._conn.commit()
+            self._ids.append(cursor.lastrowid)
+            self._scopes.append(scope)
+            self._matrix = vector[None, :] if self._matrix is None else np.vstack([self._matrix, vector])
+            if len(self._ids) > self.max_entries:
+                self._evict()
+
+    def stats(self):
+        lookups = sum(self.counts.values())
+        return {**self.counts, "entries": len(self._ids), "hit_rate": self.counts["hits"] / max(1, lookups)}
+
+    def _current(self, deps):
+        versions = self.versions()
+        for video_id, version in deps.items():
+            current = sum(versions.values()) if video_id == LIBRARY else versions.get(video_id, 0)
+            if current != version:
+                return False
+        return True
+
+    def _evict(self):
+        """Drops expired entries, then least recently used ones down to 90% of max_entries. Caller holds the lock."""
+        expired = [row[0] for row in self._conn.execute(
+            "SELECT id FROM answers WHERE created_at < ?", (time.time() - self.ttl,))]
+        excess = len(self._ids) - len(expired) - int(self.max_entries * 0.9)
+        lru = [row[0] for row in self._conn.execute(
+            "SELECT id FROM answers WHERE created_at >= ? ORDER BY last_access LIMIT ?",
+            (time.time() - self.ttl, max(0, excess)))]
+        self._remove(expired + lru)
+
+    def _remove(self, entry_ids):
+        """Caller holds the lock."""
+        drop = set(entry_ids)
+        self._conn.executemany("DELETE FROM answers WHERE id = ?", [(i,) for i in drop])
+        self._conn.commit()
+        keep = [i for i, entry_id in enumerate(self._ids) if entry_id not in drop]
+        self._ids = [self._ids[i] for i in keep]
+        self._scopes = [self._scopes[i] for i in keep]
+        self._matrix = self._matrix[keep] if keep else None
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+
+def open_default_answer_cache(versions):
+    """The answer cache under STORAGE_FOLDER, or None when ANSWER_CACHE_ENABLED is False."""
+    if not getattr(Config, "ANSWER_CACHE_ENABLED", True):
+        return None
+    return SemanticAnswerCache(
+        os.path.join(Config.STORAGE_FOLDER, "answers.db"),
+        versions,
+        threshold=getattr(Config, "ANSWER_CACHE_THRESHOLD", 0.95),
+        ttl=getattr(Config, "ANSWER_CACHE_TTL", 86400),
+        max_entries=getattr(Config, "ANSWER_CACHE_MAX_ENTRIES", 5000),
+    )
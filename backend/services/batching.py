@@ -0,0 +1,92 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-item calls into batched calls.
+
+    `submit(item)` blocks until the item's result is ready. Items submitted
+    from any thread are collected until `max_batch` are waiting or the
+    oldest has waited `max_wait` seconds, then `batch_fn(items)` runs on a
+    pool of `max_concurrency` threads and must return one result per item,
+    in order. An exception from `batch_fn` is raised in every caller of
+    that batch; an exception instance returned as one item's result is
+    raised in that item's caller only.
+
+    With `weigh` and `max_weight`, a batch is also closed before its total
+    weight (e.g. tokens) would exceed `max_weight`; an item heavier than
+    that on its own still goes out, alone.
+    """
+
+    def __init__(self, batch_fn, max_batch=8, max_wait=0.2, max_concurrency=4, name="batcher",
+                 weigh=None, max_weight=None):
+        self.batch_fn = batch_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.name = name
+        self.weigh = weigh
+        self.max_weight = max_weight
+        self._queue = queue.Queue()
+        self._carry = None
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix=name)
+        self._collector = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, item):
+        future = Future()
+        self._ensure_started()
+        self._queue.put((item, future))
+        return future.result()
+
+    def _ensure_started(self):
+        # Started on first use, so merely importing or constructing is free.
+        if self._collector is None:
+            with self._start_lock:
+                if self._collector is None:
+                    self._collector = threading.Thread(target=self._collect, name=f"{self.name}-collector", daemon=True)
+                    self._collector.start()
+
+    def pending(self):
+        """Items submitted but not yet handed to a batch."""
+        return self._queue.qsize() + (self._carry is not None)
+
+    def _collect(self):
+        while True:
+            first, self._carry = self._carry or self._queue.get(), None
+            batch = [first]
+            weight = self._weight(first)
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    entry = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if self.max_weight is not None and weight + self._weight(entry) > self.max_weight:
+                    self._carry = entry  # opens the next batch
+                    break
+                batch.append(entry)
+                weight += self._weight(entry)
+            self._pool.submit(self._run, batch)
+
+    def _weight(self, entry):
+        return self.weigh(entry[0]) if self.weigh else 0
+
+    def _run(self, batch):
+        try:
+            results = self.batch_fn([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"{self.name}: expected {len(batch)} results, got {len(results)}")
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
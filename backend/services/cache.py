@@ -0,0 +1,150 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import Counter
+import numpy as np
+from PIL import Image
+from config import Config
+
+class ContentCache:
+    """
+    Persistent, size-bounded LRU cache for model and API outputs, keyed by the
+    content that produced them (audio hash, frame perceptual hash, text hash)
+    plus the model name. Backed by SQLite so the indexer workers and the API
+    process share it.
+    """
+
+    def __init__(self, path, max_bytes=2 * 1024 ** 3):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = Counter()
+        self.misses = Counter()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, kind TEXT NOT NULL, value BLOB NOT NULL,"
+            " size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries(last_access)")
+        self._conn.commit()
+        self._total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    # --- Keys ----------------------------------------------------------------
+
+    @staticmethod
+    def key(namespace, model, digest):
+        return f"{namespace}:{model}:{digest}"
+
+    # --- Access --------------------------------------------------------------
+
+    def get(self, namespace, model, digest):
+        """Returns the cached value or None, counting a hit or miss for `namespace`."""
+        key = self.key(namespace, model, digest)
+        with self._lock:
+            row = self._conn.execute("SELECT kind, value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses[namespace] += 1
+                return None
+            self._conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits[namespace] += 1
+        kind, value = row
+        if kind == "vector":
+            return np.frombuffer(value, dtype=np.float32).copy()
+        return json.loads(value)
+
+    def put(self, namespace, model, digest, value):
+        key = self.key(namespace, model, digest)
+        if isinstance(value, np.ndarray):
+            kind, blob = "vector", value.astype(np.float32).tobytes()
+        else:
+            kind, blob = "json", json.dumps(value).encode('utf-8')
+
+        with self._lock:
+            # A replaced entry's size leaves the total as the new one's enters it.
+            old = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, kind, value, size, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, kind, blob, len(blob), time.time()),
+            )
+            self._conn.commit()
+            self._total += len(blob) - (old[0] if old else 0)
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def get_or_compute(self, namespace, model, digest, compute):
+        value = self.get(namespace, model, digest)
+        if value is None:
+            value = compute()
+            self.put(namespace, model, digest, value)
+        return value
+
+    def stats(self):
+        namespaces = set(self.hits) | set(self.misses)
+        return {
+            "bytes": self._total,
+            "max_bytes": self.max_bytes,
+            "namespaces": {
+                ns: {
+                    "hits": self.hits[ns],
+                    "misses": self.misses[ns],
+                    "hit_rate": self.hits[ns] / max(1, self.hits[ns] + self.misses[ns]),
+                }
+                for ns in sorted(namespaces)
+            },
+        }
+
+    def _evict(self):
+        """Drops least-recently-used entries down to 90% of max_bytes. Caller holds the lock."""
+        # Other processes write to the same file; resync before deciding.
+        self._total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        target = self.max_bytes * 0.9
+        if self._total <= target:
+            return
+        victims, freed = [], 0
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY last_access"):
+            victims.append((key,))
+            freed += size
+            if self._total - freed <= target:
+                break
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", victims)
+        self._conn.commit()
+        self._total -= freed
+
+
+def content_hash(data):
+    """sha256 of text, bytes or a numpy buffer."""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    elif isinstance(data, np.ndarray):
+        data = np.ascontiguousarray(data).tobytes()
+    return hashlib.sha256(data).hexdigest()
+
+
+def perceptual_hash(image, hash_size=16):
+    """
+    Difference hash (dHash, hash_size² bits) of a frame: visually identical
+    frames from a re-encoded or re-uploaded video map to the same key.
+    """
+    if isinstance(image, np.ndarray):
+        image = Image.fromarray(image)
+    elif not isinstance(image, Image.Image):
+        image = Image.open(image)
+    pixels = np.asarray(image.convert('L').resize((hash_size + 1, hash_size), Image.BILINEAR), dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return np.packbits(bits).tobytes().hex()
+
+
+def open_default_cache():
+    """The shared cache under STORAGE_FOLDER, or None when CACHE_ENABLED is False."""
+    if not getattr(Config, "CACHE_ENABLED", True):
+        return None
+    return ContentCache(
+        os.path.join(Config.STORAGE_FOLDER, "cache.db"),
+        max_bytes=getattr(Config, "CACHE_MAX_BYTES", 2 * 1024 ** 3),
+    )
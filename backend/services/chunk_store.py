@@ -0,0 +1,181 @@
+import os
+import sqlite3
+import threading
+from config import Config
+
+# SQLite's default limit on bound parameters per statement.
+_MAX_PARAMS = 900
+
+# Search scopes kept resolved (see ChunkStore.scope_ids).
+SCOPE_CACHE_SIZE = getattr(Config, "SCOPE_CACHE_SIZE", 64)
+
+# Namespace (tenant) of videos indexed without one.
+DEFAULT_NAMESPACE = "default"
+
+class ChunkStore:
+    """
+    Single home for per-chunk metadata (video ID, time window, text context).
+    The vector indexes and the knowledge graph only hold chunk IDs and are
+    hydrated from here, so the text is stored once instead of per index.
+
+    Every video belongs to a namespace (tenant). Video IDs are unique across
+    namespaces (see video_id_for), so chunk IDs are too, and a search scope
+    (a namespace and/or some of its videos) resolves to chunk IDs here.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(Config.STORAGE_FOLDER, "chunks.db")
+        self._local = threading.local()
+        # Resolved search scopes, reused until any video's chunks change.
+        self._scopes = {}
+        self._scopes_lock = threading.Lock()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " id TEXT PRIMARY KEY, video_id TEXT NOT NULL,"
+            " start NUMERIC NOT NULL, end NUMERIC NOT NULL, text TEXT NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS chunks_video ON chunks(video_id, start)")
+        # Bumped on every write to a video's chunks; lets caches of answers
+        # derived from a video detect that it was re-indexed.
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS videos (video_id TEXT PRIMARY KEY, version INTEGER NOT NULL,"
+            f" namespace TEXT NOT NULL DEFAULT '{DEFAULT_NAMESPACE}')"
+        )
+        if "namespace" not in {row[1] for row in conn.execute("PRAGMA table_info(videos)")}:
+            # Stores written before namespaces existed: every video is in the default one.
+            conn.execute(f"ALTER TABLE videos ADD COLUMN namespace TEXT NOT NULL DEFAULT '{DEFAULT_NAMESPACE}'")
+        conn.execute("CREATE INDEX IF NOT EXISTS videos_namespace ON videos(namespace)")
+        conn.commit()
+
+    def _conn(self):
+        # One connection per thread; sqlite3 connections are not thread-safe.
+        if not hasattr(self._local, "conn"):
+            self._local.conn = sqlite3.connect(self.path, timeout=30)
+            self._local.conn.execute("PRAGMA journal_mode=WAL")
+        return self._local.conn
+
+    def upsert(self, chunks):
+        """
+        Inserts or replaces chunks given as {"id", "video_id", "start", "end",
+        "text"} and optionally "namespace".
+        """
+        conn = self._conn()
+        conn.executemany(
+            "INSERT OR REPLACE INTO chunks (id, video_id, start, end, text) VALUES (?, ?, ?, ?, ?)",
+            [(c['id'], c['video_id'], c['start'], c['end'], c['text']) for c in chunks],
+        )
+        videos = {c['video_id']: c.get('namespace') or DEFAULT_NAMESPACE for c in chunks}
+        conn.executemany(
+            "INSERT INTO videos (video_id, version, namespace) VALUES (?, 1, ?)"
+            " ON CONFLICT (video_id) DO UPDATE SET version = version + 1, namespace = excluded.namespace",
+            videos.items(),
+        )
+        conn.commit()
+
+    def delete_video(self, video_id):
+        """
+        Removes a video's chunks and returns their IDs. The video's version is
+        bumped rather than reset, so answers cached from the old chunks stay
+        stale even once it is indexed again.
+        """
+        conn = self._conn()
+        ids = [row[0] for row in conn.execute("SELECT id FROM chunks WHERE video_id = ?", (video_id,))]
+        conn.execute("DELETE FROM chunks WHERE video_id = ?", (video_id,))
+        conn.execute("UPDATE videos SET version = version + 1 WHERE video_id = ?", (video_id,))
+        conn.commit()
+        return ids
+
+    def get_many(self, ids):
+        """
+        Batch lookup by primary key. Returns {id: metadata} for the IDs that
+        exist, where metadata is {"text", "start", "end", "video_id"}.
+        """
+        ids = list(dict.fromkeys(ids))
+        found = {}
+        conn = self._conn()
+        for i in range(0, len(ids), _MAX_PARAMS):
+            batch = ids[i:i + _MAX_PARAMS]
+            rows = conn.execute(
+                f"SELECT id, video_id, start, end, text FROM chunks WHERE id IN ({','.join('?' * len(batch))})",
+                batch,
+            )
+            for chunk_id, video_id, start, end, text in rows:
+                found[chunk_id] = {"text": text, "start": start, "end": end, "video_id": video_id}
+        return found
+
+    def ids(self, video_id=None):
+        """Chunk IDs of one video (or all videos), in time order."""
+        if video_id is None:
+            rows = self._conn().execute("SELECT id FROM chunks ORDER BY video_id, start")
+        else:
+            rows = self._conn().execute("SELECT id FROM chunks WHERE video_id = ? ORDER BY start", (video_id,))
+        return [row[0] for row in rows]
+
+    def scope_ids(self, namespace=None, video_ids=None):
+        """
+        Chunk IDs of a search scope, as a frozenset: the given videos, all
+        videos of `namespace`, or both constraints at once. None means no
+        constraint. The last SCOPE_CACHE_SIZE scopes are kept and reused
+        until a video is written or deleted (by any process).
+        """
+        video_ids = tuple(dict.fromkeys(video_ids)) if video_ids is not None else None
+        key, generation = (namespace, video_ids), self.generation()
+        cached = self._scopes.get(key)
+        if cached is not None and cached[0] == generation:
+            return cached[1]
+
+        conn = self._conn()
+        clause, params = "", []
+        if namespace is not None:
+            clause, params = " AND video_id IN (SELECT video_id FROM videos WHERE namespace = ?)", [namespace]
+        if video_ids is None:
+            ids = frozenset(row[0] for row in conn.execute(f"SELECT id FROM chunks WHERE 1{clause}", params))
+        else:
+            ids = set()
+            for i in range(0, len(video_ids), _MAX_PARAMS - 1):
+                batch = video_ids[i:i + _MAX_PARAMS - 1]
+                rows = conn.execute(
+                    f"SELECT id FROM chunks WHERE video_id IN ({','.join('?' * len(batch))}){clause}", [*batch, *params]
+                )
+                ids.update(row[0] for row in rows)
+            ids = frozenset(ids)
+
+        with self._scopes_lock:
+            self._scopes.pop(key, None)
+            self._scopes[key] = (generation, ids)
+            while len(self._scopes) > SCOPE_CACHE_SIZE:
+                del self._scopes[next(iter(self._scopes))]
+        return ids
+
+    def generation(self):
+        """Grows whenever any video's chunks are written or deleted: the sum of the video versions."""
+        return self._conn().execute("SELECT COALESCE(SUM(version), 0) FROM videos").fetchone()[0]
+
+    def videos(self, namespace=None):
+        """[{"video_id", "namespace", "chunks"}] for every video with indexed chunks, optionally of one namespace."""
+        query = (
+            "SELECT v.video_id, v.namespace, COUNT(*) FROM videos v JOIN chunks c ON c.video_id = v.video_id"
+            + (" WHERE v.namespace = ?" if namespace is not None else "")
+            + " GROUP BY v.video_id ORDER BY v.namespace, v.video_id"
+        )
+        rows = self._conn().execute(query, () if namespace is None else (namespace,))
+        return [{"video_id": video_id, "namespace": ns, "chunks": count} for video_id, ns, count in rows]
+
+    def versions(self):
+        """{video_id: version} for every indexed video."""
+        return dict(self._conn().execute("SELECT video_id, version FROM videos"))
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+
+def video_id_for(namespace, filename):
+    """
+    Video ID of an uploaded file. Videos of the default namespace keep their
+    file name (the IDs earlier versions used); other namespaces prefix it,
+    so two tenants uploading the same file name do not collide.
+    """
+    if not namespace or namespace == DEFAULT_NAMESPACE:
+        return filename
+    return f"{namespace}/{filename}"
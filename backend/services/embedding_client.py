@@ -0,0 +1,247 @@
+import time
+import random
+import itertools
+import threading
+from collections import deque
+import numpy as np
+import openai
+from openai import OpenAI
+from services.batching import MicroBatcher
+from config import Config
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# OpenAI embeddings API limits per request, and per input.
+MAX_INPUTS_PER_REQUEST = 2048
+MAX_TOKENS_PER_REQUEST = 300_000
+MAX_TOKENS_PER_INPUT = 8191
+
+_RETRYABLE = (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError, openai.InternalServerError)
+
+
+class TokenBucket:
+    """
+    Tokens-per-minute limiter shared by all requests of one client pool.
+    `acquire(n)` blocks until n tokens are available. The rate adapts
+    (AIMD): `penalize()` (on a 429) cuts it by a quarter and `reward()` (on
+    success) adds back a tenth of the configured limit.
+    """
+
+    def __init__(self, tokens_per_minute):
+        self.limit = tokens_per_minute
+        self.rate = tokens_per_minute
+        self.capacity = tokens_per_minute
+        self.available = tokens_per_minute
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens):
+        # A request larger than a minute's budget waits for a full bucket.
+        tokens = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self.available >= tokens:
+                    self.available -= tokens
+                    return
+                wait = (tokens - self.available) / (self.rate / 60.0)
+            time.sleep(min(wait, 1.0))
+
+    def penalize(self):
+        with self._lock:
+            self.rate = max(self.limit * 0.05, self.rate * 0.75)
+
+    def reward(self):
+        with self._lock:
+            self.rate = min(self.limit, self.rate + self.limit * 0.1)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self._updated) * self.rate / 60.0)
+        self._updated = now
+
+
+class EmbeddingClient:
+    """
+    Batching, rate-limit-aware front end for the OpenAI embeddings API.
+
+    Concurrent `embed(text)` calls are coalesced by a MicroBatcher into
+    requests of up to `max_inputs` inputs / `max_tokens` tokens. The
+    requests are spread round-robin over a pool of clients, one per API key
+    or base URL. Requests are paced by a shared tokens-per-minute bucket.
+    Retryable failures (429, timeouts, 5xx) back off exponentially with
+    jitter, honouring Retry-After, and a 429 also lowers the bucket's rate.
+    `stats()` reports queue depth, in-flight requests and throughput.
+
+    Inputs are checked before they are batched: an empty text raises
+    ValueError in its caller, and a text over `max_input_tokens` is
+    truncated. If the API still rejects a coalesced request (400), it is
+    bisected so only the callers whose inputs it rejects get the error.
+    """
+
+    def __init__(self, model, clients, max_inputs=None, max_tokens=None, tpm_limit=None,
+                 max_wait=0.02, max_concurrency=4, max_retries=6, window=60.0, max_input_tokens=MAX_TOKENS_PER_INPUT):
+        self.model = model
+        self.clients = list(clients)
+        self._next_client = itertools.cycle(self.clients)
+        self.max_retries = max_retries
+        self.bucket = TokenBucket(tpm_limit) if tpm_limit else None
+        self._encoding = tiktoken.get_encoding("cl100k_base") if tiktoken else None
+        self.max_input_tokens = max_input_tokens
+
+        self.batcher = MicroBatcher(
+            self._embed_isolating,
+            max_batch=max_inputs or MAX_INPUTS_PER_REQUEST,
+            max_wait=max_wait,
+            max_concurrency=max_concurrency,
+            name="embedding-batch",
+            weigh=self.count_tokens,
+            max_weight=max_tokens or MAX_TOKENS_PER_REQUEST,
+        )
+
+        self._lock = threading.Lock()
+        self.window = window
+        self._recent = deque()  # (finished_at, inputs, tokens) per successful request
+        self.in_flight = 0
+        self.totals = {"requests": 0, "inputs": 0, "tokens": 0, "retries": 0, "rate_limited": 0, "failures": 0,
+                       "truncated": 0, "rejected": 0}
+
+    def count_tokens(self, text):
+        if self._encoding:
+            return len(self._encoding.encode(text))
+        return len(text) // 4 + 1  # ~4 characters per token for English text
+
+    def _prepare(self, text):
+        """`text` as sent to the API: ValueError if it is empty, cut to `max_input_tokens` if longer."""
+        if not isinstance(text, str) or not text.strip():
+            raise ValueError("Cannot embed an empty text")
+        if self.count_tokens(text) <= self.max_input_tokens:
+            return text
+        with self._lock:
+            self.totals["truncated"] += 1
+        if self._encoding:
+            return self._encoding.decode(self._encoding.encode(text)[:self.max_input_tokens])
+        return text[:(self.max_input_tokens - 1) * 4]
+
+    def embed(self, text):
+        """Embedding of one text as a float32 array; batched with concurrent callers."""
+        return self.batcher.submit(self._prepare(text))
+
+    def embed_many(self, texts):
+        """Embeddings of several texts, packed into as few requests as the limits allow."""
+        texts = [self._prepare(text) for text in texts]
+        results, batch, batch_tokens = [], [], 0
+        for text in texts:
+            tokens = self.count_tokens(text)
+            if batch and (len(batch) >= self.batcher.max_batch or batch_tokens + tokens > self.batcher.max_weight):
+                results.extend(self._embed_batch(batch))
+                batch, batch_tokens = [], 0
+            batch.append(text)
+            batch_tokens += tokens
+        if batch:
+            results.extend(self._embed_batch(batch))
+        return results
+
+    def _embed_isolating(self, texts):
+        """
+        _embed_batch for the MicroBatcher: when the API rejects the request,
+        halves are retried until the rejection is pinned to single inputs,
+        whose callers get the error (returned in place of their result).
+        """
+        try:
+            return self._embed_batch(texts)
+        except openai.BadRequestError as e:
+            if len(texts) == 1:
+                with self._lock:
+                    self.totals["rejected"] += 1
+                return [e]
+        mid = len(texts) // 2
+        return self._embed_isolating(texts[:mid]) + self._embed_isolating(texts[mid:])
+
+    def _embed_batch(self, texts):
+        tokens = sum(self.count_tokens(t) for t in texts)
+        if self.bucket:
+            # Charged once: a rejected attempt did not spend the budget it reserved.
+            self.bucket.acquire(tokens)
+        for attempt in range(self.max_retries + 1):
+            with self._lock:
+                self.in_flight += 1
+            try:
+                response = next(self._next_client).embeddings.create(input=texts, model=self.model)
+            except _RETRYABLE as e:
+                with self._lock:
+                    self.totals["retries"] += 1
+                    if isinstance(e, openai.RateLimitError):
+                        self.totals["rate_limited"] += 1
+                if isinstance(e, openai.RateLimitError) and self.bucket:
+                    self.bucket.penalize()
+                if attempt == self.max_retries:
+                    with self._lock:
+                        self.totals["failures"] += 1
+                    raise
+                time.sleep(self._backoff(e, attempt))
+                continue
+            finally:
+                with self._lock:
+                    self.in_flight -= 1
+
+            if self.bucket:
+                self.bucket.reward()
+            self._record(len(texts), tokens)
+            ordered = sorted(response.data, key=lambda d: d.index)
+            return [np.asarray(d.embedding, dtype=np.float32) for d in ordered]
+
+    @staticmethod
+    def _backoff(error, attempt):
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return min(30.0, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+    def _record(self, inputs, tokens):
+        now = time.monotonic()
+        with self._lock:
+            self.totals["requests"] += 1
+            self.totals["inputs"] += inputs
+            self.totals["tokens"] += tokens
+            self._recent.append((now, inputs, tokens))
+            while self._recent and self._recent[0][0] < now - self.window:
+                self._recent.popleft()
+
+    def stats(self):
+        with self._lock:
+            now = time.monotonic()
+            recent = [r for r in self._recent if r[0] >= now - self.window]
+            span = min(self.window, now - recent[0][0]) if len(recent) > 1 else self.window
+            return {
+                **self.totals,
+                "queue_depth": self.batcher.pending(),
+                "in_flight": self.in_flight,
+                "inputs_per_sec": sum(r[1] for r in recent) / span,
+                "tokens_per_sec": sum(r[2] for r in recent) / span,
+                "mean_batch_size": self.totals["inputs"] / max(1, self.totals["requests"]),
+                "tpm_rate": self.bucket.rate if self.bucket else None,
+            }
+
+
+def open_default_embedding_client():
+    """EmbeddingClient for Config.EMBEDDING_MODEL over one client per configured API key."""
+    keys = getattr(Config, "OPENAI_API_KEYS", None) or [Config.OPENAI_API_KEY]
+    base_url = getattr(Config, "OPENAI_BASE_URL", None)
+    # Retries are handled (and counted) by EmbeddingClient, not the SDK.
+    clients = [OpenAI(api_key=key, base_url=base_url, max_retries=0) for key in keys]
+    return EmbeddingClient(
+        Config.EMBEDDING_MODEL,
+        clients,
+        max_inputs=getattr(Config, "EMBEDDING_BATCH_SIZE", None),
+        tpm_limit=getattr(Config, "EMBEDDING_TPM_LIMIT", None),
+        max_wait=getattr(Config, "EMBEDDING_BATCH_WAIT", 0.02),
+        max_concurrency=getattr(Config, "EMBEDDING_CONCURRENCY", 4),
+    )
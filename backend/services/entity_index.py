@@ -0,0 +1,87 @@
+import re
+from collections import Counter, defaultdict
+
+_ARTICLES = {"the", "a", "an"}
+_NON_WORD = re.compile(r"[^\w\s]+")
+
+
+def normalize_entity(name):
+    """
+    Canonical form used for graph node keys and lookups: lowercase, no
+    punctuation, collapsed whitespace and no leading article, so
+    "The Eiffel Tower" and "eiffel-tower" land on the same node.
+    """
+    tokens = _NON_WORD.sub(" ", name.lower()).split()
+    if len(tokens) > 1 and tokens[0] in _ARTICLES:
+        tokens = tokens[1:]
+    return " ".join(tokens)
+
+
+def _trigrams(name):
+    padded = f"  {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class EntityIndex:
+    """
+    Lookup structure from query entity strings to graph nodes.
+
+    Exact matches go through a dict on the normalized name; misses fall back
+    to fuzzy matching by character-trigram Jaccard similarity, scored only
+    over candidates that share a trigram with the query (inverted postings),
+    so lookup cost does not grow with the number of entities.
+    """
+
+    def __init__(self, threshold=0.5, max_posting=5000):
+        self.threshold = threshold
+        # Trigrams shared by more names than this (e.g. " th") are skipped
+        # when gathering candidates; they carry little signal.
+        self.max_posting = max_posting
+        self._nodes = defaultdict(set)     # normalized name -> graph node keys
+        self._postings = defaultdict(set)  # trigram -> normalized names
+        self._sizes = {}                   # normalized name -> trigram count
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def add(self, node):
+        name = normalize_entity(node)
+        if not name:
+            return
+        if name not in self._nodes:
+            grams = _trigrams(name)
+            self._sizes[name] = len(grams)
+            for gram in grams:
+                self._postings[gram].add(name)
+        self._nodes[name].add(node)
+
+    def lookup(self, query, limit=5):
+        """
+        Returns up to `limit` (node, similarity) pairs for a query entity,
+        best first. An exact normalized match has similarity 1.0 and
+        short-circuits fuzzy matching.
+        """
+        name = normalize_entity(query)
+        if not name:
+            return []
+        if name in self._nodes:
+            return [(node, 1.0) for node in self._nodes[name]]
+
+        grams = _trigrams(name)
+        overlap = Counter()
+        for gram in grams:
+            posting = self._postings.get(gram)
+            if posting and len(posting) <= self.max_posting:
+                overlap.update(posting)
+
+        scored = []
+        for candidate, shared in overlap.items():
+            similarity = shared / (len(grams) + self._sizes[candidate] - shared)
+            if similarity >= self.threshold:
+                scored.append((similarity, candidate))
+        scored.sort(reverse=True)
+
+        matches = []
+        for similarity, candidate in scored[:limit]:
+            matches.extend((node, similarity) for node in self._nodes[candidate])
+        return matches[:limit]
@@ -1,13 +1,69 @@
 import networkx as nx
+import heapq
 import json
+import math
 import os
+import sqlite3
+import threading
+import time
+from services.entity_index import EntityIndex, normalize_entity
+from services.runtime import loading
+from services.sqlite_tx import Transaction
 from config import Config
 
+# SQLite's default limit on bound parameters per statement.
+_MAX_PARAMS = 900
+
 class GraphEngine:
-    def __init__(self):
-        self.graph_path = os.path.join(Config.STORAGE_FOLDER, "knowledge_graph.json")
-        self.G = nx.Graph()
-        self.load()
+    """
+    Knowledge graph over the indexed chunks, persisted incrementally in
+    SQLite: every add_knowledge call is one committed transaction, so a
+    chunk's entities and relations are durable as soon as they are
+    extracted. Each table row has an increasing ID, and `refresh` loads only
+    rows newer than the last ones seen into the in-memory networkx graph.
+    This is how the chat server picks up what the indexing workers add.
+    Deleting a video's chunks bumps a generation counter instead, and a
+    process that sees a new generation reloads the graph in full.
+
+    Writes only insert: an indexing worker never loads the graph or the
+    entity index. Nothing is loaded until the first refresh or retrieval,
+    which also picks up whatever was written since.
+    """
+
+    def __init__(self, path=None):
+        self.db_path = path or os.path.join(Config.STORAGE_FOLDER, "knowledge_graph.db")
+        self.legacy_path = os.path.join(os.path.dirname(self.db_path), "knowledge_graph.json")
+        self._lock = threading.Lock()
+        self._reset()
+
+        self._conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entities ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL UNIQUE, type TEXT)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS mentions ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, entity TEXT NOT NULL, chunk_id TEXT NOT NULL, UNIQUE (entity, chunk_id))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS relations ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, source TEXT NOT NULL, target TEXT NOT NULL, relation TEXT,"
+            " UNIQUE (source, target))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS mentions_chunk ON mentions(chunk_id)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS graph_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._conn.execute("INSERT OR IGNORE INTO graph_meta (key, value) VALUES ('generation', 0)")
+
+        # Retrieval defaults: expansion depth, score decay per hop, neighbours
+        # expanded per node, and the wall-clock budget for one traversal.
+        self.hops = getattr(Config, "GRAPH_HOPS", 2)
+        self.hop_decay = getattr(Config, "GRAPH_HOP_DECAY", 0.5)
+        self.max_expand = getattr(Config, "GRAPH_MAX_EXPAND", 32)
+        self.budget_ms = getattr(Config, "GRAPH_BUDGET_MS", 50)
+
+        self._import_legacy()
 
     def add_knowledge(self, entities, relations, source_chunk_id):
         """
@@ -16,48 +72,197 @@ class GraphEngine:
         Edges = Relations.
         Metadata = Link back to the video chunk (source_chunk_id).
         """
+        names = {}
         for ent in entities:
-            name = ent['name'].lower()
-            if not self.G.has_node(name):
-                self.G.add_node(name, type=ent['type'], chunks=[])
-            
-            # Link entity to video chunk
-            if source_chunk_id not in self.G.nodes[name]['chunks']:
-                self.G.nodes[name]['chunks'].append(source_chunk_id)
+            name = normalize_entity(ent['name'])
+            if name:
+                names.setdefault(name, ent.get('type'))
+        edges = [
+            (normalize_entity(rel['source']), normalize_entity(rel['target']), rel['relation'])
+            for rel in relations
+        ]
+
+        with self._lock:
+            with Transaction(self._conn) as conn:
+                conn.executemany("INSERT OR IGNORE INTO entities (name, type) VALUES (?, ?)", names.items())
+                # Link entity to video chunk
+                conn.executemany(
+                    "INSERT OR IGNORE INTO mentions (entity, chunk_id) VALUES (?, ?)",
+                    [(name, source_chunk_id) for name in names],
+                )
+                # Only between known entities; re-inserting an edge replaces its relation.
+                conn.executemany(
+                    "INSERT OR REPLACE INTO relations (source, target, relation)"
+                    " SELECT ?1, ?2, ?3 WHERE EXISTS (SELECT 1 FROM entities WHERE name = ?1)"
+                    " AND EXISTS (SELECT 1 FROM entities WHERE name = ?2)",
+                    edges,
+                )
+
+    def delete_chunks(self, chunk_ids):
+        """
+        Removes the chunks' mentions, then the entities no other chunk
+        mentions and their relations. Loaded graphs (this process's too)
+        reload on their next refresh.
+        """
+        chunk_ids = list(set(chunk_ids))
+        with self._lock:
+            with Transaction(self._conn) as conn:
+                touched = set()
+                for i in range(0, len(chunk_ids), _MAX_PARAMS):
+                    batch = chunk_ids[i:i + _MAX_PARAMS]
+                    marks = ','.join('?' * len(batch))
+                    touched.update(row[0] for row in conn.execute(
+                        f"SELECT DISTINCT entity FROM mentions WHERE chunk_id IN ({marks})", batch))
+                    conn.execute(f"DELETE FROM mentions WHERE chunk_id IN ({marks})", batch)
+                orphans = [(name,) for name in touched
+                           if not conn.execute("SELECT 1 FROM mentions WHERE entity = ? LIMIT 1", (name,)).fetchone()]
+                conn.executemany("DELETE FROM relations WHERE source = ?1 OR target = ?1", orphans)
+                conn.executemany("DELETE FROM entities WHERE name = ?", orphans)
+                conn.execute("UPDATE graph_meta SET value = value + 1 WHERE key = 'generation'")
+        return len(orphans)
+
+    def linked_chunks(self):
+        """IDs of every chunk that has at least one entity in the graph."""
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT DISTINCT chunk_id FROM mentions")}
+
+    def refresh(self):
+        """Loads entities, mentions and relations written (by any process) since the last refresh."""
+        with self._lock:
+            self._refresh()
+
+    def _reset(self):
+        self.G = nx.Graph()
+        self.entities = EntityIndex(threshold=getattr(Config, "GRAPH_FUZZY_THRESHOLD", 0.5))
+        self._seen = {"entities": 0, "mentions": 0, "relations": 0}
+        self._generation = None
+
+    def _refresh(self):
+        if self._generation is None:
+            # First load: the whole graph and entity index.
+            with loading("graph"):
+                return self._load_new()
+        return self._load_new()
 
-        for rel in relations:
-            src = rel['source'].lower()
-            tgt = rel['target'].lower()
-            if self.G.has_node(src) and self.G.has_node(tgt):
-                self.G.add_edge(src, tgt, relation=rel['relation'])
+    def _load_new(self):
+        with Transaction(self._conn, "BEGIN") as conn:
+            generation = conn.execute("SELECT value FROM graph_meta WHERE key = 'generation'").fetchone()[0]
+            if generation != self._generation:
+                # Rows were deleted since the last load; start over from an empty graph.
+                self._reset()
+                self._generation = generation
+            new_entities = conn.execute(
+                "SELECT id, name, type FROM entities WHERE id > ? ORDER BY id", (self._seen["entities"],)
+            ).fetchall()
+            new_mentions = conn.execute(
+                "SELECT id, entity, chunk_id FROM mentions WHERE id > ? ORDER BY id", (self._seen["mentions"],)
+            ).fetchall()
+            new_relations = conn.execute(
+                "SELECT id, source, target, relation FROM relations WHERE id > ? ORDER BY id", (self._seen["relations"],)
+            ).fetchall()
+
+        for row_id, name, ent_type in new_entities:
+            if not self.G.has_node(name):
+                self.G.add_node(name, type=ent_type, chunks=set())
+                self.entities.add(name)
+            self._seen["entities"] = row_id
+        for row_id, name, chunk_id in new_mentions:
+            self.G.nodes[name]['chunks'].add(chunk_id)
+            self._seen["mentions"] = row_id
+        for row_id, src, tgt, relation in new_relations:
+            self.G.add_edge(src, tgt, relation=relation)
+            self._seen["relations"] = row_id
 
-    def retrieve_context(self, entities, hops=1):
+    def retrieve_context(self, entities, hops=None, budget_ms=None, top_k=None, chunk_ids=None):
         """
         Traverses the graph to find related video chunks.
         Input: List of entities from the user query.
-        Output: Set of chunk IDs that contain these entities or their neighbors.
+        Output: Chunk IDs ranked by relevance, best first.
+
+        Query entities are resolved through the entity index (exact, then
+        fuzzy). From those seeds a breadth-first expansion runs for up to
+        `hops` hops, following at most `max_expand` neighbours per node
+        (most connected first). A chunk scores the sum, over entities that
+        mention it, of match similarity · hop_decay^hop, damped for entities
+        that appear in many chunks. Expansion stops early once `budget_ms`
+        has elapsed; the chunks scored so far are returned.
+
+        With `chunk_ids` (a search scope), expansion still follows entities
+        shared with other videos, but only chunks in the scope are scored.
         """
-        relevant_chunks = set()
+        with self._lock:
+            self._refresh()
+            return self._retrieve(entities, hops, budget_ms, top_k, None if chunk_ids is None else set(chunk_ids))
+
+    def _retrieve(self, entities, hops, budget_ms, top_k, scope=None):
+        hops = self.hops if hops is None else hops
+        budget_ms = self.budget_ms if budget_ms is None else budget_ms
+        deadline = time.perf_counter() + budget_ms / 1000
+
+        # Best weight each node was reached with.
+        weights = {}
         for entity in entities:
-            entity = entity.lower()
-            if self.G.has_node(entity):
-                # 0-hop: The entity itself
-                relevant_chunks.update(self.G.nodes[entity]['chunks'])
-                
-                # 1-hop: Neighbors
-                if hops > 0:
-                    for neighbor in self.G.neighbors(entity):
-                        relevant_chunks.update(self.G.nodes[neighbor]['chunks'])
-        
-        return list(relevant_chunks)
-
-    def save(self):
-        data = nx.node_link_data(self.G)
-        with open(self.graph_path, 'w') as f:
-            json.dump(data, f)
-
-    def load(self):
-        if os.path.exists(self.graph_path):
-            with open(self.graph_path, 'r') as f:
-                data = json.load(f)
-            self.G = nx.node_link_graph(data)
\ No newline at end of file
+            for node, similarity in self.entities.lookup(entity):
+                if self.G.has_node(node):
+                    weights[node] = max(weights.get(node, 0.0), similarity)
+
+        scores = {}
+        self._score_chunks(weights, scores, scope=scope)
+
+        frontier = weights.copy()
+        for _ in range(hops):
+            if not frontier or time.perf_counter() > deadline:
+                break
+            next_frontier = {}
+            for node, weight in frontier.items():
+                for neighbor in heapq.nlargest(self.max_expand, self.G.neighbors(node), key=self.G.degree):
+                    reached = weight * self.hop_decay
+                    if reached > max(weights.get(neighbor, 0.0), next_frontier.get(neighbor, 0.0)):
+                        next_frontier[neighbor] = reached
+                if time.perf_counter() > deadline:
+                    break
+            weights.update(next_frontier)
+            # Hop by hop, so a budget cut keeps the closer (higher scoring) hops complete.
+            if not self._score_chunks(next_frontier, scores, deadline, scope):
+                break
+            frontier = next_frontier
+
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        return ranked[:top_k] if top_k else ranked
+
+    def _score_chunks(self, weights, scores, deadline=None, scope=None):
+        """
+        Adds each node's damped weight to the chunks it is linked to (those in
+        `scope`, if given). False if the deadline hit.
+        """
+        for node, weight in weights.items():
+            if deadline and time.perf_counter() > deadline:
+                return False
+            chunks = self.G.nodes[node]['chunks']
+            damped = weight / (1.0 + math.log(max(1, len(chunks))))
+            for chunk_id in chunks if scope is None else chunks & scope:
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + damped
+        return True
+
+    def _import_legacy(self):
+        """One-time import of the knowledge_graph.json written by earlier versions."""
+        if not os.path.exists(self.legacy_path):
+            return
+        if self._conn.execute("SELECT 1 FROM entities LIMIT 1").fetchone():
+            return
+        with open(self.legacy_path, 'r') as f:
+            legacy = nx.node_link_graph(json.load(f))
+        with Transaction(self._conn) as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO entities (name, type) VALUES (?, ?)",
+                [(name, attrs.get('type')) for name, attrs in legacy.nodes(data=True)],
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO mentions (entity, chunk_id) VALUES (?, ?)",
+                [(name, chunk_id) for name, attrs in legacy.nodes(data=True) for chunk_id in attrs.get('chunks', ())],
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO relations (source, target, relation) VALUES (?, ?, ?)",
+                [(src, tgt, attrs.get('relation')) for src, tgt, attrs in legacy.edges(data=True)],
+            )
+        print(f"📦 Imported {legacy.number_of_nodes()} entities from {self.legacy_path}")
@@ -0,0 +1,196 @@
+import os
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+from services.chunk_store import DEFAULT_NAMESPACE
+from services.sqlite_tx import Transaction
+from config import Config
+
+# A claimed job belongs to its worker for this long after the last heartbeat;
+# past that it is presumed dead and the job can be claimed again.
+LEASE_SECONDS = getattr(Config, "INDEX_JOB_LEASE", 60)
+
+class JobQueue:
+    """
+    SQLite-backed queue of indexing jobs shared by the API process (which
+    enqueues and reports status) and the indexing worker processes (which
+    claim jobs and record progress).
+
+    Completed chunk windows are recorded per job, so a job interrupted by a
+    crash or restart is re-queued and resumes with the chunks it has not
+    durably indexed yet.
+
+    A claim is a lease: the claiming process (`claimed_by`) renews it with
+    heartbeats, and only a job whose lease has expired is taken over, so
+    several worker pools can share the queue without indexing a video twice.
+    """
+
+    def __init__(self, path=None, lease_seconds=None):
+        self.path = path or os.path.join(Config.STORAGE_FOLDER, "jobs.db")
+        self.lease_seconds = lease_seconds or LEASE_SECONDS
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY, video_path TEXT NOT NULL, video_id TEXT NOT NULL,"
+                " state TEXT NOT NULL, worker TEXT, error TEXT,"
+                " chunks_total INTEGER, chunks_done INTEGER NOT NULL DEFAULT 0,"
+                " chunks_failed INTEGER NOT NULL DEFAULT 0, chunk_len REAL,"
+                " attempts INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL,"
+                " started_at REAL, updated_at REAL, finished_at REAL,"
+                " run_chunks_done INTEGER NOT NULL DEFAULT 0, run_video_sec REAL NOT NULL DEFAULT 0)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS job_chunks ("
+                " job_id TEXT NOT NULL, start REAL NOT NULL, end REAL, PRIMARY KEY (job_id, start))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs(state, created_at)")
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "namespace" not in columns:
+                conn.execute(f"ALTER TABLE jobs ADD COLUMN namespace TEXT NOT NULL DEFAULT '{DEFAULT_NAMESPACE}'")
+            if "claimed_by" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN claimed_by TEXT")
+                conn.execute("ALTER TABLE jobs ADD COLUMN lease_until REAL")
+            if "run_video_sec" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN run_video_sec REAL NOT NULL DEFAULT 0")
+            if "end" not in {row[1] for row in conn.execute("PRAGMA table_info(job_chunks)")}:
+                conn.execute("ALTER TABLE job_chunks ADD COLUMN end REAL")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_video ON jobs(video_id, created_at)")
+
+    def _conn(self):
+        # One connection per thread; sqlite3 connections are not thread-safe.
+        if not hasattr(self._local, "conn"):
+            self._local.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._local.conn.row_factory = sqlite3.Row
+            self._local.conn.execute("PRAGMA journal_mode=WAL")
+        return Transaction(self._local.conn)
+
+    # --- Producer side -------------------------------------------------------
+
+    def enqueue(self, video_path, video_id=None, namespace=None):
+        job_id = str(uuid.uuid4())
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, video_path, video_id, namespace, state, created_at) VALUES (?, ?, ?, ?, 'queued', ?)",
+                (job_id, video_path, video_id or os.path.basename(video_path), namespace or DEFAULT_NAMESPACE, time.time()),
+            )
+        return job_id
+
+    def get(self, job_id):
+        with self._conn() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._describe(row) if row else None
+
+    def latest(self, video_id):
+        """The most recent job for a video, or None."""
+        with self._conn() as conn:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE video_id = ? ORDER BY created_at DESC LIMIT 1", (video_id,)
+            ).fetchone()
+        return self._describe(row) if row else None
+
+    def recent(self, limit=50):
+        with self._conn() as conn:
+            rows = conn.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [self._describe(row) for row in rows]
+
+    def requeue_stale(self):
+        """
+        Puts jobs whose worker stopped renewing its lease back in the queue.
+        Returns how many. Jobs still leased by a live worker are left alone.
+        """
+        with self._conn() as conn:
+            return conn.execute(
+                "UPDATE jobs SET state = 'queued', worker = NULL, claimed_by = NULL, lease_until = NULL"
+                " WHERE state = 'running' AND COALESCE(lease_until, 0) < ?",
+                (time.time(),),
+            ).rowcount
+
+    # --- Worker side ---------------------------------------------------------
+
+    def claim(self, worker):
+        """
+        Atomically takes the oldest queued job, or a running one whose lease
+        expired, or returns None. The returned job's `claimed_by` identifies
+        this claim for heartbeat() and finish().
+        """
+        with self._conn() as conn:
+            now = time.time()
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE state = 'queued' OR (state = 'running' AND COALESCE(lease_until, 0) < ?)"
+                " ORDER BY created_at LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET state = 'running', worker = ?, claimed_by = ?, lease_until = ?, attempts = attempts + 1,"
+                " started_at = ?, updated_at = ?, finished_at = NULL, run_chunks_done = 0, run_video_sec = 0, error = NULL WHERE id = ?",
+                (worker, f"{worker}@{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}",
+                 now + self.lease_seconds, now, now, row["id"]),
+            )
+            job = conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+            done = conn.execute("SELECT start FROM job_chunks WHERE job_id = ?", (row["id"],)).fetchall()
+        return {**dict(job), "done_starts": {r["start"] for r in done}}
+
+    def heartbeat(self, job_id, claimed_by):
+        """Renews the lease on a claimed job. False if the claim was lost (lease expired and taken over)."""
+        with self._conn() as conn:
+            return conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND claimed_by = ? AND state = 'running'",
+                (time.time() + self.lease_seconds, job_id, claimed_by),
+            ).rowcount == 1
+
+    def set_total(self, job_id, chunks_total, chunk_len, claimed_by=None):
+        """Records the job's chunk count. With `claimed_by`, only if that claim still holds it; returns whether it did."""
+        with self._conn() as conn:
+            return conn.execute(
+                "UPDATE jobs SET chunks_total = ?, chunk_len = ?, updated_at = ? WHERE id = ? AND (? IS NULL OR claimed_by = ?)",
+                (chunks_total, chunk_len, time.time(), job_id, claimed_by, claimed_by),
+            ).rowcount == 1
+
+    def record_chunks(self, job_id, windows, failed=0, claimed_by=None):
+        """
+        Marks chunk windows, given as (start, end) pairs, as durably indexed.
+        With `claimed_by`, only if that claim still holds the job; returns
+        whether they were recorded.
+        """
+        with self._conn() as conn:
+            if conn.execute("SELECT 1 FROM jobs WHERE id = ? AND (? IS NULL OR claimed_by = ?)",
+                            (job_id, claimed_by, claimed_by)).fetchone() is None:
+                return False
+            conn.executemany("INSERT OR IGNORE INTO job_chunks (job_id, start, end) VALUES (?, ?, ?)",
+                             [(job_id, start, end) for start, end in windows])
+            conn.execute(
+                "UPDATE jobs SET chunks_done = (SELECT COUNT(*) FROM job_chunks WHERE job_id = ?),"
+                " run_chunks_done = run_chunks_done + ?, run_video_sec = run_video_sec + ?,"
+                " chunks_failed = chunks_failed + ?, updated_at = ? WHERE id = ?",
+                (job_id, len(windows), sum(end - start for start, end in windows), failed, time.time(), job_id),
+            )
+        return True
+
+    def finish(self, job_id, error=None, claimed_by=None):
+        """Marks a job done or failed; with `claimed_by`, only if that claim still holds it."""
+        with self._conn() as conn:
+            conn.execute(
+                "UPDATE jobs SET state = ?, error = ?, finished_at = ?, updated_at = ?, lease_until = NULL"
+                " WHERE id = ? AND (? IS NULL OR claimed_by = ?)",
+                ("failed" if error else "done", error, time.time(), time.time(), job_id, claimed_by, claimed_by),
+            )
+
+    # --- Reporting -----------------------------------------------------------
+
+    @staticmethod
+    def _describe(row):
+        job = dict(row)
+        elapsed = ((job["finished_at"] or time.time()) - job["started_at"]) if job["started_at"] else 0
+        run_done, run_video_sec = job.pop("run_chunks_done"), job.pop("run_video_sec")
+        # Video seconds are summed from the indexed windows: scene chunks vary in length.
+        job["throughput"] = {
+            "chunks_per_sec": run_done / elapsed if elapsed else 0.0,
+            "video_sec_per_sec": run_video_sec / elapsed if elapsed else 0.0,
+        }
+        job["progress"] = min(1.0, job["chunks_done"] / job["chunks_total"]) if job["chunks_total"] else 0.0
+        return job
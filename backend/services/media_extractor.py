@@ -0,0 +1,247 @@
+import io
+import wave
+import subprocess
+import numpy as np
+import imageio_ffmpeg
+from moviepy.video.io.VideoFileClip import VideoFileClip
+
+class MediaExtractor:
+    """
+    Decodes a video exactly once, front to back, without touching disk.
+
+    Two ffmpeg processes stream into pipes: one emits RGB frames sampled on a
+    fixed grid (the chunk midpoints, or several evenly spaced points per chunk),
+    the other emits mono 16-bit PCM. iter_chunks() reads both in lockstep and
+    yields per-window numpy buffers that AIEngine consumes directly.
+    iter_scenes() reads the same streams but cuts windows adaptively.
+    """
+
+    def __init__(self, video_path, sample_rate=16000, max_side=None):
+        self.video_path = video_path
+        self.sample_rate = sample_rate
+        self.ffmpeg = imageio_ffmpeg.get_ffmpeg_exe()
+
+        # Probe only; the moviepy reader is closed before streaming starts.
+        with VideoFileClip(video_path) as clip:
+            self.duration = clip.duration
+            self.has_audio = clip.audio is not None
+            width, height = clip.size
+
+        scale = min(1.0, max_side / max(width, height)) if max_side else 1.0
+        self.width = max(2, int(width * scale) // 2 * 2)
+        self.height = max(2, int(height * scale) // 2 * 2)
+
+    def iter_chunks(self, chunk_len, frames_per_chunk=1):
+        """
+        Yields {"start", "end", "frames", "frame_times", "audio"} per window.
+        `frames` is a list of HxWx3 uint8 arrays; `audio` is an int16 array or None.
+        """
+        step = chunk_len / frames_per_chunk
+        frame_proc = self._spawn_frames(offset=step / 2, fps=1 / step)
+        audio_proc = self._spawn_audio() if self.has_audio else None
+        frame_bytes = self.width * self.height * 3
+        last_frame = None
+
+        try:
+            for start in range(0, int(self.duration), chunk_len):
+                end = min(start + chunk_len, self.duration)
+
+                frames, frame_times = [], []
+                for k in range(frames_per_chunk):
+                    t = start + step / 2 + k * step
+                    if t > end and frames:
+                        break
+                    raw = frame_proc.stdout.read(frame_bytes)
+                    if len(raw) < frame_bytes:
+                        break  # stream ended early (last, partial window)
+                    last_frame = np.frombuffer(raw, dtype=np.uint8).reshape(self.height, self.width, 3)
+                    frames.append(last_frame)
+                    frame_times.append(min(t, end))
+                if not frames and last_frame is not None:
+                    frames, frame_times = [last_frame], [end]
+
+                audio = None
+                if audio_proc:
+                    n_bytes = int(round((end - start) * self.sample_rate)) * 2
+                    raw = audio_proc.stdout.read(n_bytes)
+                    if raw:
+                        audio = np.frombuffer(raw[:len(raw) // 2 * 2], dtype=np.int16)
+
+                yield {"start": start, "end": end, "frames": frames, "frame_times": frame_times, "audio": audio}
+        finally:
+            for proc in (frame_proc, audio_proc):
+                if proc:
+                    proc.stdout.close()
+                    proc.kill()
+                    proc.wait()
+
+    def iter_scenes(self, min_len=None, target_len=30, static_len=60, max_len=90, probe_fps=1.0, max_keyframes=4,
+                    scene_threshold=0.12, keyframe_threshold=0.06, silence_db=-45.0):
+        """
+        Adaptive alternative to iter_chunks, yielding the same dicts.
+
+        Frames and audio are probed every 1/probe_fps seconds. A window is cut:
+          - at a scene change (thumbnail difference above `scene_threshold`),
+            once it is at least `min_len` long (by default `target_len`);
+          - at a pause (a block below `silence_db`), once it is `target_len`
+            long, or `static_len` if nothing on screen has changed, so speech
+            is not split mid-sentence;
+          - unconditionally at `max_len`.
+        A static slide or talking-head video therefore gets few long windows,
+        and fast-cut footage is not cut into more windows than fixed chunking:
+        shots shorter than `min_len` share a window, each contributing a
+        keyframe. A window's keyframes are its first frame, each earlier shot
+        change, and each probe that differs from the last keyframe by more
+        than `keyframe_threshold` (at most `max_keyframes`; a shot change
+        takes the slot of the latest such within-shot probe when full). A
+        silent window that looks the same as the one before it is merged into
+        that one (up to `max_len`) instead of being indexed again.
+        """
+        min_len = target_len if min_len is None else min_len
+        step = 1.0 / probe_fps
+        frame_proc = self._spawn_frames(offset=step / 2, fps=probe_fps)
+        audio_proc = self._spawn_audio() if self.has_audio else None
+        frame_bytes = self.width * self.height * 3
+        block_samples = int(round(step * self.sample_rate))
+
+        pending, window = None, None
+        frame, prev_thumb = None, None
+        try:
+            for i in range(int(np.ceil(self.duration / step))):
+                t0, t1 = round(i * step, 3), round(min((i + 1) * step, self.duration), 3)
+
+                block = None
+                if audio_proc:
+                    raw = audio_proc.stdout.read(block_samples * 2)
+                    if raw:
+                        block = np.frombuffer(raw[:len(raw) // 2 * 2], dtype=np.int16)
+                silent = block is None or _rms_db(block) < silence_db
+
+                raw = frame_proc.stdout.read(frame_bytes)
+                if len(raw) == frame_bytes:
+                    frame = np.frombuffer(raw, dtype=np.uint8).reshape(self.height, self.width, 3)
+                if frame is None:
+                    continue  # nothing decoded yet; keep the audio stream in step
+                thumb = _thumbnail(frame)
+
+                changed = prev_thumb is not None and _frame_change(thumb, prev_thumb) > scene_threshold
+                if window is not None:
+                    length = t0 - window["start"]
+                    pause_len = target_len if len(window["thumbs"]) > 1 else static_len
+                    if length >= max_len or (changed and length >= min_len) or (silent and length >= pause_len):
+                        pending = yield from _emit(pending, window, max_len, keyframe_threshold)
+                        window = None
+
+                if window is None:
+                    window = {"start": t0, "end": t1, "frames": [], "frame_times": [], "thumbs": [],
+                              "shot_starts": [], "audio": [], "speech": 0}
+                    changed = True
+                _add_keyframe(window, frame, round(t0 + step / 2, 3), thumb, changed, max_keyframes, keyframe_threshold)
+                if block is not None:
+                    window["audio"].append(block)
+                window["speech"] += not silent
+                window["end"] = t1
+                prev_thumb = thumb
+
+            if window is not None:
+                pending = yield from _emit(pending, window, max_len, keyframe_threshold)
+            if pending is not None:
+                yield _finish(pending)
+        finally:
+            for proc in (frame_proc, audio_proc):
+                if proc:
+                    proc.stdout.close()
+                    proc.kill()
+                    proc.wait()
+
+    def _spawn_frames(self, offset, fps):
+        cmd = [
+            self.ffmpeg, "-nostdin", "-loglevel", "error",
+            "-ss", f"{offset:.3f}", "-i", self.video_path,
+            "-vf", f"fps={fps:.6f},scale={self.width}:{self.height}",
+            "-f", "rawvideo", "-pix_fmt", "rgb24", "-",
+        ]
+        return subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=10 ** 7)
+
+    def _spawn_audio(self):
+        cmd = [
+            self.ffmpeg, "-nostdin", "-loglevel", "error",
+            "-i", self.video_path, "-vn",
+            "-ac", "1", "-ar", str(self.sample_rate), "-f", "s16le", "-",
+        ]
+        return subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=10 ** 7)
+
+
+def _thumbnail(frame, size=32):
+    """Small grayscale float thumbnail for cheap frame comparisons."""
+    h, w = frame.shape[:2]
+    small = frame[::max(1, h // size), ::max(1, w // size)][:size, :size]
+    return small.mean(axis=2, dtype=np.float32) / 255.0
+
+
+def _frame_change(a, b):
+    """Mean absolute difference of two thumbnails, in [0, 1]."""
+    return float(np.abs(a - b).mean())
+
+
+def _rms_db(pcm):
+    """Loudness of an int16 PCM block in dBFS."""
+    if not len(pcm):
+        return -np.inf
+    rms = np.sqrt(np.mean((pcm.astype(np.float32) / 32768.0) ** 2))
+    return 20 * np.log10(rms) if rms > 0 else -np.inf
+
+
+def _add_keyframe(window, frame, frame_time, thumb, shot_start, max_keyframes, keyframe_threshold):
+    """
+    Keeps `frame` as one of the window's keyframes if it starts a shot or
+    differs enough from the last keyframe. When the window is full, a shot
+    start replaces the latest keyframe that does not start one.
+    """
+    slot = len(window["thumbs"])
+    if slot >= max_keyframes:
+        if not shot_start or all(window["shot_starts"]):
+            return
+        slot = max(i for i, starts in enumerate(window["shot_starts"]) if not starts)
+        for key in ("frames", "frame_times", "thumbs", "shot_starts"):
+            del window[key][slot]
+    elif not shot_start and _frame_change(thumb, window["thumbs"][-1]) <= keyframe_threshold:
+        return
+    window["frames"].append(frame)
+    window["frame_times"].append(frame_time)
+    window["thumbs"].append(thumb)
+    window["shot_starts"].append(shot_start)
+
+
+def _emit(pending, window, max_len, keyframe_threshold):
+    """
+    Generator step of iter_scenes: merges `window` into `pending` when it is
+    a silent near-duplicate, otherwise yields `pending` and holds `window`.
+    Returns the new pending window.
+    """
+    if (pending is not None and window["speech"] == 0
+            and window["end"] - pending["start"] <= max_len
+            and all(_frame_change(t, pending["thumbs"][-1]) <= keyframe_threshold for t in window["thumbs"])):
+        pending["end"] = window["end"]
+        pending["audio"].extend(window["audio"])
+        return pending
+    if pending is not None:
+        yield _finish(pending)
+    return window
+
+
+def _finish(window):
+    audio = np.concatenate(window["audio"]) if window["audio"] else None
+    return {"start": window["start"], "end": window["end"], "frames": window["frames"],
+            "frame_times": window["frame_times"], "audio": audio}
+
+
+def pcm_to_wav(pcm, sample_rate=16000):
+    """Wraps mono int16 PCM in an in-memory WAV container (for the Whisper API)."""
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm.astype(np.int16).tobytes())
+    return buffer.getvalue()
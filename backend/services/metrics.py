@@ -0,0 +1,123 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+import numpy as np
+from config import Config
+
+
+class Metrics:
+    """
+    Per-stage wall-time statistics for one process: count, total and max
+    over the process lifetime, and p50 / p95 over the last `window` samples
+    of each stage. Also plain counters (videos indexed, video seconds, ...).
+
+    Indexing stages are index.<stage> (decode, transcribe, caption, clip,
+    text_embed, extract, upsert, flush; chunk and video end to end). Query
+    stages are query.<key> for each key of a query's `timings` (plan,
+    text_search, graph_traverse, rerank, llm, total, ...).
+
+    Worker processes dump() their snapshot under STORAGE_FOLDER/metrics so
+    the API process can report it next to its own (read_dumps).
+    """
+
+    def __init__(self, window=2048):
+        self.window = window
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._counters = {}
+
+    def record(self, stage, seconds):
+        with self._lock:
+            stats = self._stages.get(stage)
+            if stats is None:
+                stats = self._stages[stage] = {"count": 0, "total": 0.0, "max": 0.0, "recent": deque(maxlen=self.window)}
+            stats["count"] += 1
+            stats["total"] += seconds
+            stats["max"] = max(stats["max"], seconds)
+            stats["recent"].append(seconds)
+
+    def incr(self, counter, amount=1):
+        with self._lock:
+            self._counters[counter] = self._counters.get(counter, 0) + amount
+
+    def timed(self, stage):
+        """`with metrics.timed("index.decode"): ...` records the block's wall time."""
+        return _Timer(self, stage)
+
+    def call(self, stage, fn, *args, **kwargs):
+        """Runs fn(*args, **kwargs) and records its wall time under `stage`."""
+        with self.timed(stage):
+            return fn(*args, **kwargs)
+
+    def snapshot(self):
+        with self._lock:
+            stages = {name: (dict(s), list(s["recent"])) for name, s in self._stages.items()}
+            counters = dict(self._counters)
+        report = {}
+        for name, (stats, recent) in sorted(stages.items()):
+            p50, p95 = np.percentile(recent, [50, 95]) if recent else (0.0, 0.0)
+            report[name] = {
+                "count": stats["count"],
+                "total_s": round(stats["total"], 3),
+                "mean_ms": round(stats["total"] / stats["count"] * 1000, 2),
+                "p50_ms": round(float(p50) * 1000, 2),
+                "p95_ms": round(float(p95) * 1000, 2),
+                "max_ms": round(stats["max"] * 1000, 2),
+            }
+        return {"uptime_s": round(time.time() - self.started, 1), "stages": report, "counters": counters}
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+            self._counters.clear()
+            self.started = time.time()
+
+    def dump(self, path):
+        """Writes the snapshot to `path` atomically."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({**self.snapshot(), "pid": os.getpid(), "updated_at": time.time()}, f)
+        os.replace(tmp_path, path)
+
+
+class _Timer:
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.record(self.stage, time.perf_counter() - self.t0)
+
+
+def dump_folder():
+    """Where worker processes dump their metrics: STORAGE_FOLDER/metrics."""
+    return os.path.join(Config.STORAGE_FOLDER, "metrics")
+
+
+def read_dumps(folder=None):
+    """{name: snapshot} for every dump in `folder` (by default, one per indexing worker)."""
+    folder = folder or dump_folder()
+    dumps = {}
+    if not os.path.isdir(folder):
+        return dumps
+    for filename in sorted(os.listdir(folder)):
+        if not filename.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(folder, filename)) as f:
+                dumps[filename[:-len(".json")]] = json.load(f)
+        except (OSError, ValueError):
+            continue  # being replaced right now
+    return dumps
+
+
+# Process-wide instance.
+metrics = Metrics()
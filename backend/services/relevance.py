@@ -0,0 +1,122 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+import numpy as np
+from config import Config
+
+
+class RelevanceFilter:
+    """
+    Second retrieval stage: drops candidate chunks that do not help answer
+    the query before they reach the answer prompt.
+
+    1. Prefilter (local, no API calls for indexed chunks): cosine similarity
+       between the query embedding and each chunk's text embedding. Chunks
+       below `threshold` are dropped; at most `max_candidates` go on.
+    2. LLM judge (optional): the survivors are split into groups of
+       `batch_size`, each scored 0-10 in one request, all groups in flight at
+       once on `pool`. Chunks scoring below `min_score` are dropped.
+
+    The judge runs under a per-query budget of `budget_ms`. When it runs out,
+    the best-so-far set is returned: chunks already judged relevant, then
+    the unjudged ones ranked by similarity. A failed group is likewise kept
+    rather than dropped. Groups still queued then are cancelled; requests
+    already running finish in the background, so `pool` is the judge's own
+    (`workers` threads by default), never one retrieval itself waits on.
+
+    `embed(texts)` returns embeddings; `judge(query, texts)` returns one score
+    (or None) per text, e.g. AIEngine.score_relevance.
+    """
+
+    def __init__(self, embed, judge=None, pool=None, threshold=0.2, max_candidates=8, batch_size=4,
+                 min_score=5, budget_ms=1500, workers=4):
+        self.embed = embed
+        self.judge = judge
+        self.pool = pool or ThreadPoolExecutor(max_workers=workers, thread_name_prefix="relevance")
+        self.threshold = threshold
+        self.max_candidates = max_candidates
+        self.batch_size = max(1, batch_size)
+        self.min_score = min_score
+        self.budget_ms = budget_ms
+        self.counts = {"queries": 0, "candidates": 0, "prefiltered": 0, "judged": 0, "rejected": 0, "timeouts": 0}
+        self._lock = threading.Lock()
+
+    def filter(self, query_embedding, query, sources):
+        """The sources worth answering from, most relevant first."""
+        if not sources:
+            self._count(queries=1)
+            return sources
+        deadline = time.perf_counter() + self.budget_ms / 1000.0
+
+        ranked = self._prefilter(query_embedding, sources)
+        if not self.judge or not ranked:
+            self._count(queries=1, candidates=len(sources), prefiltered=len(sources) - len(ranked))
+            return [src for _, src in ranked]
+
+        groups = [ranked[i:i + self.batch_size] for i in range(0, len(ranked), self.batch_size)]
+        futures = [(self.pool.submit(self.judge, query, [src['text'] for _, src in group]), group) for group in groups]
+        done, not_done = wait([f for f, _ in futures], timeout=max(0.0, deadline - time.perf_counter()))
+        if not_done:
+            print(f"   ⚠️ Relevance check over budget: {len(not_done)}/{len(groups)} groups unjudged.")
+
+        scored, judged = [], 0
+        for future, group in futures:
+            scores = None
+            if future in done:
+                try:
+                    scores = future.result()
+                except Exception as e:
+                    print(f"   ⚠️ Relevance check failed: {e}")
+            else:
+                future.cancel()
+            for (similarity, src), score in zip(group, scores or [None] * len(group)):
+                judged += score is not None
+                if score is None or score >= self.min_score:
+                    scored.append((score is not None, score or 0, similarity, src))
+        scored.sort(key=lambda s: s[:3], reverse=True)
+        self._count(queries=1, candidates=len(sources), prefiltered=len(sources) - len(ranked), judged=judged,
+                    rejected=len(ranked) - len(scored), timeouts=int(bool(not_done)))
+        return [s[3] for s in scored]
+
+    def _prefilter(self, query_embedding, sources):
+        """(similarity, source) pairs above the threshold, best first, at most max_candidates."""
+        if query_embedding is None or self.embed is None:
+            return [(0.0, src) for src in sources[:self.max_candidates]]
+        chunks = np.asarray(self.embed([src['text'] for src in sources]), dtype=np.float32)
+        query = np.asarray(query_embedding, dtype=np.float32)
+        chunks /= np.maximum(np.linalg.norm(chunks, axis=1, keepdims=True), 1e-12)
+        query /= np.linalg.norm(query) or 1.0
+        similarities = chunks @ query
+        order = np.argsort(-similarities)
+        ranked = [(float(similarities[i]), sources[i]) for i in order if similarities[i] >= self.threshold]
+        return ranked[:self.max_candidates]
+
+    def _count(self, **deltas):
+        with self._lock:
+            for key, delta in deltas.items():
+                self.counts[key] += delta
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts)
+
+
+def open_default_relevance_filter(ai):
+    """
+    RelevanceFilter per RERANK_MODE: None (off), "embedding" (prefilter only)
+    or "llm" (prefilter, then the batched LLM judge, on RERANK_WORKERS
+    threads of its own).
+    """
+    mode = getattr(Config, "RERANK_MODE", None)
+    if not mode:
+        return None
+    return RelevanceFilter(
+        ai.get_text_embeddings_openai,
+        judge=ai.score_relevance if mode == "llm" else None,
+        threshold=getattr(Config, "RERANK_THRESHOLD", 0.2),
+        max_candidates=getattr(Config, "RERANK_MAX_CANDIDATES", 8),
+        batch_size=getattr(Config, "RERANK_BATCH_SIZE", 4),
+        min_score=getattr(Config, "RERANK_MIN_SCORE", 5),
+        budget_ms=getattr(Config, "RERANK_BUDGET_MS", 1500),
+        workers=getattr(Config, "RERANK_WORKERS", 4),
+    )
@@ -0,0 +1,151 @@
+import os
+import sys
+import time
+import threading
+from config import Config
+
+try:
+    import resource
+except ImportError:  # Windows: memory comes from psutil, when installed
+    resource = None
+
+# Process start, as close as we can get: /proc when available, else first import.
+_imported_at = time.time()
+
+_instances = {}
+_locks = {}
+_registry_lock = threading.Lock()
+_loads = {}
+
+
+def shared(name, factory):
+    """
+    Process-wide singleton: the first call builds `factory()`, later calls
+    (from any module or thread) return the same instance. The retriever and
+    indexer get their engines through here, so a process importing both
+    shares one AIEngine and one set of stores.
+    """
+    instance = _instances.get(name)
+    if instance is not None:
+        return instance
+    with _registry_lock:
+        lock = _locks.setdefault(name, threading.Lock())
+    # Per-name lock: a slow factory does not hold up other services.
+    with lock:
+        if name not in _instances:
+            with loading(name):
+                _instances[name] = factory()
+        return _instances[name]
+
+
+def ai_engine():
+    from services.ai_engine import AIEngine
+    return shared("ai_engine", AIEngine)
+
+
+def vector_engine():
+    from services.vector_engine import VectorEngine
+    return shared("vector_engine", VectorEngine)
+
+
+def graph_engine():
+    from services.graph_engine import GraphEngine
+    return shared("graph_engine", GraphEngine)
+
+
+def chunk_store():
+    from services.chunk_store import ChunkStore
+    return shared("chunk_store", ChunkStore)
+
+
+class loading:
+    """Context manager recording how long loading a component took and how much RSS it added."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.t0, self.rss0 = time.perf_counter(), rss_mb()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            seconds = time.perf_counter() - self.t0
+            _loads[self.name] = {"seconds": round(seconds, 3), "rss_delta_mb": round(rss_mb() - self.rss0, 1)}
+            if seconds >= 0.5:
+                print(f"⚡ Loaded {self.name} in {seconds:.1f}s (+{_loads[self.name]['rss_delta_mb']:.0f} MiB RSS)")
+
+
+def warmup(graph=True):
+    """
+    Loads everything a query or indexing job can need, instead of on first
+    use. Indexing workers pass graph=False: they only write to the graph.
+    """
+    ai = ai_engine()
+    ai.load_models()
+    vector_engine().load()
+    if graph:
+        graph_engine().refresh()
+
+
+def start_warmup(graph=True):
+    """
+    Applies Config.WARMUP: False loads lazily on first use, "background"
+    warms up on a daemon thread while requests are already served, and True
+    warms up before returning.
+    """
+    mode = getattr(Config, "WARMUP", False)
+    if mode == "background":
+        threading.Thread(target=warmup, args=(graph,), name="warmup", daemon=True).start()
+    elif mode:
+        warmup(graph)
+
+
+def rss_mb():
+    """Current resident set size in MiB (0 where it cannot be measured)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        info = _psutil_memory()
+        return info.rss / 2 ** 20 if info else peak_rss_mb()
+
+
+def peak_rss_mb():
+    """Peak resident set size in MiB (0 where it cannot be measured)."""
+    if resource is not None:
+        # ru_maxrss is in KiB on Linux and bytes on macOS.
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+    info = _psutil_memory()
+    return getattr(info, "peak_wset", info.rss) / 2 ** 20 if info else 0.0
+
+
+def _psutil_memory():
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info()
+
+
+def uptime():
+    """Seconds since the process started."""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            system_uptime = float(f.read().split()[0])
+        return system_uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return time.time() - _imported_at
+
+
+def status():
+    """Uptime, memory, and load time / RSS cost of each component loaded so far."""
+    return {
+        "uptime_s": round(uptime(), 2),
+        "rss_mb": round(rss_mb(), 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "loaded": dict(_loads),
+    }
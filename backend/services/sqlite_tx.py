@@ -0,0 +1,18 @@
+class Transaction:
+    """
+    `with` wrapper giving an explicit transaction on an autocommit
+    (isolation_level=None) sqlite3 connection: commits on success, rolls
+    back on an exception. The default BEGIN IMMEDIATE takes the write lock
+    up front; pass "BEGIN" for a read snapshot.
+    """
+
+    def __init__(self, conn, begin="BEGIN IMMEDIATE"):
+        self.conn = conn
+        self.begin = begin
+
+    def __enter__(self):
+        self.conn.execute(self.begin)
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
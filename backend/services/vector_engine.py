@@ -1,31 +1,313 @@
 import os
+import time
+import threading
+from contextlib import nullcontext
 from nano_vectordb import NanoVectorDB
+from services.vector_store import MmapVectorStore
+from services.ann_index import IVFIndex
+from services.file_lock import file_lock, file_signature
+from services.rw_lock import ReadWriteLock
+from services.runtime import loading
 from config import Config
 
 class VectorEngine:
-    def __init__(self):
-        self.text_db_path = os.path.join(Config.STORAGE_FOLDER, "text_index.json")
-        self.visual_db_path = os.path.join(Config.STORAGE_FOLDER, "visual_index.json")
-        
+    def __init__(self, storage_folder=None, flush_every=None, flush_interval=None, backend=None):
+        storage_folder = storage_folder or Config.STORAGE_FOLDER
+        # "nano" keeps the JSON indexes; "mmap" uses the binary MmapVectorStore
+        # (convert existing indexes with `python -m tools.migrate_vector_store`).
+        self.backend = backend or getattr(Config, "VECTOR_BACKEND", "nano")
+        self.dtype = getattr(Config, "VECTOR_DTYPE", "float32")
+
+        if self.backend == "mmap":
+            self.text_db_path = os.path.join(storage_folder, "text_index")
+            self.visual_db_path = os.path.join(storage_folder, "visual_index")
+        else:
+            self.text_db_path = os.path.join(storage_folder, "text_index.json")
+            self.visual_db_path = os.path.join(storage_folder, "visual_index.json")
+
+        # 1536 for OpenAI Text Embeddings, 512 for OpenCLIP Visual Embeddings
+        self.dims = {self.text_db_path: 1536, self.visual_db_path: 512}
+        # Optional per-channel ANN index ("ivf"); None keeps exact brute-force search.
+        self.ann_kinds = {
+            self.text_db_path: getattr(Config, "TEXT_ANN", None),
+            self.visual_db_path: getattr(Config, "VISUAL_ANN", None),
+        }
+        # Chunks may have one visual record per keyframe (VISUAL_POOLING = "multi").
+        self.visual_frames = getattr(Config, "VISUAL_FRAMES_PER_CHUNK", 4) if getattr(Config, "VISUAL_POOLING", "multi") == "multi" else 1
+        # Visual record IDs stored for each chunk (its pooled record or its
+        # keyframes "<chunk_id>#<k>"), read from the index rather than derived
+        # from VISUAL_FRAMES_PER_CHUNK, which may have changed since indexing.
+        self._chunk_records = {}
+        # The mmap backend rewrites an index without its dead (deleted or
+        # superseded) rows once they are this share of it.
+        self.compact_ratio = getattr(Config, "VECTOR_COMPACT_RATIO", 0.25)
+        # Each index is read from disk on first use (or by load()).
+        self.dbs, self.ann, self._signatures = {}, {}, {}
+        self._load_lock = threading.Lock()
+        # Searches read an index concurrently; upserts, deletions, reloads and
+        # mmap saves (which remap the store) exclude them. Taken last, after
+        # file_lock and _load_lock.
+        self._locks = {path: ReadWriteLock() for path in self.dims}
+
+        # Write buffering: upserts are visible to searches immediately but only
+        # hit disk once `flush_every` records are pending or `flush_interval`
+        # seconds have passed. flush_every=1 restores save-per-upsert.
+        self.flush_every = flush_every or getattr(Config, "VECTOR_FLUSH_EVERY", 256)
+        self.flush_interval = flush_interval or getattr(Config, "VECTOR_FLUSH_INTERVAL", 30.0)
+        # Records upserted and IDs deleted since the last flush, replayed onto a
+        # fresh copy of the index if another process has written it meanwhile.
+        self._buffer = {path: [] for path in self.dims}
+        self._deleted = {path: set() for path in self.dims}
+        self._last_flush = time.monotonic()
+        self.bytes_written = 0
+
+    @property
+    def text_db(self):
+        return self._db(self.text_db_path)
+
+    @property
+    def visual_db(self):
+        return self._db(self.visual_db_path)
+
+    def load(self):
+        """Reads both indexes now rather than on first use."""
+        for path in self.dims:
+            self._db(path)
+
+    def _db(self, path):
+        if path not in self.dbs:
+            with self._read_lock(path), self._load_lock:  # same order as flush()
+                if path not in self.dbs:
+                    with loading(f"vectors:{os.path.basename(path)}"):
+                        self._load(path)
+        elif file_signature(self._disk_file(path)) != self._signatures[path]:
+            # Another process (an indexing worker) saved this index since we
+            # read it; without this the API would never see newly indexed videos.
+            with self._read_lock(path), self._load_lock:  # same order as flush()
+                if file_signature(self._disk_file(path)) != self._signatures[path]:
+                    self._reload(path)
+        return self.dbs[path]
+
+    def _read_lock(self, path):
+        # A compaction renumbers the mmap store's rows across two files, so it
+        # is read under the writers' lock; NanoVectorDB files are replaced atomically.
+        return file_lock(path) if self.backend == "mmap" else nullcontext()
+
+    def _load(self, path):
+        # Signature first: a save landing while we read is picked up on the next check.
+        self._signatures[path] = file_signature(self._disk_file(path))
+        self.dbs[path] = self._open(self.dims[path], path)
+        self.ann[path] = self._open_ann(self.dbs[path], self.ann_kinds[path])
+        if path == self.visual_db_path:
+            self._chunk_records = {}
+            self._track_visual(self._stored_ids(self.dbs[path]))
+
+    def _reload(self, path):
+        """Reads the index again from disk and replays this process's unflushed upserts and deletions."""
+        with self._locks[path].write():
+            self._load(path)
+            if self._deleted[path]:
+                self.dbs[path].delete(list(self._deleted[path]))
+            if self._buffer[path]:
+                self.dbs[path].upsert([dict(record) for record in self._buffer[path]])
+            if path == self.visual_db_path:
+                self._untrack_visual(self._deleted[path])
+                self._track_visual(record['__id__'] for record in self._buffer[path])
+
+    def _disk_file(self, path):
+        # The mmap store appends a log line for every write, so its log is the change marker.
+        return f"{path}.meta.jsonl" if self.backend == "mmap" else path
+
+    def _open(self, dim, path):
+        if self.backend == "mmap":
+            return MmapVectorStore(dim, path, dtype=self.dtype)
+        if self.backend != "nano":
+            raise ValueError(f"Unknown vector backend: {self.backend}")
         # FIX: Pass the dimension as the first positional argument
-        # 1536 for OpenAI Text Embeddings
-        self.text_db = NanoVectorDB(1536, storage_file=self.text_db_path)
-        
-        # 512 for OpenCLIP Visual Embeddings
-        self.visual_db = NanoVectorDB(512, storage_file=self.visual_db_path)
+        return NanoVectorDB(dim, storage_file=path)
+
+    @staticmethod
+    def _stored_ids(db):
+        if isinstance(db, MmapVectorStore):
+            return db.ids()
+        # NanoVectorDB has no public listing of its records.
+        return [record['__id__'] for record in db._NanoVectorDB__storage["data"]]
+
+    def _track_visual(self, record_ids):
+        for record_id in record_ids:
+            self._chunk_records.setdefault(record_id.split('#', 1)[0], set()).add(record_id)
+
+    def _untrack_visual(self, record_ids):
+        for record_id in record_ids:
+            records = self._chunk_records.get(record_id.split('#', 1)[0])
+            if records is not None:
+                records.discard(record_id)
+                if not records:
+                    del self._chunk_records[record_id.split('#', 1)[0]]
+
+    def _open_ann(self, db, kind):
+        if kind is None:
+            return None
+        if kind != "ivf":
+            raise ValueError(f"Unknown ANN index: {kind}")
+        if not isinstance(db, MmapVectorStore):
+            raise ValueError("ANN indexes require VECTOR_BACKEND = 'mmap'")
+        return IVFIndex(
+            db,
+            nlist=getattr(Config, "ANN_NLIST", None),
+            nprobe=getattr(Config, "ANN_NPROBE", 8),
+            min_train=getattr(Config, "ANN_MIN_TRAIN", 4096),
+            max_train=getattr(Config, "ANN_MAX_TRAIN", 100_000),
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
 
     def upsert_text(self, data):
         """Upsert into Textual Index"""
-        self.text_db.upsert(data)
-        self.text_db.save()
+        self._upsert(self.text_db_path, data)
 
     def upsert_visual(self, data):
         """Upsert into Visual Context Index"""
-        self.visual_db.upsert(data)
-        self.visual_db.save()
+        self._upsert(self.visual_db_path, data)
+
+    def _upsert(self, path, data):
+        # NanoVectorDB.upsert mutates its input, so buffer copies.
+        self._buffer[path].extend(dict(record) for record in data)
+        self._deleted[path].difference_update(record['__id__'] for record in data)
+        db = self._db(path)
+        with self._locks[path].write():
+            db.upsert([dict(record) for record in data])
+            if path == self.visual_db_path:
+                self._track_visual(record['__id__'] for record in data)
+        if (sum(len(b) for b in self._buffer.values()) >= self.flush_every
+                or time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def delete(self, chunk_ids):
+        """
+        Removes chunks from both indexes (all keyframe records of a chunk) and
+        persists the deletion. The mmap backend only appends delete markers,
+        so the other videos' vectors are not rewritten; NanoVectorDB rewrites
+        the whole JSON index.
+        """
+        chunk_ids = set(chunk_ids)
+        ids = {self.text_db_path: chunk_ids, self.visual_db_path: self._visual_ids(chunk_ids)}
+        for path, drop in ids.items():
+            self._buffer[path] = [record for record in self._buffer[path] if record['__id__'] not in drop]
+            self._deleted[path].update(drop)
+            db = self._db(path)
+            with self._locks[path].write():
+                db.delete(list(drop))
+                if path == self.visual_db_path:
+                    self._untrack_visual(drop)
+        self.flush()
+
+    def flush(self):
+        """Persists every index with pending upserts or deletions."""
+        for path, buffer in self._buffer.items():
+            deleted = self._deleted[path]
+            if not buffer and not deleted:
+                continue
+            with file_lock(path):
+                if file_signature(self._disk_file(path)) != self._signatures[path]:
+                    # Another process saved this index since we loaded it.
+                    with self._load_lock:
+                        self._reload(path)
+                db = self.dbs[path]
+                if isinstance(db, MmapVectorStore):
+                    with self._locks[path].write():
+                        # Append-only on disk, so already crash-safe.
+                        self.bytes_written += db.save()
+                        if db.dead_rows() >= max(1024, self.compact_ratio * len(db._data)):
+                            self.bytes_written += db.compact()
+                            if self.ann[path]:
+                                self.ann[path].rebuild()
+                        if self.ann[path]:
+                            # Incremental insertion of the rows just persisted.
+                            self.ann[path].sync()
+                else:
+                    with self._locks[path].read():  # serializing only reads the index
+                        self._atomic_save(db)
+                self._signatures[path] = file_signature(self._disk_file(path))
+            buffer.clear()
+            deleted.clear()
+        self._last_flush = time.monotonic()
+
+    def _atomic_save(self, db):
+        """
+        NanoVectorDB.save() truncates the target before writing, so a crash
+        mid-save would corrupt the index. Write to a sibling temp file and
+        rename it over the original instead.
+        """
+        path = db.storage_file
+        tmp_path = f"{path}.tmp"
+        db.storage_file = tmp_path
+        try:
+            db.save()
+            with open(tmp_path, 'rb') as f:
+                os.fsync(f.fileno())
+        finally:
+            db.storage_file = path
+        os.replace(tmp_path, path)
+        self.bytes_written += os.path.getsize(path)
+
+    def get_text_records(self, ids):
+        """Stored records (id + metadata) for the given chunk IDs from the textual index."""
+        db = self.text_db
+        with self._locks[self.text_db_path].read():
+            return db.get(set(ids))
+
+    def search_text(self, vector, top_k=5, nprobe=None, chunk_ids=None):
+        """
+        Top chunks by text similarity. With `chunk_ids` (a search scope, see
+        ChunkStore.scope_ids) only those chunks' vectors are read and scored.
+        """
+        return self._search(self.text_db_path, vector, top_k, nprobe, chunk_ids)
+
+    def search_visual(self, vector, top_k=5, nprobe=None, chunk_ids=None):
+        """
+        Max-sim over keyframes: a chunk scores as its best-matching frame.
+        Each chunk has at most `visual_frames` records, so the top
+        top_k·visual_frames frames always contain the top_k chunks and one
+        vectorized top-k query is enough, whatever the frames per chunk.
+        `chunk_ids` restricts the search as in search_text.
+        """
+        scope = self._visual_ids(chunk_ids) if chunk_ids is not None else None
+        hits = self._search(self.visual_db_path, vector, top_k * self.visual_frames, nprobe, scope)
+        chunks = {}
+        for hit in hits:
+            chunk_id = hit.get('chunk_id', hit['__id__'])
+            if chunk_id not in chunks:
+                chunks[chunk_id] = {**hit, '__id__': chunk_id}
+                if len(chunks) == top_k:
+                    break
+        return list(chunks.values())
 
-    def search_text(self, vector, top_k=5):
-        return self.text_db.query(vector, top_k=top_k)
+    def _visual_ids(self, chunk_ids):
+        """Visual record IDs stored for a set of chunks: pooled records and keyframe records alike."""
+        self._db(self.visual_db_path)  # loaded (or reloaded), so its records are tracked
+        with self._locks[self.visual_db_path].read():
+            records = self._chunk_records
+            return {record_id for chunk_id in chunk_ids for record_id in records.get(chunk_id, ())}
 
-    def search_visual(self, vector, top_k=5):
-        return self.visual_db.query(vector, top_k=top_k)
\ No newline at end of file
+    def _search(self, path, vector, top_k, nprobe, ids=None):
+        if ids is not None and not ids:
+            return []
+        db = self._db(path)
+        with self._locks[path].read():
+            if ids is not None:
+                # Pre-filtered: exact search over the scope's rows only, bypassing the ANN index.
+                ids = ids if isinstance(ids, (set, frozenset)) else set(ids)
+                if isinstance(db, MmapVectorStore):
+                    return db.query_ids(vector, ids, top_k=top_k)
+                if not db.get(ids):
+                    return []  # NanoVectorDB cannot index an empty selection
+                return db.query(vector, top_k=top_k, filter_lambda=lambda record: record['__id__'] in ids)
+            ann = self.ann[path]
+            if ann:
+                return ann.query(vector, top_k=top_k, nprobe=nprobe)
+            return db.query(vector, top_k=top_k)
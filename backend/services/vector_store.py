@@ -0,0 +1,349 @@
+import os
+import json
+import numpy as np
+
+ID = "__id__"
+VECTOR = "__vector__"
+METRICS = "__metrics__"
+
+class MmapVectorStore:
+    """
+    Binary vector store with the NanoVectorDB surface VectorEngine relies on
+    (upsert / query / get / delete / save / len).
+
+    On disk, for a base path like `storage/text_index`:
+      text_index.vecs        raw row-major float32 or float16 vectors, opened with
+                             np.memmap so startup is O(1) and the page cache is
+                             shared between the indexer and API processes.
+      text_index.meta.jsonl  append-only log of {"row", "data"} / {"delete"}
+                             records; the last entry for an id wins.
+
+    Persisted rows are never written in place: updating an id appends a new
+    row on save() and its log line supersedes the old row, which becomes dead.
+    Vectors are appended before their log lines, so a crash can at worst leave
+    unreferenced trailing rows or a torn last line, both ignored on load, and
+    other processes never see a vector without its metadata. compact()
+    rewrites both files without the dead rows.
+    """
+
+    def __init__(self, embedding_dim, base_path, dtype="float32"):
+        self.embedding_dim = embedding_dim
+        self.dtype = np.dtype(dtype)
+        self.storage_file = base_path
+        self.vecs_path = f"{base_path}.vecs"
+        self.meta_path = f"{base_path}.meta.jsonl"
+        self._compact_marker = f"{base_path}.compacting"
+        self._row_bytes = self.embedding_dim * self.dtype.itemsize
+
+        self._rows = {}          # id -> row
+        self._data = []          # row -> record without vector (None once deleted)
+        self._matrix = None      # memmap over persisted rows
+        self._pending = []       # (id, data, vector) appended since the last save
+        self._pending_log = []   # log lines for deletes
+        self._dead = set()       # persisted rows that were deleted, superseded or never committed
+        self._superseded = set() # persisted ids whose pending record replaces them on save()
+        self._load()
+
+    # --- Loading -----------------------------------------------------------
+
+    def _load(self):
+        self._finish_compaction()
+        # A partially appended row is ignored here and dropped by the next save(),
+        # which holds the writers' lock; a reader must not truncate a live append.
+        persisted_rows = os.path.getsize(self.vecs_path) // self._row_bytes if os.path.exists(self.vecs_path) else 0
+        self._data = [None] * persisted_rows
+
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # torn write at the tail
+                    if "delete" in entry:
+                        row = self._rows.pop(entry["delete"], None)
+                        if row is not None:
+                            self._data[row] = None
+                    elif entry["row"] < persisted_rows:
+                        old_row = self._rows.get(entry["data"][ID])
+                        if old_row is not None and old_row != entry["row"]:
+                            self._data[old_row] = None  # superseded by an update
+                        self._rows[entry["data"][ID]] = entry["row"]
+                        self._data[entry["row"]] = entry["data"]
+
+        self._dead = {row for row, record in enumerate(self._data) if record is None}
+        self._remap(persisted_rows)
+
+    def _remap(self, rows):
+        if rows:
+            self._matrix = np.memmap(self.vecs_path, dtype=self.dtype, mode='r', shape=(rows, self.embedding_dim))
+        else:
+            self._matrix = np.empty((0, self.embedding_dim), dtype=self.dtype)
+
+    # --- NanoVectorDB surface ---------------------------------------------
+
+    def __len__(self):
+        return len(self._rows) + len(self._pending)
+
+    def ids(self):
+        """IDs of every live record, saved or pending."""
+        return [*self._rows, *(item[0] for item in self._pending)]
+
+    def upsert(self, datas):
+        report = {"update": [], "insert": []}
+        pending_index = {item[0]: i for i, item in enumerate(self._pending)}
+        for data in datas:
+            record = {k: v for k, v in data.items() if k != VECTOR}
+            vector = self._normalize(data[VECTOR])
+            data_id = record[ID]
+            if data_id in self._rows:
+                # Appended on save(); the persisted row only stops counting in this process.
+                self._retire(data_id)
+                self._superseded.add(data_id)
+                pending_index[data_id] = len(self._pending)
+                self._pending.append((data_id, record, vector))
+                report["update"].append(data_id)
+            elif data_id in pending_index:
+                self._pending[pending_index[data_id]] = (data_id, record, vector)
+                report["update"].append(data_id)
+            else:
+                pending_index[data_id] = len(self._pending)
+                self._pending.append((data_id, record, vector))
+                report["insert"].append(data_id)
+        return report
+
+    def get(self, ids):
+        pending = {item[0]: item[1] for item in self._pending}
+        results = []
+        for data_id in ids:
+            if data_id in pending:
+                results.append(pending[data_id])
+            elif data_id in self._rows:
+                results.append(self._data[self._rows[data_id]])
+        return results
+
+    def delete(self, ids):
+        ids = set(ids)
+        self._pending = [item for item in self._pending if item[0] not in ids]
+        for data_id in ids:
+            if self._retire(data_id) or data_id in self._superseded:
+                self._superseded.discard(data_id)
+                self._pending_log.append({"delete": data_id})
+
+    def _retire(self, data_id):
+        """Marks the persisted row of an id dead in memory; False if it has none."""
+        row = self._rows.pop(data_id, None)
+        if row is None:
+            return False
+        self._data[row] = None
+        self._dead.add(row)
+        return True
+
+    def query(self, query, top_k=10, better_than_threshold=None):
+        query = self._normalize(query)
+        return self._top_k(self.scores(query), np.arange(len(self._data)), top_k, better_than_threshold)
+
+    def query_rows(self, query, rows, top_k=10, better_than_threshold=None):
+        """Like query(), but only scores the given persisted rows (plus all pending ones)."""
+        query = self._normalize(query)
+        rows = np.sort(np.asarray(rows, dtype=np.int64))
+        parts = [np.asarray(self._matrix[rows], dtype=np.float32) @ query] if len(rows) else []
+        if self._pending:
+            parts.append(self._pending_matrix() @ query)
+        scores = np.concatenate(parts) if parts else np.empty(0, dtype=np.float32)
+        if self._dead and len(rows):
+            scores[:len(rows)][np.isin(rows, list(self._dead))] = -np.inf
+        return self._top_k(scores, rows, top_k, better_than_threshold)
+
+    def query_ids(self, query, ids, top_k=10, better_than_threshold=None):
+        """Like query(), but only reads and scores the vectors of the given IDs (unknown IDs are skipped)."""
+        ids = set(ids)
+        rows = [self._rows[data_id] for data_id in ids if data_id in self._rows]
+        pending = [item for item in self._pending if item[0] in ids]
+        query = self._normalize(query)
+        rows = np.sort(np.asarray(rows, dtype=np.int64))
+        scores = np.asarray(self._matrix[rows], dtype=np.float32) @ query if len(rows) else np.empty(0, dtype=np.float32)
+        if not pending:
+            return self._top_k(scores, rows, top_k, better_than_threshold)
+        pending_scores = np.stack([item[2] for item in pending]).astype(np.float32) @ query
+        results = self._top_k(scores, rows, top_k, better_than_threshold)
+        for i in np.argsort(-pending_scores)[:top_k]:
+            if better_than_threshold is None or pending_scores[i] >= better_than_threshold:
+                results.append({**pending[i][1], METRICS: float(pending_scores[i])})
+        results.sort(key=lambda r: r[METRICS], reverse=True)
+        return results[:top_k]
+
+    def _top_k(self, scores, rows, top_k, better_than_threshold):
+        """Ranks `scores`, whose first len(rows) entries map to `rows` and the rest to pending records."""
+        if not len(scores):
+            return []
+        top_k = min(top_k, len(scores))
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        candidates = candidates[np.argsort(-scores[candidates])]
+
+        results = []
+        for idx in candidates:
+            score = float(scores[idx])
+            if score == -np.inf or (better_than_threshold is not None and score < better_than_threshold):
+                break
+            record = self._data[rows[idx]] if idx < len(rows) else self._pending[idx - len(rows)][1]
+            results.append({**record, METRICS: score})
+        return results
+
+    def scores(self, query, block_rows=65536):
+        """Cosine scores for every row (persisted, then pending); deleted rows score -inf."""
+        parts = []
+        for i in range(0, len(self._matrix), block_rows):
+            parts.append(np.asarray(self._matrix[i:i + block_rows], dtype=np.float32) @ query)
+        if self._pending:
+            parts.append(self._pending_matrix() @ query)
+        if not parts:
+            return np.empty(0, dtype=np.float32)
+
+        scores = np.concatenate(parts)
+        if self._dead:
+            scores[list(self._dead)] = -np.inf
+        return scores
+
+    def save(self):
+        """Appends pending vectors, then their log lines. Returns bytes written."""
+        written = 0
+        rows = self._align_vecs()
+        if rows > len(self._data):
+            # Rows appended by a writer that crashed before logging them.
+            self._dead.update(range(len(self._data), rows))
+            self._data.extend([None] * (rows - len(self._data)))
+            # Even with nothing pending: query_rows and the dead-row mask index the matrix by row.
+            self._remap(rows)
+        if self._pending:
+            block = np.stack([item[2] for item in self._pending]).astype(self.dtype)
+            with open(self.vecs_path, 'ab') as f:
+                f.write(block.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            written += block.nbytes
+            for offset, (data_id, record, _) in enumerate(self._pending):
+                self._rows[data_id] = rows + offset
+                self._data.append(record)
+                self._pending_log.append({"row": rows + offset, "data": record})
+            self._pending = []
+            self._superseded.clear()
+            self._remap(len(self._data))
+
+        if self._pending_log:
+            payload = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in self._pending_log)
+            self._drop_torn_log_line()
+            with open(self.meta_path, 'a', encoding='utf-8') as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            written += len(payload.encode('utf-8'))
+            self._pending_log = []
+        return written
+
+    def dead_rows(self):
+        """Persisted rows no longer referenced (deleted or superseded), reclaimed by compact()."""
+        return len(self._dead)
+
+    def compact(self):
+        """
+        Rewrites the vectors and the log with only the live rows, renumbered,
+        after saving pending changes. Both files are written aside, then a
+        marker is created before they are renamed into place, so a crash
+        part-way is rolled forward by the next load. Callers serialise this
+        with readers and writers (VectorEngine holds the index's file lock)
+        since row numbers change. Returns bytes written.
+        """
+        written = self.save()
+        live = [row for row, record in enumerate(self._data) if record is not None]
+        tmp_vecs, tmp_meta = f"{self.vecs_path}.tmp", f"{self.meta_path}.tmp"
+        with open(tmp_vecs, 'wb') as f:
+            for i in range(0, len(live), 65536):
+                f.write(np.asarray(self._matrix[live[i:i + 65536]], dtype=self.dtype).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        payload = "".join(json.dumps({"row": new, "data": self._data[old]}, ensure_ascii=False) + "\n"
+                          for new, old in enumerate(live))
+        with open(tmp_meta, 'w', encoding='utf-8') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        open(self._compact_marker, 'w').close()
+        self._finish_compaction()
+        written += len(live) * self._row_bytes + len(payload.encode('utf-8'))
+
+        self._data = [self._data[row] for row in live]
+        self._rows = {record[ID]: row for row, record in enumerate(self._data)}
+        self._dead = set()
+        self._remap(len(self._data))
+        return written
+
+    def _align_vecs(self):
+        """Persisted row count, after dropping a partially appended row left by a crash."""
+        if not os.path.exists(self.vecs_path):
+            return 0
+        size = os.path.getsize(self.vecs_path)
+        if size % self._row_bytes:
+            os.truncate(self.vecs_path, size - size % self._row_bytes)
+        return size // self._row_bytes
+
+    def _drop_torn_log_line(self, block=65536):
+        """Truncates a torn last log line, so the next entry does not get glued onto it."""
+        if not os.path.exists(self.meta_path):
+            return
+        with open(self.meta_path, 'r+b') as f:
+            end = f.seek(0, os.SEEK_END)
+            if not end:
+                return
+            f.seek(end - 1)
+            if f.read(1) == b"\n":
+                return
+            pos = end
+            while pos > 0:
+                start = max(0, pos - block)
+                f.seek(start)
+                newline = f.read(pos - start).rfind(b"\n")
+                if newline >= 0:
+                    f.truncate(start + newline + 1)
+                    return
+                pos = start
+            f.truncate(0)
+
+    def _finish_compaction(self):
+        """Renames a complete compaction's files into place (both were fsynced before the marker)."""
+        if not os.path.exists(self._compact_marker):
+            return
+        for tmp, path in ((f"{self.vecs_path}.tmp", self.vecs_path), (f"{self.meta_path}.tmp", self.meta_path)):
+            if os.path.exists(tmp):
+                os.replace(tmp, path)
+        os.remove(self._compact_marker)
+
+    # --- Helpers -------------------------------------------------------------
+
+    def _pending_matrix(self):
+        return np.stack([item[2] for item in self._pending]).astype(np.float32)
+
+    def _normalize(self, vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+def migrate_from_nano(json_path, base_path, embedding_dim, dtype="float32"):
+    """One-shot copy of a nano-vectordb JSON index into an MmapVectorStore."""
+    from nano_vectordb.dbs import load_storage
+
+    storage = load_storage(json_path)
+    if storage is None:
+        return 0
+    if storage["embedding_dim"] != embedding_dim:
+        raise ValueError(f"{json_path}: expected dim {embedding_dim}, found {storage['embedding_dim']}")
+
+    for suffix in (".vecs", ".meta.jsonl"):
+        if os.path.exists(base_path + suffix):
+            os.remove(base_path + suffix)
+
+    store = MmapVectorStore(embedding_dim, base_path, dtype=dtype)
+    store.upsert([{**record, VECTOR: vector} for record, vector in zip(storage["data"], storage["matrix"])])
+    store.save()
+    return len(store)
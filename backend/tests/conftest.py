@@ -0,0 +1,21 @@
+import os
+import sys
+import types
+import tempfile
+
+# Tests import the backend's modules (services.*) as the app does, from backend/.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import config  # noqa: F401
+except ImportError:
+    # backend/config.py holds the deployment's keys and is not checked in; the
+    # tests only need its folders and model names, and never reach the network.
+    class Config:
+        STORAGE_FOLDER = tempfile.mkdtemp(prefix="videorag-tests-")
+        UPLOAD_FOLDER = os.path.join(STORAGE_FOLDER, "uploads")
+        OPENAI_API_KEY = "sk-test"
+        LLM_MODEL = "gpt-4o-mini"
+        EMBEDDING_MODEL = "text-embedding-3-small"
+
+    sys.modules["config"] = types.SimpleNamespace(Config=Config)
@@ -0,0 +1,11 @@
+from services import ai_engine
+from services.ai_engine import AIEngine
+
+
+def test_empty_clip_batches_do_not_load_clip():
+    engine = AIEngine.__new__(AIEngine)
+    engine.cache = None
+    engine._clip = None
+    assert engine.encode_images([]).shape == (0, ai_engine.CLIP_DIM)
+    assert engine.encode_texts([]).shape == (0, ai_engine.CLIP_DIM)
+    assert engine._clip is None
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+from services.answer_cache import SemanticAnswerCache
+
+
+@pytest.fixture
+def versions():
+    return {"a.mp4": 1, "b.mp4": 1}
+
+
+@pytest.fixture
+def cache(tmp_path, versions):
+    return SemanticAnswerCache(str(tmp_path / "answers.db"), lambda: dict(versions), threshold=0.9)
+
+
+QUERY = np.array([1.0, 0.0, 0.0])
+REPHRASED = np.array([0.98, 0.05, 0.0])
+
+
+def test_similar_query_reuses_the_answer(cache):
+    cache.put("how do I reset it?", QUERY, "hold the button", [{"video_id": "a.mp4"}])
+    hit = cache.lookup(REPHRASED)
+    assert hit["answer"] == "hold the button" and hit["similarity"] > 0.9
+    assert cache.lookup(np.array([0.0, 1.0, 0.0])) is None
+
+
+def test_reindexing_a_source_video_invalidates_the_answer(cache, versions):
+    cache.put("q", QUERY, "answer", [{"video_id": "a.mp4"}])
+    versions["b.mp4"] += 1  # another video: still current
+    assert cache.lookup(QUERY) is not None
+    versions["a.mp4"] += 1
+    assert cache.lookup(QUERY) is None
+    assert cache.stats()["stale"] == 1 and cache.stats()["entries"] == 0
+
+
+def test_answer_without_sources_depends_on_the_whole_library(cache, versions):
+    cache.put("q", QUERY, "I don't know", [])
+    versions["new.mp4"] = 1
+    assert cache.lookup(QUERY) is None
+
+
+def test_answers_are_only_reused_within_their_scope(cache):
+    cache.put("q", QUERY, "scoped", [{"video_id": "a.mp4"}], scope="tenant-a")
+    assert cache.lookup(QUERY) is None
+    assert cache.lookup(QUERY, scope="tenant-a")["answer"] == "scoped"
+
+
+def test_entries_survive_a_reopen(tmp_path, versions):
+    path = str(tmp_path / "answers.db")
+    SemanticAnswerCache(path, lambda: dict(versions)).put("q", QUERY, "answer", [{"video_id": "a.mp4"}])
+    versions["a.mp4"] += 1
+    assert SemanticAnswerCache(path, lambda: dict(versions)).lookup(QUERY) is None
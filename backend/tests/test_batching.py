@@ -0,0 +1,84 @@
+import json
+import threading
+from types import SimpleNamespace
+from services.batching import MicroBatcher
+from services import ai_engine
+from services.ai_engine import AIEngine
+
+
+def submit_concurrently(batcher, items):
+    results = [None] * len(items)
+
+    def run(i):
+        try:
+            results[i] = batcher.submit(items[i])
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(items))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def test_concurrent_calls_share_a_batch():
+    sizes = []
+
+    def double(items):
+        sizes.append(len(items))
+        return [2 * x for x in items]
+
+    batcher = MicroBatcher(double, max_batch=16, max_wait=0.2)
+    assert submit_concurrently(batcher, list(range(10))) == [2 * x for x in range(10)]
+    assert sum(sizes) == 10 and len(sizes) < 10
+
+
+def test_returned_exception_fails_only_its_caller():
+    batcher = MicroBatcher(lambda items: [ValueError(x) if x < 0 else x for x in items], max_batch=8, max_wait=0.2)
+    results = submit_concurrently(batcher, [1, -1, 2])
+    assert results[0] == 1 and results[2] == 2
+    assert isinstance(results[1], ValueError)
+
+
+def test_raised_exception_fails_the_whole_batch():
+    def broken(items):
+        raise RuntimeError("down")
+
+    batcher = MicroBatcher(broken, max_batch=8, max_wait=0.2)
+    assert all(isinstance(r, RuntimeError) for r in submit_concurrently(batcher, [1, 2, 3]))
+
+
+class FakeChat:
+    """chat.completions stand-in: batched requests fail; single ones answer unless the chunk says "garbled"."""
+
+    def __init__(self):
+        self.requests = 0
+        self.completions = self
+
+    def create(self, model, messages, **kwargs):
+        self.requests += 1
+        content = messages[0]["content"]
+        if "each of these" in content:
+            raise RuntimeError("502 from the API")
+        text = "not json" if "garbled" in content else json.dumps({"entities": [{"name": "X", "type": "T"}], "relations": []})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+
+def test_failed_extraction_batch_is_retried_per_chunk(monkeypatch):
+    fake = FakeChat()
+    monkeypatch.setattr(ai_engine, "client", SimpleNamespace(chat=fake))
+    engine = AIEngine.__new__(AIEngine)  # no models or cache needed
+
+    results = engine._extract_graph_entities_batch(["chunk a", "garbled chunk", "chunk c"])
+    assert fake.requests == 4  # the failed batch, then one per chunk
+    assert results[0]["entities"] == [{"name": "X", "type": "T"}] == results[2]["entities"]
+    assert isinstance(results[1], ValueError)
+
+
+def test_single_item_batch_fails_only_itself(monkeypatch):
+    monkeypatch.setattr(ai_engine, "client", SimpleNamespace(chat=FakeChat()))
+    engine = AIEngine.__new__(AIEngine)
+    [result] = engine._extract_graph_entities_batch(["garbled chunk"])
+    assert isinstance(result, ValueError)
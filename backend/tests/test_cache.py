@@ -0,0 +1,20 @@
+import numpy as np
+from services.cache import ContentCache
+
+
+def test_replacing_an_entry_does_not_grow_the_total(tmp_path):
+    cache = ContentCache(str(tmp_path / "cache.db"), max_bytes=10_000)
+    for _ in range(50):
+        cache.put("text_embedding", "m", "same", np.zeros(100, dtype=np.float32))
+    assert cache.stats()["bytes"] == 400
+    cache.put("text_embedding", "m", "same", np.zeros(10, dtype=np.float32))
+    assert cache.stats()["bytes"] == 40
+    assert len(cache.get("text_embedding", "m", "same")) == 10
+
+
+def test_eviction_drops_least_recently_used(tmp_path):
+    cache = ContentCache(str(tmp_path / "cache.db"), max_bytes=1000)
+    for i in range(3):
+        cache.put("ns", "m", str(i), np.zeros(100, dtype=np.float32))  # 400 bytes each
+    assert cache.get("ns", "m", "0") is None
+    assert cache.get("ns", "m", "2") is not None and cache.stats()["bytes"] <= 900
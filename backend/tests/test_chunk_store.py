@@ -0,0 +1,36 @@
+import pytest
+from services.chunk_store import ChunkStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ChunkStore(str(tmp_path / "chunks.db"))
+
+
+def chunk(video_id, start, namespace=None):
+    return {"id": f"{video_id}:{start}", "video_id": video_id, "namespace": namespace,
+            "start": start, "end": start + 30, "text": "..."}
+
+
+def test_scope_by_namespace_and_videos(store):
+    store.upsert([chunk("a", 0, "t1"), chunk("a", 30, "t1"), chunk("b", 0, "t1"), chunk("c", 0, "t2")])
+    assert store.scope_ids("t1") == {"a:0", "a:30", "b:0"}
+    assert store.scope_ids("t1", ["b", "c"]) == {"b:0"}
+    assert store.scope_ids(None, ["c"]) == {"c:0"}
+
+
+def test_scope_with_more_videos_than_sqlite_parameters(store):
+    store.upsert([chunk(f"v{i}", 0, "t1") for i in range(2500)])
+    requested = [f"v{i}" for i in range(0, 2500, 2)] + ["missing"]
+    assert store.scope_ids("t1", requested) == {f"v{i}:0" for i in range(0, 2500, 2)}
+
+
+def test_cached_scope_is_refreshed_after_writes(store, tmp_path):
+    store.upsert([chunk("a", 0, "t1")])
+    assert store.scope_ids("t1") == {"a:0"}
+    # Another process indexes and deletes videos.
+    other = ChunkStore(str(tmp_path / "chunks.db"))
+    other.upsert([chunk("b", 0, "t1")])
+    assert store.scope_ids("t1") == {"a:0", "b:0"}
+    other.delete_video("a")
+    assert store.scope_ids("t1") == {"b:0"}
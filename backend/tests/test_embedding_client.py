@@ -0,0 +1,98 @@
+import threading
+from types import SimpleNamespace
+import numpy as np
+import openai
+import pytest
+from services.embedding_client import EmbeddingClient
+
+try:
+    import httpx
+except ImportError:  # openai releases that ship their HTTP client as httpx2
+    import httpx2 as httpx
+
+
+def api_error(cls, status):
+    request = httpx.Request("POST", "https://api.openai.com/v1/embeddings")
+    return cls(f"HTTP {status}", response=httpx.Response(status, request=request), body=None)
+
+
+class FakeEmbeddings:
+    """Stands in for OpenAI().embeddings: rejects requests containing "bad", fails the first `flaky` requests."""
+
+    def __init__(self, flaky=0):
+        self.flaky = flaky
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def create(self, input, model):
+        with self._lock:
+            self.requests.append(list(input))
+            if self.flaky:
+                self.flaky -= 1
+                raise api_error(openai.RateLimitError, 429)
+        if any("bad" in text for text in input):
+            raise api_error(openai.BadRequestError, 400)
+        data = [SimpleNamespace(index=i, embedding=[float(len(text)), 1.0]) for i, text in enumerate(input)]
+        return SimpleNamespace(data=data[::-1])  # order is restored by index
+
+
+def client(embeddings, **kwargs):
+    return EmbeddingClient("test-model", [SimpleNamespace(embeddings=embeddings)], **kwargs)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(EmbeddingClient, "_backoff", staticmethod(lambda error, attempt: 0))
+
+
+def test_rejected_batch_is_bisected_down_to_the_bad_input():
+    embeddings = FakeEmbeddings()
+    results = client(embeddings)._embed_isolating(["a", "bb", "bad", "dddd"])
+    assert isinstance(results[2], openai.BadRequestError)
+    assert [r[0] for i, r in enumerate(results) if i != 2] == [1.0, 2.0, 4.0]
+    # [a bb bad dddd] -> [a bb] ok, [bad dddd] -> [bad] rejected, [dddd] ok
+    assert embeddings.requests == [["a", "bb", "bad", "dddd"], ["a", "bb"], ["bad", "dddd"], ["bad"], ["dddd"]]
+
+
+def test_only_the_rejected_caller_sees_the_error():
+    embeddings = FakeEmbeddings()
+    engine = client(embeddings, max_wait=0.2)
+    results, errors = {}, {}
+
+    def call(text):
+        try:
+            results[text] = engine.embed(text)
+        except openai.BadRequestError as e:
+            errors[text] = e
+
+    threads = [threading.Thread(target=call, args=(text,)) for text in ("one", "bad", "three")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert set(errors) == {"bad"} and set(results) == {"one", "three"}
+    assert engine.stats()["rejected"] == 1
+
+
+def test_rate_limited_requests_are_retried():
+    embeddings = FakeEmbeddings(flaky=2)
+    engine = client(embeddings, max_retries=3)
+    vectors = engine.embed_many(["x", "yy"])
+    assert [v.tolist() for v in vectors] == [[1.0, 1.0], [2.0, 1.0]]
+    assert all(v.dtype == np.float32 for v in vectors)
+    stats = engine.stats()
+    assert stats["retries"] == 2 and stats["rate_limited"] == 2 and stats["requests"] == 1
+
+
+def test_retries_give_up_after_max_retries():
+    engine = client(FakeEmbeddings(flaky=5), max_retries=1)
+    with pytest.raises(openai.RateLimitError):
+        engine.embed_many(["x"])
+    assert engine.stats()["failures"] == 1
+
+
+def test_empty_text_is_refused_before_batching():
+    embeddings = FakeEmbeddings()
+    with pytest.raises(ValueError):
+        client(embeddings).embed("  ")
+    assert embeddings.requests == []
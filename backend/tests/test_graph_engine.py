@@ -0,0 +1,54 @@
+import pytest
+from services.graph_engine import GraphEngine
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "knowledge_graph.db")
+
+
+def add(graph, chunk_id, *names, relations=()):
+    graph.add_knowledge([{"name": name, "type": "thing"} for name in names],
+                        [{"source": s, "target": t, "relation": "near"} for s, t in relations], chunk_id)
+
+
+def test_refresh_loads_only_rows_written_since(path):
+    writer, reader = GraphEngine(path), GraphEngine(path)
+    add(writer, "v#0", "The Eiffel Tower", "Paris", relations=[("eiffel tower", "paris")])
+    reader.refresh()
+    assert set(reader.G.nodes) == {"eiffel tower", "paris"}
+    seen = dict(reader._seen)
+
+    add(writer, "v#1", "Paris", "Louvre", relations=[("paris", "louvre")])
+    reader.refresh()
+    assert reader.G.nodes["paris"]["chunks"] == {"v#0", "v#1"}
+    assert reader.G.has_edge("paris", "louvre")
+    assert all(reader._seen[table] > seen[table] for table in seen)
+    # Nothing new: the same graph object, not a reload.
+    graph = reader.G
+    reader.refresh()
+    assert reader.G is graph
+
+
+def test_delete_chunks_drops_orphans_and_reloads_other_processes(path):
+    writer, reader = GraphEngine(path), GraphEngine(path)
+    add(writer, "a#0", "Paris", "Louvre", relations=[("paris", "louvre")])
+    add(writer, "b#0", "Paris", "Seine", relations=[("paris", "seine")])
+    reader.refresh()
+
+    assert writer.delete_chunks(["a#0"]) == 1  # only the Louvre is mentioned nowhere else
+    reader.refresh()
+    assert set(reader.G.nodes) == {"paris", "seine"}
+    assert reader.G.nodes["paris"]["chunks"] == {"b#0"}
+    assert not reader.G.has_edge("paris", "louvre")
+    assert reader.retrieve_context(["louvre"]) == []
+    assert reader.retrieve_context(["paris"]) == ["b#0"]
+    assert writer.linked_chunks() == {"b#0"}
+
+
+def test_retrieve_context_scores_only_chunks_in_scope(path):
+    graph = GraphEngine(path)
+    add(graph, "a#0", "Paris", relations=[])
+    add(graph, "b#0", "Paris", "Seine", relations=[("paris", "seine")])
+    assert set(graph.retrieve_context(["paris"])) == {"a#0", "b#0"}
+    assert graph.retrieve_context(["paris"], chunk_ids={"a#0"}) == ["a#0"]
@@ -0,0 +1,75 @@
+import time
+import pytest
+from services.job_queue import JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.db"), lease_seconds=60)
+
+
+def expire_lease(queue, job_id):
+    with queue._conn() as conn:
+        conn.execute("UPDATE jobs SET lease_until = ? WHERE id = ?", (time.time() - 1, job_id))
+
+
+def state(queue, job_id):
+    return queue._conn().conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+
+def test_claim_takes_oldest_queued_job(queue):
+    first = queue.enqueue("/videos/a.mp4")
+    queue.enqueue("/videos/b.mp4")
+    job = queue.claim("w1")
+    assert job["id"] == first and job["state"] == "running" and job["claimed_by"].startswith("w1@")
+    assert job["done_starts"] == set()
+
+
+def test_live_lease_is_not_requeued_or_taken_over(queue):
+    job_id = queue.enqueue("/videos/a.mp4")
+    job = queue.claim("w1")
+    assert queue.requeue_stale() == 0
+    assert queue.claim("w2") is None
+    assert queue.heartbeat(job_id, job["claimed_by"])
+
+
+def test_expired_lease_is_requeued(queue):
+    job_id = queue.enqueue("/videos/a.mp4")
+    queue.claim("w1")
+    expire_lease(queue, job_id)
+    assert queue.requeue_stale() == 1
+    row = state(queue, job_id)
+    assert row["state"] == "queued" and row["claimed_by"] is None
+
+
+def test_takeover_fences_the_old_claim(queue):
+    job_id = queue.enqueue("/videos/a.mp4")
+    old = queue.claim("w1")
+    assert queue.record_chunks(job_id, [(0, 30)], claimed_by=old["claimed_by"])
+    expire_lease(queue, job_id)
+    new = queue.claim("w2")
+    assert new["id"] == job_id and new["done_starts"] == {0}
+
+    # The worker that lost the lease can no longer heartbeat, report progress or finish the job.
+    assert not queue.heartbeat(job_id, old["claimed_by"])
+    assert not queue.set_total(job_id, 10, 30, claimed_by=old["claimed_by"])
+    assert not queue.record_chunks(job_id, [(30, 60)], claimed_by=old["claimed_by"])
+    queue.finish(job_id, error="stale", claimed_by=old["claimed_by"])
+    row = state(queue, job_id)
+    assert row["state"] == "running" and row["chunks_done"] == 1 and row["chunks_total"] is None
+
+    assert queue.set_total(job_id, 2, 30, claimed_by=new["claimed_by"])
+    assert queue.record_chunks(job_id, [(30, 55)], claimed_by=new["claimed_by"])
+    queue.finish(job_id, claimed_by=new["claimed_by"])
+    row = state(queue, job_id)
+    assert row["state"] == "done" and row["chunks_done"] == 2 and row["run_video_sec"] == 25
+
+
+def test_throughput_uses_indexed_window_lengths(queue):
+    job_id = queue.enqueue("/videos/a.mp4")
+    job = queue.claim("w1")
+    queue.record_chunks(job_id, [(0, 12.5), (12.5, 47.5)], claimed_by=job["claimed_by"])
+    with queue._conn() as conn:
+        conn.execute("UPDATE jobs SET started_at = ?, finished_at = ? WHERE id = ?", (100.0, 110.0, job_id))
+    described = JobQueue._describe(state(queue, job_id))
+    assert described["throughput"] == {"chunks_per_sec": pytest.approx(0.2), "video_sec_per_sec": pytest.approx(4.75)}
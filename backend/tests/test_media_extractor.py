@@ -0,0 +1,67 @@
+import io
+from types import SimpleNamespace
+import numpy as np
+from services.media_extractor import MediaExtractor
+
+SAMPLE_RATE = 100
+
+
+class FakeProcess:
+    def __init__(self, data):
+        self.stdout = io.BytesIO(data)
+
+    def kill(self):
+        pass
+
+    def wait(self):
+        pass
+
+
+def extractor(shades, speech):
+    """
+    MediaExtractor over a synthetic 1 fps stream instead of ffmpeg: second i
+    shows a flat frame of gray level shades[i] and is loud if speech[i].
+    """
+    media = MediaExtractor.__new__(MediaExtractor)
+    media.video_path, media.sample_rate = "synthetic.mp4", SAMPLE_RATE
+    media.duration, media.has_audio = float(len(shades)), True
+    media.width = media.height = 8
+    frames = b"".join(np.full((8, 8, 3), shade, dtype=np.uint8).tobytes() for shade in shades)
+    tone = (10000 * np.sin(np.arange(SAMPLE_RATE))).astype(np.int16)
+    audio = b"".join((tone if loud else np.zeros(SAMPLE_RATE, dtype=np.int16)).tobytes() for loud in speech)
+    media._spawn_frames = lambda offset, fps: FakeProcess(frames)
+    media._spawn_audio = lambda: FakeProcess(audio)
+    return media
+
+
+def spans(windows):
+    return [(w["start"], w["end"]) for w in windows]
+
+
+def test_short_shots_share_a_window_with_one_keyframe_each():
+    # A cut every 2 seconds, speech throughout.
+    shades = [0 if (i // 2) % 2 else 255 for i in range(20)]
+    windows = list(extractor(shades, [True] * 20).iter_scenes(min_len=10, target_len=10, max_len=30))
+    assert spans(windows) == [(0.0, 10.0), (10.0, 20.0)]
+    assert [w["frame_times"] for w in windows] == [[0.5, 2.5, 4.5, 6.5], [10.5, 12.5, 14.5, 16.5]]
+    assert all(len(w["audio"]) == 10 * SAMPLE_RATE for w in windows)
+
+
+def test_silent_look_alike_windows_merge_up_to_max_len():
+    windows = list(extractor([128] * 50, [False] * 50).iter_scenes(target_len=10, static_len=20, max_len=30))
+    # Cut at every 20 s pause; [20, 40] would make [0, 40] longer than max_len, [40, 50] joins it.
+    assert spans(windows) == [(0.0, 20.0), (20.0, 50.0)]
+    assert len(windows[1]["frames"]) == 1 and len(windows[1]["audio"]) == 30 * SAMPLE_RATE
+
+
+def test_silent_windows_that_look_different_are_not_merged():
+    shades = [64] * 20 + [192] * 20
+    windows = list(extractor(shades, [False] * 40).iter_scenes(target_len=10, static_len=20, max_len=90))
+    assert spans(windows) == [(0.0, 20.0), (20.0, 40.0)]
+
+
+def test_speech_is_not_merged_into_the_previous_window():
+    # Cut at the pause at 20 s; the window after it has speech, so it stays separate.
+    speech = [False] * 21 + [True] * 19
+    windows = list(extractor([128] * 40, speech).iter_scenes(target_len=10, static_len=20, max_len=90))
+    assert spans(windows) == [(0.0, 20.0), (20.0, 40.0)]
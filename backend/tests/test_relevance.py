@@ -0,0 +1,41 @@
+import time
+import threading
+import numpy as np
+from services.relevance import RelevanceFilter
+
+
+def sources(n):
+    return [{"id": i, "text": f"chunk {i}"} for i in range(n)]
+
+
+def embed(texts):
+    # Chunk i is less similar to the query [1, 0] the larger i is.
+    return [np.array([1.0, 0.1 * int(t.split()[1])]) for t in texts]
+
+
+def test_judge_over_budget_falls_back_to_similarity_on_its_own_threads():
+    release = threading.Event()
+    judge_threads = []
+
+    def slow_judge(query, texts):
+        judge_threads.append(threading.current_thread().name)
+        release.wait(5)
+        return [10] * len(texts)
+
+    relevance = RelevanceFilter(embed, judge=slow_judge, batch_size=2, budget_ms=50, workers=2)
+    t0 = time.perf_counter()
+    kept = relevance.filter([1.0, 0.0], "query", sources(6))
+    assert time.perf_counter() - t0 < 1
+    assert [src["id"] for src in kept] == [0, 1, 2, 3, 4, 5]
+    assert relevance.stats()["timeouts"] == 1
+
+    # Only `workers` judge calls ran; the queued group was cancelled, not left to run later.
+    release.set()
+    relevance.pool.shutdown(wait=True)
+    assert len(judge_threads) == 2 and all(name.startswith("relevance") for name in judge_threads)
+
+
+def test_judge_drops_low_scores():
+    relevance = RelevanceFilter(embed, judge=lambda query, texts: [int(t.split()[1]) * 2 for t in texts], batch_size=2)
+    kept = relevance.filter([1.0, 0.0], "query", sources(6))
+    assert [src["id"] for src in kept] == [5, 4, 3]
@@ -0,0 +1,64 @@
+import threading
+import numpy as np
+import pytest
+from services.vector_engine import VectorEngine
+
+
+def vec(seed, dim=512):
+    return np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+
+
+def keyframes(chunk_id, count, seed):
+    return [{"__id__": f"{chunk_id}#{k}", "__vector__": vec(seed * 100 + k), "chunk_id": chunk_id} for k in range(count)]
+
+
+@pytest.mark.parametrize("backend", ["nano", "mmap"])
+def test_delete_removes_every_keyframe_whatever_the_current_setting(tmp_path, backend):
+    writer = VectorEngine(str(tmp_path), backend=backend)
+    writer.upsert_visual(keyframes("a", 6, 1) + keyframes("b", 6, 2))
+    writer.flush()
+
+    # A later process, configured with fewer frames per chunk than "a" was indexed with.
+    engine = VectorEngine(str(tmp_path), backend=backend)
+    engine.visual_frames = 2
+    engine.delete(["a"])
+
+    reloaded = VectorEngine(str(tmp_path), backend=backend)
+    assert len(reloaded.visual_db) == 6
+    assert {hit["__id__"] for hit in reloaded.search_visual(vec(101), top_k=5)} == {"b"}
+    assert reloaded.search_visual(vec(101), top_k=5, chunk_ids={"a"}) == []
+
+
+@pytest.mark.parametrize("backend", ["nano", "mmap"])
+def test_scoped_search_sees_records_written_by_another_process(tmp_path, backend):
+    engine = VectorEngine(str(tmp_path), backend=backend)
+    engine.load()
+    worker = VectorEngine(str(tmp_path), backend=backend)
+    worker.upsert_visual(keyframes("a", 3, 1))
+    worker.flush()
+    hits = engine.search_visual(vec(102), top_k=1, chunk_ids={"a"})
+    assert [hit["__id__"] for hit in hits] == ["a"]
+
+
+def test_searches_run_safely_while_videos_are_deleted(tmp_path):
+    engine = VectorEngine(str(tmp_path), backend="nano", flush_every=10 ** 9, flush_interval=10 ** 9)
+    engine.upsert_visual([record for i in range(100) for record in keyframes(f"c{i}", 4, i)])
+    errors, stop = [], threading.Event()
+
+    def search():
+        while not stop.is_set():
+            try:
+                engine.search_visual(vec(7), top_k=5)
+                engine.search_visual(vec(8), top_k=3, chunk_ids={f"c{i}" for i in range(40)})
+            except Exception as e:
+                errors.append(e)
+
+    searchers = [threading.Thread(target=search) for _ in range(4)]
+    for t in searchers:
+        t.start()
+    for i in range(0, 60, 5):
+        engine.delete([f"c{j}" for j in range(i, i + 5)])
+    stop.set()
+    for t in searchers:
+        t.join()
+    assert errors == [] and len(engine.visual_db) == 160
@@ -0,0 +1,224 @@
+import os
+import numpy as np
+import pytest
+from services.vector_store import MmapVectorStore
+from services.ann_index import IVFIndex
+
+DIM = 8
+
+
+def unit(seed):
+    vec = np.random.default_rng(seed).standard_normal(DIM).astype(np.float32)
+    return vec / np.linalg.norm(vec)
+
+
+def record(data_id, seed, **meta):
+    return {"__id__": data_id, "__vector__": unit(seed), **meta}
+
+
+@pytest.fixture
+def base(tmp_path):
+    return str(tmp_path / "index")
+
+
+def test_save_and_reload(base):
+    store = MmapVectorStore(DIM, base)
+    store.upsert([record("a", 1, tag="x"), record("b", 2, tag="y")])
+    assert store.query(unit(1), top_k=1)[0]["__id__"] == "a"  # pending rows are searchable
+    store.save()
+
+    reloaded = MmapVectorStore(DIM, base)
+    assert len(reloaded) == 2
+    assert reloaded.get(["b"]) == [{"__id__": "b", "tag": "y"}]
+    hit = reloaded.query(unit(2), top_k=1)[0]
+    assert hit["__id__"] == "b" and hit["__metrics__"] == pytest.approx(1.0)
+
+
+def test_delete_persists(base):
+    store = MmapVectorStore(DIM, base)
+    store.upsert([record("a", 1), record("b", 2)])
+    store.save()
+    store.delete(["a"])
+    store.save()
+
+    reloaded = MmapVectorStore(DIM, base)
+    assert len(reloaded) == 1
+    assert reloaded.get(["a"]) == []
+    assert [h["__id__"] for h in reloaded.query(unit(1), top_k=5)] == ["b"]
+
+
+def test_update_appends_instead_of_overwriting(base):
+    store = MmapVectorStore(DIM, base)
+    store.upsert([record("a", 1, version=1)])
+    store.save()
+    vecs_before = open(store.vecs_path, 'rb').read()
+
+    store.upsert([record("a", 2, version=2)])
+    # Nothing reaches disk before save(): another process still sees the old vector and metadata.
+    assert open(store.vecs_path, 'rb').read() == vecs_before
+    other = MmapVectorStore(DIM, base)
+    assert other.get(["a"]) == [{"__id__": "a", "version": 1}]
+    assert other.query(unit(1), top_k=1)[0]["__metrics__"] == pytest.approx(1.0)
+
+    assert len(store) == 1
+    assert store.query(unit(2), top_k=1)[0]["version"] == 2
+    store.save()
+
+    reloaded = MmapVectorStore(DIM, base)
+    assert len(reloaded) == 1 and reloaded.dead_rows() == 1
+    hits = reloaded.query(unit(2), top_k=5)
+    assert [(h["__id__"], h["version"]) for h in hits] == [("a", 2)]
+    assert hits[0]["__metrics__"] == pytest.approx(1.0)
+
+
+def test_delete_after_unsaved_update(base):
+    store = MmapVectorStore(DIM, base)
+    store.upsert([record("a", 1)])
+    store.save()
+    store.upsert([record("a", 2)])
+    store.delete(["a"])
+    store.save()
+    assert len(MmapVectorStore(DIM, base)) == 0
+
+
+def test_torn_tail_is_ignored(base):
+    store = MmapVectorStore(DIM, base)
+    store.upsert([record("a", 1)])
+    store.save()
+    # A crash mid-save: half a vector row and half a log line.
+    with open(store.vecs_path, 'ab') as f:
+        f.write(unit(2).tobytes()[:DIM * 2])
+    with open(store.meta_path, 'a') as f:
+        f.write('{"row": 1, "data": {"__id__": "b"')
+
+    reloaded = MmapVectorStore(DIM, base)
+    assert len(reloaded) == 1
+    reloaded.upsert([record("c", 3)])
+    reloaded.save()
+    assert os.path.getsize(reloaded.vecs_path) == 2 * DIM * 4  # realigned before appending
+    assert {h["__id__"] for h in MmapVectorStore(DIM, base).query(unit(3), top_k=5)} == {"a", "c"}
+
+
+def test_vectors_without_log_lines_are_ignored(base):
+    store = MmapVectorStore(DIM, base)
+    store.upsert([record("a", 1)])
+    store.save()
+    # Crash after appending the vector but before its log line.
+    with open(store.vecs_path, 'ab') as f:
+        f.write(unit(2).tobytes())
+
+    reloaded = MmapVectorStore(DIM, base)
+    assert len(reloaded) == 1
+    assert [h["__id__"] for h in reloaded.query(unit(2), top_k=5)] == ["a"]
+    # The orphaned row stays dead and later rows are numbered after it.
+    reloaded.upsert([record("b", 3)])
+    reloaded.save()
+    assert [h["__id__"] for h in MmapVectorStore(DIM, base).query(unit(3), top_k=1)] == ["b"]
+
+
+def test_save_after_another_writer_crashed(base):
+    store = MmapVectorStore(DIM, base)
+    store.upsert([record("a", 1)])
+    store.save()
+    # Another process appends a vector and dies before logging it.
+    with open(store.vecs_path, 'ab') as f:
+        f.write(unit(2).tobytes())
+    store.upsert([record("b", 3)])
+    store.save()
+
+    reloaded = MmapVectorStore(DIM, base)
+    assert len(reloaded) == 2
+    hit = reloaded.query(unit(3), top_k=1)[0]
+    assert hit["__id__"] == "b" and hit["__metrics__"] == pytest.approx(1.0)
+
+
+def test_compact_drops_dead_rows(base):
+    store = MmapVectorStore(DIM, base)
+    store.upsert([record(str(i), i) for i in range(10)])
+    store.save()
+    store.delete(["0", "1"])
+    store.upsert([record("2", 100)])
+    store.compact()
+
+    assert store.dead_rows() == 0
+    assert os.path.getsize(store.vecs_path) == 8 * DIM * 4
+    reloaded = MmapVectorStore(DIM, base)
+    assert len(reloaded) == 8 and reloaded.dead_rows() == 0
+    assert reloaded.query(unit(100), top_k=1)[0]["__id__"] == "2"
+    assert reloaded.query(unit(5), top_k=1)[0]["__id__"] == "5"
+
+
+def test_interrupted_compaction_rolls_forward(base):
+    store = MmapVectorStore(DIM, base)
+    store.upsert([record(str(i), i) for i in range(4)])
+    store.save()
+    store.delete(["0"])
+    store.compact()
+    compacted = (open(store.vecs_path, 'rb').read(), open(store.meta_path).read())
+
+    # Simulate a crash after the marker was written but before the renames.
+    for path, content in ((f"{store.vecs_path}.tmp", compacted[0]), (f"{store.meta_path}.tmp", compacted[1].encode())):
+        with open(path, 'wb') as f:
+            f.write(content)
+    with open(f"{store.vecs_path}", 'ab') as f:
+        f.write(unit(9).tobytes())  # old layout, one row longer
+    open(f"{base}.compacting", 'w').close()
+
+    reloaded = MmapVectorStore(DIM, base)
+    assert not os.path.exists(f"{base}.compacting")
+    assert len(reloaded) == 3
+    assert reloaded.query(unit(3), top_k=1)[0]["__id__"] == "3"
+
+
+def test_ivf_lists_follow_updated_vectors(base):
+    store = MmapVectorStore(DIM, base)
+    store.upsert([record(str(i), i) for i in range(64)])
+    store.save()
+    index = IVFIndex(store, nlist=4, nprobe=1, min_train=1)
+    index.sync()
+
+    store.upsert([record("7", 1000)])
+    store.save()
+    hits = index.query(unit(1000), top_k=1)
+    assert hits[0]["__id__"] == "7" and hits[0]["__metrics__"] == pytest.approx(1.0)
+
+    store.compact()
+    index.rebuild()
+    hits = index.query(unit(1000), top_k=1)
+    assert hits[0]["__id__"] == "7" and hits[0]["__metrics__"] == pytest.approx(1.0)
+
+
+def test_ivf_query_is_read_only(base):
+    store = MmapVectorStore(DIM, base)
+    store.upsert([record(str(i), i) for i in range(64)])
+    store.save()
+    index = IVFIndex(store, nlist=4, nprobe=1, min_train=1)
+    assert index.query(unit(3), top_k=1)[0]["__id__"] == "3"  # untrained: brute force, and no training
+    assert not os.path.exists(index.centroids_path)
+
+    index.sync()
+    store.upsert([record("new", 500)])
+    store.save()
+    assign_size = os.path.getsize(index.assign_path)
+    hits = index.query(unit(500), top_k=1)
+    assert hits[0]["__id__"] == "new"  # persisted after the last sync, still found
+    assert os.path.getsize(index.assign_path) == assign_size
+
+
+def test_save_with_nothing_pending_adopts_unlogged_rows(base):
+    store = MmapVectorStore(DIM, base)
+    store.upsert([record("a", 1)])
+    store.save()
+    # Another process appends a vector and dies before logging it; we only delete.
+    with open(store.vecs_path, 'ab') as f:
+        f.write(unit(2).tobytes())
+    store.delete(["a"])
+    store.save()
+    assert len(store._matrix) == len(store._data) == 2
+
+    store.upsert([record("b", 3)])
+    hits = store.query(unit(3), top_k=5)  # pending row scored after the adopted dead one
+    assert [(h["__id__"], h["__metrics__"]) for h in hits] == [("b", pytest.approx(1.0))]
+    store.save()
+    hits = MmapVectorStore(DIM, base).query(unit(3), top_k=5)
+    assert [(h["__id__"], h["__metrics__"]) for h in hits] == [("b", pytest.approx(1.0))]
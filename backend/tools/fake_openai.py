@@ -0,0 +1,276 @@
+"""
+Local stand-in for the OpenAI endpoints the backend calls (embeddings, chat
+completions, audio transcriptions), for exercising the batching client's
+rate-limit handling and benchmarking the pipeline (benchmarks.bench_pipeline)
+without spending API quota.
+
+Usage (from backend/):
+    python -m tools.fake_openai --port 8765 --tpm 200000 --rpm 600 --latency-ms 150 \
+        [--chat-latency-ms 800] [--audio-latency-ms 400]
+
+Then set `OPENAI_BASE_URL = "http://127.0.0.1:8765/v1"` in config.py.
+Everything is deterministic:
+  - embeddings are pseudo-random unit vectors seeded by the input text;
+  - transcripts are a dozen words of VOCABULARY seeded by the audio bytes;
+  - JSON-mode chat answers the prompt shapes of AIEngine (graph extraction,
+    query plans, relevance scores, single or batched), with the entities being
+    the VOCABULARY words the text mentions;
+  - other chat requests get a short canned answer (streamed if asked).
+Requests beyond the tokens- or requests-per-minute budget
+get a 429 with a Retry-After header, like the real API; the budgets
+replenish continuously.
+"""
+import argparse
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+EMBEDDING_DIM = 1536
+
+# Words fake transcripts are made of, so that queries built from them hit the graph.
+VOCABULARY = [
+    "robot", "kitchen", "engine", "garden", "bridge", "laptop", "violin", "harbor",
+    "camera", "forest", "rocket", "library", "bicycle", "market", "glacier", "museum",
+    "tractor", "volcano", "stadium", "lantern", "satellite", "canyon", "orchestra", "factory",
+]
+_WORDS = set(VOCABULARY)
+_LISTING = re.compile(r'^\s*\[([cq]\d+)\] (".*")\s*$', re.MULTILINE)
+
+
+def fake_embedding(text, dim=EMBEDDING_DIM):
+    seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+    vec = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return vec / np.linalg.norm(vec)
+
+
+def fake_transcript(audio_bytes, words=12):
+    seed = int.from_bytes(hashlib.sha256(audio_bytes).digest()[:8], 'little')
+    rng = np.random.default_rng(seed)
+    return " ".join(rng.choice(VOCABULARY, size=words)) + "."
+
+
+def _entities(text):
+    return list(dict.fromkeys(w for w in re.findall(r"[a-z]+", text.lower()) if w in _WORDS))[:6]
+
+
+def fake_extraction(text):
+    names = _entities(text)
+    return {
+        "entities": [{"name": n, "type": "object"} for n in names],
+        "relations": [{"source": a, "target": b, "relation": "appears_with"} for a, b in zip(names, names[1:])],
+    }
+
+
+def fake_plan(query):
+    return {"visual_query": query, "keyword_query": query, "entities": _entities(query)}
+
+
+def fake_score(query, text):
+    """0-10 by how many of the query's entities the chunk mentions."""
+    wanted = set(_entities(query))
+    if not wanted:
+        return 5
+    return round(10 * len(wanted & set(_entities(text))) / len(wanted))
+
+
+def fake_chat(prompt):
+    """The JSON reply AIEngine expects for this prompt (see its prompt templates)."""
+    listing = [(item_id, json.loads(text)) for item_id, text in _LISTING.findall(prompt)]
+    if '"plans"' in prompt:
+        return {"plans": [{"id": i, **fake_plan(q)} for i, q in listing]}
+    if '"scores"' in prompt:
+        query = json.loads(re.search(r"Query: (\".*\")", prompt).group(1))
+        return {"scores": [{"id": i, "score": fake_score(query, t)} for i, t in listing]}
+    if '"chunks"' in prompt:
+        return {"chunks": [{"id": i, **fake_extraction(t)} for i, t in listing]}
+    if "Decompose query:" in prompt:
+        return fake_plan(re.search(r'Decompose query: "(.*)"', prompt).group(1))
+    return fake_extraction(prompt)
+
+
+class FakeOpenAI(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, address, tpm=None, rpm=None, latency_ms=0, chat_latency_ms=None, audio_latency_ms=None):
+        super().__init__(address, _Handler)
+        self.tpm, self.rpm, self.latency_ms = tpm, rpm, latency_ms
+        # Chat and transcription latencies default to the embeddings one.
+        self.chat_latency_ms = latency_ms if chat_latency_ms is None else chat_latency_ms
+        self.audio_latency_ms = latency_ms if audio_latency_ms is None else audio_latency_ms
+        self.lock = threading.Lock()
+        # Budgets replenish continuously, a minute's worth per minute.
+        self.tokens_left, self.requests_left = tpm, rpm
+        self.updated = time.monotonic()
+        self.stats = {"requests": 0, "inputs": 0, "rate_limited": 0, "chat_requests": 0, "transcriptions": 0}
+
+    @property
+    def base_url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/v1"
+
+    def admit(self, tokens):
+        """Charges the request to the per-minute budgets; returns seconds to wait if it does not fit."""
+        with self.lock:
+            now = time.monotonic()
+            elapsed, self.updated = now - self.updated, now
+            wait = 0.0
+            if self.tpm:
+                self.tokens_left = min(self.tpm, self.tokens_left + elapsed * self.tpm / 60)
+                if tokens > self.tokens_left:
+                    wait = max(wait, (tokens - self.tokens_left) * 60 / self.tpm)
+            if self.rpm:
+                self.requests_left = min(self.rpm, self.requests_left + elapsed * self.rpm / 60)
+                if self.requests_left < 1:
+                    wait = max(wait, (1 - self.requests_left) * 60 / self.rpm)
+            if wait:
+                self.stats["rate_limited"] += 1
+                return wait
+            if self.tpm:
+                self.tokens_left -= tokens
+            if self.rpm:
+                self.requests_left -= 1
+            return 0
+
+    def serve_in_background(self):
+        threading.Thread(target=self.serve_forever, daemon=True, name="fake-openai").start()
+        return self
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        raw = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        path = self.path.rstrip('/')
+        if path == "/v1/embeddings":
+            return self._embeddings(json.loads(raw or b"{}"))
+        if path == "/v1/chat/completions":
+            return self._chat(json.loads(raw or b"{}"))
+        if path == "/v1/audio/transcriptions":
+            return self._transcription(raw)
+        self._send(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+
+    def _admitted(self, tokens, latency_ms):
+        """Applies the rate limits (sending the 429 itself) and the simulated latency."""
+        retry_after = self.server.admit(tokens)
+        if retry_after:
+            self._send(429, {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                       headers={"retry-after": f"{retry_after:.2f}"})
+            return False
+        if latency_ms:
+            time.sleep(latency_ms / 1000)
+        return True
+
+    def _embeddings(self, body):
+        inputs = body.get("input", [])
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+        tokens = sum(len(text) // 4 + 1 for text in inputs)
+
+        if not self._admitted(tokens, self.server.latency_ms):
+            return
+        with self.server.lock:
+            self.server.stats["requests"] += 1
+            self.server.stats["inputs"] += len(inputs)
+        self._send(200, {
+            "object": "list",
+            "model": body.get("model"),
+            "data": [
+                {"object": "embedding", "index": i, "embedding": fake_embedding(text).tolist()}
+                for i, text in enumerate(inputs)
+            ],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+    def _chat(self, body):
+        prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+        tokens = len(prompt) // 4 + 1
+        if not self._admitted(tokens, self.server.chat_latency_ms):
+            return
+        with self.server.lock:
+            self.server.stats["chat_requests"] += 1
+
+        if (body.get("response_format") or {}).get("type") == "json_object":
+            content = json.dumps(fake_chat(prompt))
+        else:
+            topics = _entities(prompt.rsplit("User Question:", 1)[-1]) or ["the video"]
+            content = f"Based on the retrieved chunks, the video shows {', '.join(topics)} [1]."
+        completion_id = f"chatcmpl-{hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:12]}"
+
+        if body.get("stream"):
+            return self._stream(completion_id, body.get("model"), content)
+        self._send(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": tokens, "completion_tokens": len(content) // 4 + 1,
+                      "total_tokens": tokens + len(content) // 4 + 1},
+        })
+
+    def _stream(self, completion_id, model, content):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        words = content.split(" ")
+        for k, word in enumerate(words):
+            delta = {"content": word if k == 0 else f" {word}"}
+            self._event({"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                         "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+        self._event({"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                     "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+    def _event(self, payload):
+        self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode('utf-8'))
+        self.wfile.flush()
+
+    def _transcription(self, raw):
+        # Multipart upload; drop the (random) boundary so equal audio gets an equal transcript.
+        boundary = self.headers.get('Content-Type', '').partition("boundary=")[2].strip('"').encode('utf-8')
+        audio = raw.replace(boundary, b"") if boundary else raw
+        if not self._admitted(1, self.server.audio_latency_ms):
+            return
+        with self.server.lock:
+            self.server.stats["transcriptions"] += 1
+        self._send(200, {"text": fake_transcript(audio)})
+
+    def _send(self, status, payload, headers=None):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--tpm", type=int, default=None, help="Tokens per minute before 429s.")
+    parser.add_argument("--rpm", type=int, default=None, help="Requests per minute before 429s.")
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--chat-latency-ms", type=float, default=None, help="Defaults to --latency-ms.")
+    parser.add_argument("--audio-latency-ms", type=float, default=None, help="Defaults to --latency-ms.")
+    args = parser.parse_args()
+
+    server = FakeOpenAI((args.host, args.port), tpm=args.tpm, rpm=args.rpm, latency_ms=args.latency_ms,
+                        chat_latency_ms=args.chat_latency_ms, audio_latency_ms=args.audio_latency_ms)
+    print(f"🧪 Fake OpenAI listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
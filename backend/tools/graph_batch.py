@@ -0,0 +1,123 @@
+"""
+Offline knowledge-graph extraction through the OpenAI Batch API, for bulk
+backfills (videos indexed with INDEX_GRAPH_MODE = "deferred", or indexed
+before the graph existed). Batch requests are billed at a discount and
+each request packs several chunks, as online batched extraction does.
+
+Usage (from backend/):
+    python -m tools.graph_batch submit [--video VIDEO_ID] [--chunks-per-request 8]
+    python -m tools.graph_batch collect BATCH_ID
+
+`submit` picks the chunks that have no entities in the graph yet. Chunks
+whose extraction is already in the cache are applied immediately; the rest
+are uploaded as one batch. `collect` applies a completed batch's results to
+the graph and the cache. Chunks missing from a response stay pending and
+are picked up by the next `submit`.
+"""
+import argparse
+import io
+import json
+import os
+from services.ai_engine import client, EXTRACTION_MODEL, extraction_batch_messages, parse_batch_response
+from services.cache import open_default_cache, content_hash
+from services.chunk_store import ChunkStore
+from services.graph_engine import GraphEngine
+from config import Config
+
+MANIFEST_DIR = os.path.join(Config.STORAGE_FOLDER, "graph_batches")
+
+
+def apply(graph, cache, chunk_id, text, kg_data):
+    graph.add_knowledge(kg_data.get('entities', []), kg_data.get('relations', []), chunk_id)
+    if cache:
+        cache.put("graph_extraction", EXTRACTION_MODEL, content_hash(text), kg_data)
+
+
+def submit(args):
+    chunks, graph, cache = ChunkStore(), GraphEngine(), open_default_cache()
+    linked = graph.linked_chunks()
+    pending = [chunk_id for chunk_id in chunks.ids(args.video) if chunk_id not in linked]
+    records = chunks.get_many(pending)
+
+    to_send, from_cache = [], 0
+    for chunk_id in pending:
+        text = records[chunk_id]['text']
+        cached = cache.get("graph_extraction", EXTRACTION_MODEL, content_hash(text)) if cache else None
+        if cached is not None:
+            apply(graph, cache, chunk_id, text, cached)
+            from_cache += 1
+        else:
+            to_send.append(chunk_id)
+    print(f"ℹ️ {len(pending)} chunks without graph data; {from_cache} applied from cache, {len(to_send)} to extract.")
+    if not to_send:
+        return
+
+    lines, manifest = [], {}
+    for n, start in enumerate(range(0, len(to_send), args.chunks_per_request)):
+        group = to_send[start:start + args.chunks_per_request]
+        custom_id = f"graph-{n}"
+        manifest[custom_id] = group
+        lines.append(json.dumps({
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": EXTRACTION_MODEL,
+                "messages": extraction_batch_messages([records[c]['text'] for c in group]),
+                "response_format": {"type": "json_object"},
+            },
+        }))
+
+    upload = client.files.create(file=("graph_batch.jsonl", io.BytesIO("\n".join(lines).encode('utf-8'))), purpose="batch")
+    batch = client.batches.create(input_file_id=upload.id, endpoint="/v1/chat/completions", completion_window="24h")
+
+    os.makedirs(MANIFEST_DIR, exist_ok=True)
+    with open(os.path.join(MANIFEST_DIR, f"{batch.id}.json"), 'w') as f:
+        json.dump(manifest, f)
+    print(f"✅ Submitted batch {batch.id}: {len(lines)} requests for {len(to_send)} chunks.")
+    print(f"   Collect with: python -m tools.graph_batch collect {batch.id}")
+
+
+def collect(args):
+    batch = client.batches.retrieve(args.batch_id)
+    if batch.status != "completed":
+        print(f"ℹ️ Batch {batch.id} is {batch.status}.")
+        return
+    with open(os.path.join(MANIFEST_DIR, f"{batch.id}.json"), 'r') as f:
+        manifest = json.load(f)
+
+    chunks, graph, cache = ChunkStore(), GraphEngine(), open_default_cache()
+    records = chunks.get_many([c for group in manifest.values() for c in group])
+    applied, failed = 0, 0
+    for line in client.files.content(batch.output_file_id).text.splitlines():
+        result = json.loads(line)
+        group = manifest.get(result["custom_id"], [])
+        response = result.get("response") or {}
+        if response.get("status_code") != 200:
+            failed += len(group)
+            continue
+        content = response["body"]["choices"][0]["message"]["content"]
+        for chunk_id, kg_data in zip(group, parse_batch_response(content, "chunks", len(group))):
+            if kg_data is None or chunk_id not in records:
+                failed += 1
+                continue
+            apply(graph, cache, chunk_id, records[chunk_id]['text'], kg_data)
+            applied += 1
+    print(f"✅ Applied graph data for {applied} chunks; {failed} left pending for the next submit.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    submit_parser = commands.add_parser("submit")
+    submit_parser.add_argument("--video", default=None, help="Only this video ID (default: all videos).")
+    submit_parser.add_argument("--chunks-per-request", type=int, default=getattr(Config, "EXTRACTION_BATCH_SIZE", 8))
+    collect_parser = commands.add_parser("collect")
+    collect_parser.add_argument("batch_id")
+    args = parser.parse_args()
+
+    submit(args) if args.command == "submit" else collect(args)
+
+
+if __name__ == "__main__":
+    main()
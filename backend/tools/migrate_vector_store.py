@@ -0,0 +1,36 @@
+"""
+Converts the nano-vectordb JSON indexes into the binary mmap backend.
+
+Usage (from backend/):
+    python -m tools.migrate_vector_store [--dtype float16]
+
+Then set `VECTOR_BACKEND = "mmap"` (and `VECTOR_DTYPE` if not float32) in
+config.py. The JSON files are left in place.
+"""
+import argparse
+import os
+import time
+from services.vector_store import migrate_from_nano
+from config import Config
+
+INDEXES = [("text_index", 1536), ("visual_index", 512)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--storage", default=Config.STORAGE_FOLDER)
+    parser.add_argument("--dtype", choices=["float32", "float16"], default="float32")
+    args = parser.parse_args()
+
+    for name, dim in INDEXES:
+        json_path = os.path.join(args.storage, f"{name}.json")
+        if not os.path.exists(json_path):
+            print(f"ℹ️ {json_path} not found, skipping.")
+            continue
+        t0 = time.perf_counter()
+        count = migrate_from_nano(json_path, os.path.join(args.storage, name), dim, dtype=args.dtype)
+        print(f"✅ {name}: {count} vectors migrated in {time.perf_counter() - t0:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import os
+import sys
+import time
+import argparse
+import threading
+import subprocess
+import multiprocessing
+from services.job_queue import JobQueue
+from config import Config
+
+POLL_INTERVAL = getattr(Config, "INDEX_POLL_INTERVAL", 1.0)
+# Seconds between checks for dead workers, and the least time between restarts of one worker.
+RESPAWN_DELAY = getattr(Config, "INDEX_WORKER_RESPAWN_DELAY", 5.0)
+# spawn: workers must not inherit the API process's threads or torch state.
+_SPAWN = multiprocessing.get_context("spawn")
+
+
+def _worker_main(worker_name, stop_event):
+    """
+    Long-lived indexing worker. OpenCLIP (and the VLM on GPU) and the stores
+    load on the first job, or at startup with Config.WARMUP, and then stay
+    warm across jobs.
+    """
+    from indexer import process_video, CHUNK_LEN
+    from services import runtime
+    from services.metrics import metrics, dump_folder
+
+    # Read by the API's /api/metrics; rewritten at every checkpoint.
+    metrics_path = os.path.join(dump_folder(), f"{worker_name}.json")
+    runtime.start_warmup(graph=False)  # workers only insert into the graph
+    metrics.dump(metrics_path)
+
+    queue = JobQueue()
+    print(f"👷 {worker_name} ready.")
+
+    while not stop_event.is_set():
+        job = queue.claim(worker_name)
+        if job is None:
+            stop_event.wait(POLL_INTERVAL)
+            continue
+
+        job_id = job['id']
+        resumed = len(job['done_starts'])
+        print(f"👷 {worker_name} took job {job_id} ({job['video_path']}"
+              + (f", resuming after {resumed} chunks" if resumed else "") + ")")
+
+        # Keeps the job's lease alive while it is processed, however long a chunk takes,
+        # and cancels the run if the lease is lost to another worker.
+        done, cancel = threading.Event(), threading.Event()
+        threading.Thread(target=_heartbeat, args=(queue, job, done, cancel), daemon=True, name="job-heartbeat").start()
+
+        reported_total = None
+
+        def on_progress(windows, failed, total):
+            nonlocal reported_total
+            claimed_by = job['claimed_by']
+            if total != reported_total:
+                # Scene chunking only knows the real chunk count once decoding ends.
+                if not queue.set_total(job_id, total, CHUNK_LEN, claimed_by=claimed_by):
+                    cancel.set()
+                reported_total = total
+            if (windows or failed) and not queue.record_chunks(job_id, windows, failed, claimed_by=claimed_by):
+                cancel.set()
+            metrics.dump(metrics_path)
+
+        try:
+            result = process_video(
+                job['video_path'],
+                chunk_len=CHUNK_LEN,
+                video_id=job['video_id'],
+                namespace=job['namespace'],
+                skip_starts=job['done_starts'],
+                on_progress=on_progress,
+                cancel=cancel,
+            )
+            if cancel.is_set():
+                print(f"⚠️ {worker_name} abandoned job {job_id}: another worker holds it now.")
+            queue.finish(job_id, error=result['error'], claimed_by=job['claimed_by'])
+            metrics.incr("jobs_failed" if result['error'] else "jobs_done")
+        except Exception as e:
+            print(f"❌ {worker_name} job {job_id} failed: {e}")
+            queue.finish(job_id, error=str(e), claimed_by=job['claimed_by'])
+            metrics.incr("jobs_failed")
+        finally:
+            done.set()
+        metrics.dump(metrics_path)
+
+
+def _heartbeat(queue, job, done, cancel):
+    while not done.wait(queue.lease_seconds / 3):
+        try:
+            if not queue.heartbeat(job['id'], job['claimed_by']):
+                print(f"⚠️ Lost the lease on job {job['id']}; another worker has taken it over.")
+                cancel.set()
+                return
+        except Exception as e:
+            print(f"⚠️ Heartbeat for job {job['id']} failed: {e}")
+
+
+def start_worker_pool(num_workers=None):
+    """
+    Re-queues jobs whose worker died (lease expired) and starts a fixed pool
+    of worker processes. Returns (stop_event, processes); pass them to
+    supervise_worker_pool to keep the pool at that size.
+    """
+    if num_workers is None:
+        num_workers = getattr(Config, "INDEX_WORKERS", 2)
+    if num_workers < 1:
+        raise ValueError(f"A worker pool needs at least one worker, got {num_workers}")
+
+    requeued = JobQueue().requeue_stale()
+    if requeued:
+        print(f"♻️ Re-queued {requeued} interrupted indexing job(s).")
+
+    stop_event = _SPAWN.Event()
+    processes = [_spawn_worker(i, stop_event) for i in range(num_workers)]
+    return stop_event, processes
+
+
+def _spawn_worker(index, stop_event):
+    process = _SPAWN.Process(target=_worker_main, args=(f"worker-{index}", stop_event), daemon=True,
+                             name=f"index-worker-{index}")
+    process.start()
+    return process
+
+
+def supervise_worker_pool(stop_event, processes):
+    """
+    Blocks until `stop_event` is set, replacing any worker process that died
+    (at most once per RESPAWN_DELAY each, so a worker crashing on startup
+    does not spin). The dead worker's job is taken over once its lease expires.
+    """
+    started = [time.monotonic()] * len(processes)
+    while not stop_event.wait(RESPAWN_DELAY):
+        for i, process in enumerate(processes):
+            if process.is_alive() or time.monotonic() - started[i] < RESPAWN_DELAY:
+                continue
+            print(f"♻️ {process.name} exited with code {process.exitcode}; starting a replacement.")
+            processes[i] = _spawn_worker(i, stop_event)
+            started[i] = time.monotonic()
+
+
+def launch_worker_pool():
+    """
+    Runs the worker pool as a separate `python worker.py` process, restarted
+    (after RESPAWN_DELAY) if it exits with an error. Spawned workers
+    re-import their parent's main module, and this keeps them from
+    re-importing app.py (and with it the retriever's models). Returns the
+    daemon thread watching it.
+    """
+    def keep_running():
+        while True:
+            proc = subprocess.Popen([sys.executable, os.path.abspath(__file__)],
+                                    cwd=os.path.dirname(os.path.abspath(__file__)))
+            code = proc.wait()
+            if code == 0:
+                return
+            print(f"♻️ Worker pool exited with code {code}; restarting it.")
+            time.sleep(RESPAWN_DELAY)
+
+    thread = threading.Thread(target=keep_running, name="worker-pool", daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == '__main__':
+    # Worker pool entry point: launched by app.py, or run on its own. INDEX_WORKERS = 0
+    # only means the API starts no pool, so standalone runs default to at least one worker.
+    parser = argparse.ArgumentParser(description="Runs a pool of indexing workers.")
+    parser.add_argument("--workers", type=int, default=max(1, getattr(Config, "INDEX_WORKERS", 2)))
+    args = parser.parse_args()
+    stop, procs = start_worker_pool(args.workers)
+    try:
+        supervise_worker_pool(stop, procs)
+    except KeyboardInterrupt:
+        stop.set()
@@ -2,7 +2,7 @@
 
 import React, { useState, useRef, useEffect } from 'react';
 import { Send, Bot, User, PlayCircle } from 'lucide-react';
-import { sendChatQuery } from '@/lib/api';
+import { streamChatQuery } from '@/lib/api';
 
 interface Source {
     start: number;
@@ -40,20 +40,29 @@ export default function ChatInterface({ onSeek }: ChatInterfaceProps) {
         if (!input.trim() || isLoading) return;
 
         const userMsg: Message = { role: 'user', content: input };
-        setMessages(prev => [...prev, userMsg]);
+        // Placeholder bot message that is filled in as the stream arrives.
+        const botIndex = messages.length + 1;
+        setMessages(prev => [...prev, userMsg, { role: 'bot', content: '' }]);
         setInput("");
         setIsLoading(true);
 
+        const updateBot = (update: (msg: Message) => Message) => {
+            setMessages(prev => prev.map((msg, i) => (i === botIndex ? update(msg) : msg)));
+        };
+
         try {
-            const response = await sendChatQuery(userMsg.content);
-            const botMsg: Message = {
-                role: 'bot',
-                content: response.data.answer,
-                sources: response.data.sources
-            };
-            setMessages(prev => [...prev, botMsg]);
+            await streamChatQuery(userMsg.content, {
+                onSources: (sources) => updateBot(msg => ({ ...msg, sources })),
+                onToken: (text) => {
+                    setIsLoading(false);
+                    updateBot(msg => ({ ...msg, content: msg.content + text }));
+                },
+            });
         } catch (error) {
-            setMessages(prev => [...prev, { role: 'bot', content: "Sorry, I encountered an error processing your request." }]);
+            updateBot(msg => ({
+                ...msg,
+                content: msg.content || "Sorry, I encountered an error processing your request."
+            }));
         } finally {
             setIsLoading(false);
         }
@@ -71,7 +80,7 @@ export default function ChatInterface({ onSeek }: ChatInterfaceProps) {
 
             {/* Messages Area */}
             <div className="flex-1 overflow-y-auto p-4 space-y-4 scrollbar-default">
-                {messages.map((msg, idx) => (
+                {messages.filter(msg => msg.content || msg.sources?.length).map((msg, idx) => (
                     <div key={idx} className={`flex gap-3 ${msg.role === 'user' ? 'flex-row-reverse' : ''}`}>
                         <div className={`w-8 h-8 rounded-full flex items-center justify-center flex-shrink-0 ${msg.role === 'user' ? 'bg-blue-600' : 'bg-slate-700'}`}>
                             {msg.role === 'user' ? <User className="w-5 h-5" /> : <Bot className="w-5 h-5" />}
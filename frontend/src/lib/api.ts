@@ -22,4 +22,53 @@ export const sendChatQuery = async (query: string) => {
     return api.post('/chat', { query });
 };
 
-export default api;
\ No newline at end of file
+export interface ChatStreamHandlers {
+    onSources?: (sources: { start: number; end: number; text: string }[]) => void;
+    onToken?: (text: string) => void;
+    onDone?: (timings: Record<string, number>) => void;
+}
+
+// Consumes the Server-Sent Events stream from /chat/stream. EventSource only
+// supports GET, so the stream is read from a POST fetch and parsed by hand.
+export const streamChatQuery = async (query: string, handlers: ChatStreamHandlers) => {
+    const response = await fetch(`${API_BASE_URL}/chat/stream`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ query }),
+    });
+    if (!response.ok || !response.body) {
+        throw new Error(`Chat stream failed with status ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let event = 'message';
+            let data = '';
+            for (const line of rawEvent.split('\n')) {
+                if (line.startsWith('event:')) event = line.slice(6).trim();
+                else if (line.startsWith('data:')) data += line.slice(5).trim();
+            }
+            if (!data) continue;
+
+            const payload = JSON.parse(data);
+            if (event === 'sources') handlers.onSources?.(payload.sources);
+            else if (event === 'token') handlers.onToken?.(payload.text);
+            else if (event === 'done') handlers.onDone?.(payload.timings);
+            else if (event === 'error') throw new Error(payload.error);
+        }
+    }
+};
+
+export default api;